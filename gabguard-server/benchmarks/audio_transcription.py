@@ -0,0 +1,80 @@
+"""Przyspieszenie równoległej transkrypcji długich nagrań w funkcji liczby równoległych fragmentów.
+
+Uruchomienie (z katalogu gabguard-server):
+    python -m benchmarks.audio_transcription --minutes 60 --concurrency 1 2 4 8
+
+Nagranie jest syntetyczne (wypowiedzi przedzielone ciszą), a transkrypcję zastępuje
+atrapa, która czeka `--base-latency` + `--latency-per-minute` na minutę fragmentu -
+dzięki temu pomiar nie zależy od sieci ani od limitów API. Fragmenty są cięte tak samo
+jak w `process_large_audio_file` (`align_chunks`) i przechodzą przez `transcribe_chunks`.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from models.audio_analyzer import transcribe_chunks
+from models.audio_frontend import AUDIO_CHUNK_SECONDS, AUDIO_SAMPLE_RATE, align_chunks
+
+
+def synthetic_pcm(minutes, sample_rate=AUDIO_SAMPLE_RATE, seed=0):
+    """Sekwencja tonów (mowa) i ciszy o losowych długościach, PCM s16le mono."""
+    rng = np.random.default_rng(seed)
+    total = int(minutes * 60 * sample_rate)
+    samples = np.zeros(total, dtype="<i2")
+    position = 0
+    while position < total:
+        speech = int(rng.uniform(2.0, 12.0) * sample_rate)
+        end = min(total, position + speech)
+        t = np.arange(end - position) / sample_rate
+        samples[position:end] = (8000 * np.sin(2 * np.pi * rng.uniform(120, 300) * t)).astype("<i2")
+        position = end + int(rng.uniform(0.3, 1.5) * sample_rate)
+    return samples.tobytes()
+
+
+def blocks(pcm, block_seconds=15, sample_rate=AUDIO_SAMPLE_RATE):
+    size = int(block_seconds * sample_rate) * 2
+    for offset in range(0, len(pcm), size):
+        yield pcm[offset:offset + size]
+
+
+def make_transcriber(base_latency, latency_per_minute, sample_rate=AUDIO_SAMPLE_RATE):
+    async def transcriber(pcm, index):
+        minutes = len(pcm) / 2 / sample_rate / 60
+        await asyncio.sleep(base_latency + latency_per_minute * minutes)
+        return f"[{index}]"
+    return transcriber
+
+
+async def run(pcm, concurrency, chunk_seconds, transcriber):
+    chunks = align_chunks(blocks(pcm), chunk_seconds=chunk_seconds)
+    started = time.perf_counter()
+    texts = await transcribe_chunks(chunks, transcriber=transcriber, concurrency=concurrency)
+    elapsed = time.perf_counter() - started
+    # Transkrypcje muszą wrócić w kolejności fragmentów
+    assert texts == [f"[{i}]" for i in range(len(texts))], "transkrypcje w złej kolejności"
+    return elapsed, len(texts)
+
+
+async def main(args):
+    pcm = synthetic_pcm(args.minutes)
+    transcriber = make_transcriber(args.base_latency, args.latency_per_minute)
+
+    print(f"nagranie: {args.minutes} min, fragment: {args.chunk_seconds:.0f} s")
+    print(f"{'concurrency':<14}{'chunks':>8}{'wall s':>10}{'speedup':>10}")
+    baseline = None
+    for concurrency in args.concurrency:
+        elapsed, chunks = await run(pcm, concurrency, args.chunk_seconds, transcriber)
+        baseline = baseline or elapsed
+        print(f"{concurrency:<14}{chunks:>8}{elapsed:>10.2f}{baseline / elapsed:>10.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--chunk-seconds", type=float, default=AUDIO_CHUNK_SECONDS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--base-latency", type=float, default=0.3, help="stały narzut wywołania (s)")
+    parser.add_argument("--latency-per-minute", type=float, default=0.2, help="czas transkrypcji minuty audio (s)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,94 @@
+"""Przepustowość i zużycie pamięci backendów inferencji toxic-bert na CPU.
+
+Uruchomienie (z katalogu gabguard-server):
+    python -m benchmarks.classifier_inference --backends toxic-bert toxic-bert-int8 toxic-bert-onnx
+
+Każdy backend jest mierzony w osobnym procesie, żeby RSS nie obejmował innych modeli.
+Wyniki backendów są porównywane z modelem FP32 (pierwszy na liście) z tolerancją
+PARITY_TOLERANCE - to ten sam test zgodności co `check_parity`.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+SAMPLE_TEXTS = [
+    "Thanks for helping me set up the server yesterday.",
+    "You are a complete idiot and nobody wants you here.",
+    "Are we playing tonight or not?",
+    "Shut up, you worthless piece of garbage.",
+    "That was a great match, congratulations to the whole team!",
+    "I will find you and you will regret it.",
+    "lol",
+    "Can someone share the link to the tournament rules?",
+]
+
+
+def current_rss_mb():
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def run_worker(backend_name, count, batch_size):
+    from models.classifier_backends import get_backend
+
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    backend = get_backend(backend_name)
+    load_s = time.perf_counter() - started
+
+    texts = (SAMPLE_TEXTS * (count // len(SAMPLE_TEXTS) + 1))[:count]
+    backend.predict(texts[:batch_size])  # rozgrzewka
+
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        backend.predict(texts[i:i + batch_size])
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        "backend": backend_name,
+        "load_s": load_s,
+        "texts_per_s": len(texts) / elapsed,
+        "rss_model_mb": current_rss_mb() - rss_before,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "scores": backend.predict(SAMPLE_TEXTS),
+    }))
+
+
+def main(backends, count, batch_size):
+    from models.classifier_backends import PARITY_TOLERANCE
+
+    results = []
+    for backend_name in backends:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.classifier_inference", "--worker", backend_name,
+             "--count", str(count), "--batch-size", str(batch_size)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    reference = results[0]
+    print(f"{'backend':<18}{'load s':>8}{'texts/s':>10}{'model MB':>10}{'peak MB':>10}{'max diff':>10}  parity")
+    for result in results:
+        max_diff = max(abs(a - b) for a, b in zip(result["scores"], reference["scores"]))
+        parity = "ok" if max_diff <= PARITY_TOLERANCE else "FAIL"
+        print(f"{result['backend']:<18}{result['load_s']:>8.1f}{result['texts_per_s']:>10.1f}"
+              f"{result['rss_model_mb']:>10.0f}{result['peak_rss_mb']:>10.0f}{max_diff:>10.4f}  {parity}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["toxic-bert", "toxic-bert-int8", "toxic-bert-onnx"])
+    parser.add_argument("--count", type=int, default=256, help="Liczba tekstów w pomiarze")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.count, args.batch_size)
+    else:
+        main(args.backends, args.count, args.batch_size)
@@ -0,0 +1,93 @@
+"""Czas wyciągania tekstu z dokumentów (PDF, DOCX, CSV, XML) w zależności od ich rozmiaru.
+
+Uruchomienie (z katalogu gabguard-server):
+    python -m benchmarks.file_extraction --sizes 10 100 1000 --repeat 3
+
+Dla każdego formatu generowane są dokumenty o `--sizes` stronach / akapitach / tysiącach
+wierszy / tysiącach elementów i przepuszczane przez ekstraktory z `file_analyzer`. Ekstraktory
+kończą pracę po EXTRACT_MAX_CHARS znakach, więc czas powinien pozostać stały niezależnie od
+rozmiaru dokumentu - rośnie tylko czas generowania, który nie jest wliczany.
+"""
+import argparse
+import io
+import statistics
+import time
+
+import docx
+from reportlab.pdfgen import canvas
+
+from models.file_analyzer import (
+    EXTRACT_MAX_CHARS,
+    extract_csv_content,
+    extract_docx_content,
+    extract_pdf_content,
+    extract_xml_content,
+)
+
+LINE = "Sample line of document text used to measure extraction time"
+
+
+def make_pdf(pages):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for page in range(pages):
+        for line in range(40):
+            pdf.drawString(50, 800 - line * 18, f"{page}.{line} {LINE}")
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def make_docx(paragraphs):
+    document = docx.Document()
+    for index in range(paragraphs):
+        document.add_paragraph(f"{index} {LINE}")
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_csv(thousands):
+    return "".join(f"{index},{LINE}\n" for index in range(thousands * 1000)).encode()
+
+
+def make_xml(thousands):
+    rows = "".join(f'<row id="{index}"><text>{LINE}</text></row>' for index in range(thousands * 1000))
+    return f"<rows>{rows}</rows>".encode()
+
+
+FORMATS = {
+    "pdf": (make_pdf, extract_pdf_content, "stron"),
+    "docx": (make_docx, extract_docx_content, "akapitów"),
+    "csv": (make_csv, extract_csv_content, "tys. wierszy"),
+    "xml": (make_xml, extract_xml_content, "tys. elementów"),
+}
+
+
+def measure(extract, data, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = extract(io.BytesIO(data))
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), len(text)
+
+
+def main(formats, sizes, repeat):
+    print(f"limit znaków: {EXTRACT_MAX_CHARS}, powtórzenia: {repeat}")
+    print(f"{'format':<8}{'rozmiar':>22}{'MB':>9}{'ms':>10}{'znaki':>8}")
+    for name in formats:
+        make, extract, unit = FORMATS[name]
+        for size in sizes:
+            data = make(size)
+            elapsed, chars = measure(extract, data, repeat)
+            print(f"{name:<8}{f'{size} {unit}':>22}{len(data) / 1e6:>9.2f}{elapsed * 1000:>10.1f}{chars:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.formats, args.sizes, args.repeat)
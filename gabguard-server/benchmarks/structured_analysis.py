@@ -0,0 +1,81 @@
+"""Analiza plików jednym wywołaniem (odpowiedź JSON) vs. dwuetapowa (opis, potem ocena).
+
+Uruchomienie (z katalogu gabguard-server, wymaga OPENAI_API_KEY):
+    python -m benchmarks.structured_analysis --repeat 3
+    python -m benchmarks.structured_analysis --input ../docs/*.txt --modes combined two-step
+
+Każda treść przechodzi przez `describe_and_score_content` w każdym trybie. Podawane są
+opóźnienia (średnia, p50, p95), liczba wywołań API i tokenów na analizę (z liczników
+`openai_client`) oraz średnia różnica wyniku toksyczności względem pierwszego trybu z listy.
+"""
+import argparse
+import asyncio
+import mimetypes
+import statistics
+import time
+
+from models.file_analyzer import describe_and_score_content
+from openai_client import get_openai_stats
+
+SAMPLES = [
+    ("text/plain", "Meeting notes: the team agreed to move the release to Friday. Anna will update the changelog."),
+    ("text/plain", "If you show up at my door again I will make sure you regret it. Nobody will help you."),
+    ("text/csv", "name,comment\nJan,great product\nOla,you people are idiots and should be banned\n"),
+    ("application/json", '{"user": "bob", "message": "Buy cheap followers now!!! Click the link below"}'),
+]
+
+
+def load_inputs(paths):
+    contents = []
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            contents.append((mimetypes.guess_type(path)[0] or "text/plain", f.read()))
+    return contents
+
+
+def totals():
+    models = get_openai_stats()["models"].values()
+    return (
+        sum(stats["calls"] for stats in models),
+        sum(stats["prompt_tokens"] + stats["completion_tokens"] for stats in models),
+    )
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def main(contents, modes, repeat):
+    results = {}
+    for mode in modes:
+        latencies, scores = [], []
+        calls_before, tokens_before = totals()
+        for _ in range(repeat):
+            for mime_type, content in contents:
+                started = time.perf_counter()
+                verdict = await describe_and_score_content(content, mime_type, mode=mode)
+                latencies.append(time.perf_counter() - started)
+                scores.append(verdict["toxicity_score"])
+        calls_after, tokens_after = totals()
+        runs = len(latencies)
+        results[mode] = (latencies, scores, (calls_after - calls_before) / runs, (tokens_after - tokens_before) / runs)
+
+    print(f"treści: {len(contents)}, powtórzenia: {repeat}")
+    print(f"{'tryb':<12}{'śr. s':>8}{'p50 s':>8}{'p95 s':>8}{'wywołania':>11}{'tokeny':>9}{'|Δ wynik|':>11}")
+    reference_scores = results[modes[0]][1]
+    for mode, (latencies, scores, calls, tokens) in results.items():
+        # Wyniki -1 (błąd) pomijamy w porównaniu
+        pairs = [(a, b) for a, b in zip(scores, reference_scores) if a >= 0 and b >= 0]
+        delta = sum(abs(a - b) for a, b in pairs) / len(pairs) if pairs else float("nan")
+        print(f"{mode:<12}{statistics.mean(latencies):>8.2f}{percentile(latencies, 0.5):>8.2f}"
+              f"{percentile(latencies, 0.95):>8.2f}{calls:>11.2f}{tokens:>9.0f}{delta:>11.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", nargs="+", help="Pliki tekstowe (domyślnie wbudowane próbki)")
+    parser.add_argument("--modes", nargs="+", default=["combined", "two-step"])
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(main(load_inputs(args.input) if args.input else SAMPLES, args.modes, args.repeat))
@@ -0,0 +1,90 @@
+"""Porównanie backendów klasyfikatora: tłumaczenie + toxic-bert vs. model wielojęzyczny.
+
+Uruchomienie (z katalogu gabguard-server):
+    python -m benchmarks.text_backends --input wiadomosci.txt --backends toxic-bert multilingual
+
+Plik wejściowy zawiera jedną wiadomość na linię. Każda wiadomość przechodzi przez
+`classify_text` - tę samą ścieżkę (tłumaczenie, kolejka paczek, model), której używa
+`analyze_text_async`. Raport zawiera opóźnienia każdej ścieżki oraz zgodność werdyktów.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from globals import toxicity_score
+from models.text_classifier import classify_text
+
+SAMPLE_TEXTS = [
+    "Cześć, gramy dzisiaj wieczorem?",
+    "Jesteś totalnym idiotą, wynoś się z serwera",
+    "Dzięki za pomoc z konfiguracją bota!",
+    "Zamknij się w końcu, nikt cię tu nie chce",
+    "lol",
+    "you are an absolute idiot",
+    "Ten mecz był świetny, gratulacje dla drużyny",
+    "Znajdę cię i pożałujesz",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_backend(backend, texts):
+    scores, latencies = [], []
+    for text in texts:
+        started = time.perf_counter()
+        result = await classify_text(text, backend)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        scores.append(result["score"])
+    return scores, latencies
+
+
+async def main(texts, backends, threshold):
+    results = {}
+    for backend in backends:
+        # Pierwsze wywołanie ładuje model - nie wliczamy go do pomiaru
+        await classify_text(texts[0], backend)
+        results[backend] = await run_backend(backend, texts)
+
+    print(f"{'backend':<16}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for backend, (_, latencies) in results.items():
+        print(f"{backend:<16}{statistics.mean(latencies):>10.1f}{percentile(latencies, 0.5):>10.1f}{percentile(latencies, 0.95):>10.1f}")
+
+    reference = backends[0]
+    reference_scores = results[reference][0]
+    for backend in backends[1:]:
+        scores = results[backend][0]
+        pairs = [(a, b) for a, b in zip(reference_scores, scores) if a is not None and b is not None]
+        if not pairs:
+            print(f"{backend}: brak wyników do porównania")
+            continue
+        agreement = sum((a > threshold) == (b > threshold) for a, b in pairs) / len(pairs)
+        mean_abs_diff = statistics.mean(abs(a - b) for a, b in pairs)
+        print(f"{reference} vs {backend}: zgodność werdyktów (próg {threshold}) = {agreement:.1%}, "
+              f"średnia różnica wyników = {mean_abs_diff:.3f}")
+
+    print()
+    print("tekst | " + " | ".join(backends))
+    for i, text in enumerate(texts):
+        row = " | ".join("-" if results[b][0][i] is None else f"{results[b][0][i]:.3f}" for b in backends)
+        print(f"{text[:60]} | {row}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="Plik z wiadomościami (jedna na linię)")
+    parser.add_argument("--backends", nargs="+", default=["toxic-bert", "multilingual"])
+    parser.add_argument("--threshold", type=float, default=toxicity_score)
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = SAMPLE_TEXTS
+
+    asyncio.run(main(texts, args.backends, args.threshold))
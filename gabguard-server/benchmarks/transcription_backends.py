@@ -0,0 +1,69 @@
+"""Współczynnik czasu rzeczywistego (RTF) backendów transkrypcji: API OpenAI vs. lokalny Whisper.
+
+Uruchomienie (z katalogu gabguard-server):
+    python -m benchmarks.transcription_backends --input ../gabguard-bot/debug-audio/*.mp3 \
+        --backends openai faster-whisper
+
+Każde nagranie jest dekodowane raz (ffmpeg, mono 16 kHz), a następnie transkrybowane
+przez każdy backend tą samą ścieżką co w `process_large_audio_file` (podział w ciszy,
+`transcribe_chunks`). RTF = czas transkrypcji / długość nagrania - poniżej 1.0 backend
+nadąża za mową. Pierwsze wywołanie (ładowanie modelu, nawiązanie połączenia) nie jest
+wliczane. Zgodność tekstu podawana jest względem pierwszego backendu z listy.
+"""
+import argparse
+import asyncio
+import difflib
+import time
+
+from models.audio_analyzer import AUDIO_TRANSCRIBE_CONCURRENCY, transcribe_chunks
+from models.audio_frontend import AUDIO_SAMPLE_RATE, align_chunks, iter_pcm_chunks
+from models.transcription_backends import get_transcription_backend
+
+
+def decode(path):
+    return b"".join(iter_pcm_chunks(path))
+
+
+async def transcribe_with(backend, pcm, concurrency):
+    async def transcriber(chunk, index):
+        return await backend.transcribe_pcm(chunk, AUDIO_SAMPLE_RATE, index)
+
+    texts = await transcribe_chunks(align_chunks([pcm]), transcriber=transcriber, concurrency=concurrency)
+    return " ".join(text.strip() for text in texts if text.strip())
+
+
+def similarity(a, b):
+    return difflib.SequenceMatcher(None, a.lower().split(), b.lower().split()).ratio()
+
+
+async def main(paths, backends, concurrency):
+    recordings = [(path, decode(path)) for path in paths]
+    total_audio_s = sum(len(pcm) for _, pcm in recordings) / 2 / AUDIO_SAMPLE_RATE
+
+    results = {}
+    for name in backends:
+        backend = get_transcription_backend(name)
+        # Rozgrzewka: ładowanie modelu / pierwsze połączenie
+        await backend.transcribe_pcm(recordings[0][1][:AUDIO_SAMPLE_RATE * 2], AUDIO_SAMPLE_RATE)
+        texts, elapsed = [], 0.0
+        for _, pcm in recordings:
+            started = time.perf_counter()
+            texts.append(await transcribe_with(backend, pcm, concurrency))
+            elapsed += time.perf_counter() - started
+        results[name] = (texts, elapsed)
+
+    print(f"nagrania: {len(recordings)}, łącznie {total_audio_s:.1f} s audio")
+    print(f"{'backend':<16}{'wall s':>10}{'RTF':>10}{'zgodność':>10}")
+    reference_texts = results[backends[0]][0]
+    for name, (texts, elapsed) in results.items():
+        agreement = sum(similarity(a, b) for a, b in zip(texts, reference_texts)) / len(texts)
+        print(f"{name:<16}{elapsed:>10.2f}{elapsed / total_audio_s:>10.3f}{agreement:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", nargs="+", required=True, help="Pliki audio (dowolny format obsługiwany przez ffmpeg)")
+    parser.add_argument("--backends", nargs="+", default=["openai", "faster-whisper"])
+    parser.add_argument("--concurrency", type=int, default=AUDIO_TRANSCRIBE_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(main(args.input, args.backends, args.concurrency))
@@ -12,6 +12,10 @@ def init_db():
     global client, db
     client = MongoClient(MONGO_CONNECTION_STRING)
     db = client[DB_NAME]
+    # Wpisy cache werdyktów usuwane automatycznie po upływie expires_at
+    db.verdict_cache.create_index("expires_at", expireAfterSeconds=0)
+    # Odczyt przyrostowy (np. indeks hashy obrazów) - najnowsze wpisy danej przestrzeni nazw
+    db.verdict_cache.create_index([("namespace", 1), ("updated_at", -1)])
 
 def report_violation(user_id, content, type, score):
     db.violations.insert_one({
@@ -33,4 +37,47 @@ def get_violations_by_user_and_days(user_id: str, days: int = 60):
     violations_data = list(db.violations.find(query))
     for violation in violations_data:
         violation["_id"] = str(violation["_id"])
-    return violations_data
\ No newline at end of file
+    return violations_data
+
+def get_cached_verdict(namespace: str, key: str, version: str):
+    if db is None:
+        return None
+    doc = db.verdict_cache.find_one({"_id": f"{namespace}:{key}"})
+    if doc is None or doc.get("version") != version:
+        return None
+    if doc.get("expires_at") and doc["expires_at"] < datetime.utcnow():
+        return None
+    return doc.get("verdict")
+
+def store_cached_verdict(namespace: str, key: str, version: str, verdict, ttl_seconds: float):
+    if db is None:
+        return
+    db.verdict_cache.replace_one(
+        {"_id": f"{namespace}:{key}"},
+        {
+            "namespace": namespace,
+            "version": version,
+            "key": key,
+            "verdict": verdict,
+            "updated_at": datetime.utcnow(),
+            "expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds),
+        },
+        upsert=True
+    )
+
+def load_cached_verdicts(namespace: str, version: str, since=None, limit: int = 10000):
+    """Najnowsze ważne wpisy przestrzeni nazw (opcjonalnie tylko zapisane po `since`)."""
+    if db is None:
+        return []
+    query = {
+        "namespace": namespace,
+        "version": version,
+        "expires_at": {"$gt": datetime.utcnow()},
+    }
+    if since is not None:
+        query["updated_at"] = {"$gt": since}
+    cursor = db.verdict_cache.find(query).sort("updated_at", -1).limit(limit)
+    return [
+        {"key": doc.get("key", doc["_id"].split(":", 1)[1]), "verdict": doc["verdict"], "updated_at": doc.get("updated_at")}
+        for doc in cursor
+    ]
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Rozmiary pul wątków: "io" dla wywołań sieciowych/bazy (OpenAI, tłumacz, MongoDB, ffmpeg),
+# "cpu" dla inferencji modeli (torch zwalnia GIL, więc osobne wątki wystarczą),
+# "stt" dla lokalnej transkrypcji mowy (osobno, żeby długie nagrania nie blokowały klasyfikatora)
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "32"))
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", "1"))
+STT_POOL_SIZE = int(os.getenv("STT_POOL_SIZE", "1"))
+
+pools = {
+    "io": ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="gabguard-io"),
+    "cpu": ThreadPoolExecutor(max_workers=CPU_POOL_SIZE, thread_name_prefix="gabguard-cpu"),
+    "stt": ThreadPoolExecutor(max_workers=STT_POOL_SIZE, thread_name_prefix="gabguard-stt"),
+}
+pool_sizes = {"io": IO_POOL_SIZE, "cpu": CPU_POOL_SIZE, "stt": STT_POOL_SIZE}
+
+_stats_lock = threading.Lock()
+_stage_stats = {}
+
+
+def _stage(pool: str, stage: str) -> dict:
+    key = f"{pool}:{stage}"
+    if key not in _stage_stats:
+        _stage_stats[key] = {
+            "queued": 0,
+            "running": 0,
+            "max_queued": 0,
+            "completed": 0,
+            "failed": 0,
+            "total_wait_ms": 0.0,
+            "total_run_ms": 0.0,
+        }
+    return _stage_stats[key]
+
+
+def submit(pool: str, stage: str, fn, *args, **kwargs) -> Future:
+    """Zleca wywołanie `fn` w wybranej puli, licząc głębokość kolejki danego etapu."""
+    submitted = time.monotonic()
+    with _stats_lock:
+        stats = _stage(pool, stage)
+        stats["queued"] += 1
+        stats["max_queued"] = max(stats["max_queued"], stats["queued"])
+
+    def call():
+        started = time.monotonic()
+        with _stats_lock:
+            stats["queued"] -= 1
+            stats["running"] += 1
+            stats["total_wait_ms"] += (started - submitted) * 1000.0
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            with _stats_lock:
+                stats["running"] -= 1
+                stats["failed" if failed else "completed"] += 1
+                stats["total_run_ms"] += (time.monotonic() - started) * 1000.0
+
+    return pools[pool].submit(call)
+
+
+async def run_io(stage: str, fn, *args, **kwargs):
+    """Uruchamia blokujące wywołanie I/O poza pętlą zdarzeń."""
+    return await asyncio.wrap_future(submit("io", stage, fn, *args, **kwargs))
+
+
+async def run_cpu(stage: str, fn, *args, **kwargs):
+    """Uruchamia obliczenia CPU (inferencję modelu) w dedykowanej puli."""
+    return await asyncio.wrap_future(submit("cpu", stage, fn, *args, **kwargs))
+
+
+async def run_stt(stage: str, fn, *args, **kwargs):
+    """Uruchamia lokalną transkrypcję mowy w dedykowanej puli."""
+    return await asyncio.wrap_future(submit("stt", stage, fn, *args, **kwargs))
+
+
+def get_executor_stats() -> dict:
+    with _stats_lock:
+        stages = {}
+        for key, stats in _stage_stats.items():
+            finished = (stats["completed"] + stats["failed"]) or 1
+            started = (stats["completed"] + stats["failed"] + stats["running"]) or 1
+            stages[key] = {
+                "queued": stats["queued"],
+                "running": stats["running"],
+                "max_queued": stats["max_queued"],
+                "completed": stats["completed"],
+                "failed": stats["failed"],
+                "avg_wait_ms": stats["total_wait_ms"] / started,
+                "avg_run_ms": stats["total_run_ms"] / finished,
+            }
+    return {"pool_sizes": dict(pool_sizes), "stages": stages}
+
+
+def shutdown_executors():
+    for pool in pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,12 +1,20 @@
 from fastapi import FastAPI, UploadFile, File, Query, Request, HTTPException, WebSocket
 from fastapi.responses import StreamingResponse
 from schemas import TextRequest, TextResponse, AudioResponse, FileAnalysisResponse
-from models.text_classifier import analyze_text
-from models.audio_analyzer import analyze_audio
-from models.file_analyzer import analyze_file_content
+from models.text_classifier import analyze_text_async, get_batching_stats, get_text_cache_stats
+from models.audio_analyzer import analyze_audio, get_audio_stats
+from models.translation import get_translation_stats
+from models.image_moderator import get_image_cache_stats
+from models.image_preprocess import get_image_preprocess_stats
+from models.structured_analysis import get_structured_analysis_stats
+from models.archive_scanner import get_archive_stats
+from models.file_analyzer import analyze_file_content, get_file_cache_stats
 from db.mongodb import report_violation, init_db, get_violations_by_user_and_days
 from websocket.socket_handler import websocket_endpoint
 from report.report_generator import generate_violation_pdf
+from executors import run_io, get_executor_stats, shutdown_executors
+from openai_client import get_openai_stats, close_client
+from uploads import receive_upload, get_upload_stats, UploadError, UploadTooLarge, UPLOAD_OPENAPI
 from io import BytesIO
 from globals import toxicity_score as toxic_score
 import uvicorn
@@ -19,35 +27,63 @@ app = FastAPI()
 async def startup_db():
     init_db()
 
+@app.on_event("shutdown")
+async def shutdown_pools():
+    await close_client()
+    shutdown_executors()
+
 @app.post("/analyze_text", response_model=TextResponse)
 async def analyze_text_route(request: TextRequest):
     global toxic_score
     print(toxic_score)
-    bert_score, gpt_score = analyze_text(request.text)
-    score = (bert_score + gpt_score)/2
+    result = await analyze_text_async(request.text)
+    score = result["toxicity_score"]
     if score > toxic_score:
-        report_violation(user_id=request.user_id, content=request.text, type="text", score=score)
-    return {"user_id": request.user_id, "text": request.text, "toxicity_score": score}
+        await run_io("mongo", report_violation, user_id=request.user_id, content=request.text, type="text", score=score)
+    return {
+        "user_id": request.user_id,
+        "text": request.text,
+        "toxicity_score": score,
+        "stages": result["stages"],
+        "window": result.get("window"),
+    }
 
 @app.post("/analyze_audio", response_model=AudioResponse)
 async def analyze_audio_route(file: UploadFile = File(...), user_id: str = Query(..., description="ID of the user")):
     global toxic_score
-    transcription, bert_score, gpt_score = analyze_audio(file.file)
-    score = (bert_score + gpt_score)/2
+    transcription, result = await analyze_audio(file.file)
+    score = result["toxicity_score"]
     if score > toxic_score:
-        report_violation(user_id=user_id, content=transcription, type="audio", score=score)
-    return {"user_id": user_id, "transcription": transcription, "toxicity_score": score}
+        await run_io("mongo", report_violation, user_id=user_id, content=transcription, type="audio", score=score)
+    return {
+        "user_id": user_id,
+        "transcription": transcription,
+        "toxicity_score": score,
+        "stages": result["stages"],
+        "window": result.get("window"),
+        "removed_silence_s": result.get("removed_silence_s"),
+    }
 
-@app.post("/analyze-file/", response_model=FileAnalysisResponse)
-async def analyze_file_endpoint(file: UploadFile = File(...), user_id: str = Query(..., description="ID of the user uploading the file")):
+@app.post("/analyze-file/", response_model=FileAnalysisResponse, openapi_extra=UPLOAD_OPENAPI)
+async def analyze_file_endpoint(request: Request, user_id: str = Query(..., description="ID of the user uploading the file")):
     global toxic_score
-    result = await analyze_file_content(file.file, file.filename)
+    # Stream the upload ourselves instead of letting FastAPI parse the form: one copy, size limit enforced while receiving
+    try:
+        upload = await receive_upload(request)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with upload:
+        result = await analyze_file_content(upload)
     
     description = result.get("description", "No description available.")
     score = result.get("toxicity_score", -1)
     
     if score > toxic_score:
-        report_violation(
+        await run_io(
+            "mongo",
+            report_violation,
             user_id=user_id,
             content=f"File content: {description}",
             type="file",
@@ -58,6 +94,7 @@ async def analyze_file_endpoint(file: UploadFile = File(...), user_id: str = Que
         "user_id": user_id,
         "description": description,
         "toxicity_score": score,
+        "labels": result.get("labels", []),
     }
 
 @app.get("/users/{user_id}/violations/recent")
@@ -68,11 +105,11 @@ async def get_recent_user_violations(
     user_id_admin: str = Query(..., description="ID of the admin generating the report")
 ):
     global toxic_score
-    violations_data = get_violations_by_user_and_days(user_id, days)
+    violations_data = await run_io("mongo", get_violations_by_user_and_days, user_id, days)
     if not violations_data:
         raise HTTPException(status_code=404, detail="No violations found for this user in the specified period.")
 
-    pdf_buffer, filename = generate_violation_pdf(user_id, user_id_admin, violations_data, days)
+    pdf_buffer, filename = await run_io("report", generate_violation_pdf, user_id, user_id_admin, violations_data, days)
     pdf_content = pdf_buffer.getvalue()
 
     headers = {
@@ -88,6 +125,23 @@ def update_toxicity_score(score_value: float):
     toxic_score = score_value
     return {"message": "Toxicity score updated", "toxicity_score": toxic_score}
 
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "bert_batching": get_batching_stats(),
+        "text_cache": get_text_cache_stats(),
+        "translation": get_translation_stats(),
+        "audio": get_audio_stats(),
+        "image_cache": get_image_cache_stats(),
+        "image_preprocess": get_image_preprocess_stats(),
+        "structured_analysis": get_structured_analysis_stats(),
+        "uploads": get_upload_stats(),
+        "archives": get_archive_stats(),
+        "file_cache": get_file_cache_stats(),
+        "executors": get_executor_stats(),
+        "openai": get_openai_stats(),
+    }
+
 @app.websocket("/ws/audio")
 async def audio_socket(websocket: WebSocket):
     await websocket_endpoint(websocket)
@@ -0,0 +1,246 @@
+import asyncio
+import copy
+import os
+import threading
+import zipfile
+
+from executors import run_io
+from globals import toxicity_score
+from uploads import SpooledUpload, UPLOAD_SPOOL_MAX_MEMORY
+
+# Limity skanowania archiwów (ochrona przed zip-bombami): liczba plików, łączny rozmiar po
+# rozpakowaniu i głębokość zagnieżdżenia - wspólne dla archiwum i wszystkich archiwów w nim
+ARCHIVE_MAX_MEMBERS = int(os.getenv("ARCHIVE_MAX_MEMBERS", "200"))
+ARCHIVE_MAX_TOTAL_BYTES = int(os.getenv("ARCHIVE_MAX_TOTAL_BYTES", str(256 * 1024 * 1024)))
+ARCHIVE_MAX_DEPTH = int(os.getenv("ARCHIVE_MAX_DEPTH", "3"))
+# Maksymalny stopień kompresji pliku (liczony powyżej 1 MB po rozpakowaniu)
+ARCHIVE_MAX_RATIO = int(os.getenv("ARCHIVE_MAX_RATIO", "100"))
+# Ile plików z archiwum jest naraz rozpakowanych i analizowanych
+ARCHIVE_CONCURRENCY = int(os.getenv("ARCHIVE_CONCURRENCY", "4"))
+# Plik z wynikiem co najmniej takim kończy skanowanie całego archiwum
+ARCHIVE_STOP_SCORE = float(os.getenv("ARCHIVE_STOP_SCORE", str(toxicity_score)))
+
+_RATIO_MIN_BYTES = 1024 * 1024
+_READ_BLOCK = 1024 * 1024
+
+_stats_lock = threading.Lock()
+_stats = {"archives": 0, "members": 0, "early_exits": 0, "limit_exceeded": 0, "skipped_members": 0}
+
+
+class ArchiveLimitExceeded(ValueError):
+    pass
+
+
+class ArchiveScan:
+    """Stan skanowania: głębokość oraz limity (`budget`) wspólne dla archiwum i wszystkich
+    archiwów w nim zagnieżdżonych.
+
+    Pliki rozpakowuje naraz kilka zadań (także z różnych poziomów), więc limit jest
+    sprawdzany i pomniejszany w jednym kroku pod blokadą (`reserve`), zanim dane zostaną zapisane.
+    """
+
+    def __init__(self, members_left=ARCHIVE_MAX_MEMBERS, bytes_left=ARCHIVE_MAX_TOTAL_BYTES):
+        self.budget = {"members_left": members_left, "bytes_left": bytes_left}
+        self.depth = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, members=0, size=0) -> bool:
+        """Rezerwuje pliki i bajty z limitu; False (bez zmian), gdy któregoś brakuje."""
+        with self._lock:
+            if members > self.budget["members_left"] or size > self.budget["bytes_left"]:
+                return False
+            self.budget["members_left"] -= members
+            self.budget["bytes_left"] -= size
+            return True
+
+    def release(self, members=0, size=0):
+        """Zwraca do limitu rezerwację pliku, który nie został przeanalizowany."""
+        with self._lock:
+            self.budget["members_left"] += members
+            self.budget["bytes_left"] += size
+
+    def child(self):
+        nested = copy.copy(self)
+        nested.depth += 1
+        return nested
+
+
+def spool_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, scan: ArchiveScan) -> SpooledUpload:
+    """Rozpakowuje jeden plik archiwum strumieniowo do `SpooledUpload`, pilnując limitów.
+
+    Każdy blok jest rezerwowany z limitu bajtów przed zapisem; plik przerwany błędem
+    oddaje swoją rezerwację.
+    """
+    member = SpooledUpload(filename=info.filename, max_memory=UPLOAD_SPOOL_MAX_MEMORY)
+    try:
+        with archive.open(info) as source:
+            while True:
+                block = source.read(_READ_BLOCK)
+                if not block:
+                    break
+                size = member.size + len(block)
+                if size > _RATIO_MIN_BYTES and size > max(info.compress_size, 1) * ARCHIVE_MAX_RATIO:
+                    raise ArchiveLimitExceeded(f"compression ratio of {info.filename} exceeds {ARCHIVE_MAX_RATIO}:1")
+                # Rozmiar z nagłówka archiwum nie jest wiarygodny - liczymy rzeczywiste bajty
+                if not scan.reserve(size=len(block)):
+                    raise ArchiveLimitExceeded(f"uncompressed size limit reached at {info.filename}")
+                member.write(block)
+    except BaseException:
+        scan.release(size=member.size)
+        member.close()
+        raise
+    return member
+
+
+async def scan_archive(upload: SpooledUpload, analyze, scan=None):
+    """Analizuje pliki archiwum ZIP tą samą ścieżką co pojedyncze pliki (`analyze`).
+
+    Pliki są rozpakowywane po kolei, bez zapisu całego archiwum na dysk, a analizowanych
+    jest naraz najwyżej ARCHIVE_CONCURRENCY. Archiwa w archiwum są skanowane rekurencyjnie
+    do ARCHIVE_MAX_DEPTH. Skanowanie kończy się, gdy któryś plik osiągnie ARCHIVE_STOP_SCORE
+    albo gdy przekroczone zostaną limity. Wynik archiwum to najwyższy wynik jego plików.
+    Każdy poziom zatrzymuje się sam - szkodliwy plik w zagnieżdżonym archiwum wraca jako
+    jego wynik i dopiero on kończy skanowanie archiwum nadrzędnego.
+    Zwraca None, gdy nie ma czego analizować (archiwum uszkodzone, puste albo za głęboko).
+    """
+    scan = scan or ArchiveScan()
+    if scan.depth >= ARCHIVE_MAX_DEPTH:
+        return None
+    try:
+        archive = zipfile.ZipFile(upload.open())
+    except (zipfile.BadZipFile, OSError):
+        return None
+
+    semaphore = asyncio.Semaphore(ARCHIVE_CONCURRENCY)
+    results, skipped, tasks = [], [], set()
+    # Rozpakowane pliki zadań - zadanie anulowane przed startem nie zamknie swojego pliku
+    spooled = {}
+    limit_error = None
+    stopped = False
+
+    async def analyze_member(info, member):
+        nonlocal stopped
+        try:
+            result = await analyze(member, scan=scan.child())
+        finally:
+            member.close()
+            semaphore.release()
+        # Wynik trafia do listy, zanim zatrzymanie anuluje pozostałe zadania
+        results.append((info.filename, result))
+        if result.get("toxicity_score", -1) >= ARCHIVE_STOP_SCORE:
+            stopped = True
+
+    with archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        try:
+            for info in members:
+                if stopped:
+                    break
+                if info.flag_bits & 0x1:
+                    skipped.append(info.filename)
+                    continue
+                await semaphore.acquire()
+                if stopped:
+                    semaphore.release()
+                    break
+                if not scan.reserve(members=1):
+                    semaphore.release()
+                    limit_error = "member count limit reached"
+                    break
+                try:
+                    member = await run_io("archive_extract", spool_member, archive, info, scan)
+                except ArchiveLimitExceeded as e:
+                    semaphore.release()
+                    scan.release(members=1)
+                    limit_error = str(e)
+                    break
+                except Exception as e:
+                    semaphore.release()
+                    scan.release(members=1)
+                    print(f"Nie udało się rozpakować {info.filename}: {e}")
+                    skipped.append(info.filename)
+                    continue
+                task = asyncio.create_task(analyze_member(info, member))
+                spooled[task] = member
+                tasks.add(task)
+
+            while tasks and not stopped:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+        finally:
+            # Wczesne zakończenie (albo błąd): pozostałe analizy nie są już potrzebne
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for task in tasks:
+                spooled[task].close()
+
+    _record(len(results), len(skipped), stopped, limit_error)
+    if limit_error and not results:
+        return {
+            "description": f"ZIP archive that was not analyzed: {limit_error}",
+            "toxicity_score": -1,
+            "labels": [],
+            "stages": ["archive:limit"],
+        }
+    if not results:
+        return None
+    return combine_member_verdicts(results, len(members), skipped, limit_error, stopped)
+
+
+def combine_member_verdicts(results, total, skipped, limit_error=None, stopped=False) -> dict:
+    """Werdykt archiwum: najwyższy wynik spośród plików, opis najbardziej szkodliwego pliku."""
+    scored = [(name, result) for name, result in results if result.get("toxicity_score", -1) >= 0]
+    labels = []
+    for _, result in scored:
+        for label in result.get("labels", []):
+            if label != "none" and label not in labels:
+                labels.append(label)
+
+    notes = [f"{len(results)} of {total} files analyzed"]
+    if stopped:
+        notes.append("scan stopped at the first harmful file")
+    if limit_error:
+        notes.append(f"scan limited: {limit_error}")
+    if skipped:
+        notes.append(f"{len(skipped)} files skipped (encrypted or unreadable)")
+    description = f"ZIP archive ({'; '.join(notes)})."
+
+    if scored:
+        worst_name, worst = max(scored, key=lambda item: item[1]["toxicity_score"])
+        description += f" Most concerning file: {worst_name} (score {worst['toxicity_score']:.2f}): {worst.get('description', '')}"
+        score = worst["toxicity_score"]
+    else:
+        score = -1
+
+    return {
+        "description": description,
+        "toxicity_score": score,
+        "labels": labels,
+        "stages": ["archive:stopped" if stopped else "archive:limited" if limit_error else "archive"],
+        "members": [
+            {"name": name, "toxicity_score": result.get("toxicity_score", -1), "mime_type": result.get("mime_type")}
+            for name, result in results
+        ],
+    }
+
+
+def _record(members, skipped, stopped, limit_error):
+    with _stats_lock:
+        _stats["archives"] += 1
+        _stats["members"] += members
+        _stats["skipped_members"] += skipped
+        _stats["early_exits"] += int(stopped)
+        _stats["limit_exceeded"] += int(limit_error is not None)
+
+
+def get_archive_stats() -> dict:
+    with _stats_lock:
+        return {
+            **_stats,
+            "max_members": ARCHIVE_MAX_MEMBERS,
+            "max_total_bytes": ARCHIVE_MAX_TOTAL_BYTES,
+            "max_depth": ARCHIVE_MAX_DEPTH,
+            "concurrency": ARCHIVE_CONCURRENCY,
+        }
@@ -1,86 +1,116 @@
 import os
-import openai
-import tempfile
-from pydub import AudioSegment
-from models.text_classifier import analyze_text
+import asyncio
+from models.text_classifier import analyze_text_async
+from models.audio_frontend import AUDIO_SAMPLE_RATE, iter_transcription_chunks
+from models.transcription_backends import get_transcription_backend
+from models.vad import VAD_TRIM_ENABLED
+from executors import run_io
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Ile fragmentów długiego nagrania transkrybujemy równolegle (tyle też jest naraz w pamięci)
+AUDIO_TRANSCRIBE_CONCURRENCY = int(os.getenv("AUDIO_TRANSCRIBE_CONCURRENCY", "4"))
+
+# Sumaryczne statystyki wycinania ciszy (dla /metrics)
+_audio_stats = {"files": 0, "silent_skipped": 0, "input_s": 0.0, "removed_s": 0.0}
+
+async def analyze_pcm(pcm: bytes, sample_rate: int = AUDIO_SAMPLE_RATE):
+    """Transkrybuje i ocenia fragment PCM (np. jedną wypowiedź ze strumienia websocket)."""
+    transcription = await get_transcription_backend().transcribe_pcm(pcm, sample_rate)
+    if not transcription.strip():
+        return transcription, {"toxicity_score": 0.0, "bert_score": None, "gpt_score": None, "stages": ["empty"]}
+    return transcription, await analyze_text_async(transcription)
+
+async def _transcribe_pcm(pcm: bytes, index: int = 0) -> str:
+    # Backend (API OpenAI albo lokalny model) wybierany przez TRANSCRIPTION_BACKEND
+    return await get_transcription_backend().transcribe_pcm(pcm, AUDIO_SAMPLE_RATE, index)
+
+async def analyze_audio(file):
+    """Dekoduje nagranie potokiem ffmpeg, wycina ciszę, transkrybuje je fragmentami i ocenia transkrypcję raz.
+
+    `file` może być obiektem plikowym, ścieżką albo bajtami. Nic nie jest zapisywane na dysk
+    (poza kontenerami MP4 podanymi jako strumień), a w pamięci jest naraz najwyżej
+    AUDIO_TRANSCRIBE_CONCURRENCY fragmentów PCM. Nagrania bez mowy nie trafiają do Whisper.
+    """
+    vad_report = {}
+    transcription = await process_large_audio_file(file, vad_report=vad_report)
+    removed_s = round(vad_report.get("removed_s", 0.0), 2)
+    _record_audio_stats(vad_report)
+    print(f"TRANSKRYPCJA AUDIO: '{transcription}' (wycięta cisza: {removed_s} s)")
+
+    if not transcription.strip():
+        # Cisza (albo brak rozpoznanej mowy) - nie ma czego oceniać
+        stage = "vad:silent" if vad_report and vad_report["speech_s"] == 0 else "empty"
+        result = {"toxicity_score": 0.0, "bert_score": None, "gpt_score": None, "stages": [stage]}
+    else:
+        # Analiza transkrypcji pod kątem toksyczności (raz, ta sama kaskada co dla tekstu)
+        result = await analyze_text_async(transcription)
+        print(f"WYNIKI OCENY: BERT={result['bert_score']}, GPT={result['gpt_score']}, etapy={result['stages']}")
+
+    result["removed_silence_s"] = removed_s
+    return transcription, result
+
+def _record_audio_stats(vad_report):
+    _audio_stats["files"] += 1
+    _audio_stats["input_s"] += vad_report.get("input_s", 0.0)
+    _audio_stats["removed_s"] += vad_report.get("removed_s", 0.0)
+    if vad_report and vad_report["speech_s"] == 0:
+        _audio_stats["silent_skipped"] += 1
+
+def get_audio_stats():
+    input_s = _audio_stats["input_s"]
+    return {
+        **_audio_stats,
+        "vad_trim_enabled": VAD_TRIM_ENABLED,
+        "transcription_backend": get_transcription_backend().describe(),
+        "removed_ratio": _audio_stats["removed_s"] / input_s if input_s else 0.0,
+    }
+
+async def transcribe_chunks(chunks, transcriber=_transcribe_pcm, concurrency: int = AUDIO_TRANSCRIBE_CONCURRENCY):
+    """Transkrybuje fragmenty PCM równolegle (najwyżej `concurrency` naraz) i zwraca teksty w kolejności.
+
+    `chunks` to zwykły (blokujący) iterator - kolejny fragment jest pobierany dopiero,
+    gdy zwolni się miejsce, więc dekodowanie nie wyprzedza transkrypcji.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = []
+    pending = None
+
+    async def worker(index, pcm):
+        try:
+            return await transcriber(pcm, index)
+        finally:
+            semaphore.release()
 
-def analyze_audio(file):
-    # Utworzenie katalogu tymczasowego dla plików większego rozmiaru
-    temp_dir = tempfile.mkdtemp()
     try:
-        # Zapisz cały plik do tymczasowego pliku
-        input_path = os.path.join(temp_dir, "input_audio.wav")
-        with open(input_path, "wb") as tmp:
-            tmp.write(file.read())
-        
-        # Konwersja do WAV z obsługą dużych plików
-        audio = AudioSegment.from_file(input_path)
-        wav_path = os.path.join(temp_dir, "output_audio.wav")
-        
-        # Ustawienie parametrów dla WAV, aby zmniejszyć rozmiar pliku
-        # przy zachowaniu akceptowalnej jakości dźwięku
-        audio = audio.set_channels(1)  # Mono zamiast stereo
-        audio = audio.set_frame_rate(16000)  # Niższa częstotliwość próbkowania
-        audio = audio.set_sample_width(2)  # 16-bit zamiast 24/32-bit
-        
-        # Eksport z parametrami kompresji
-        audio.export(wav_path, format="wav")
-        
-        # Sprawdzenie rozmiaru pliku WAV
-        wav_size = os.path.getsize(wav_path)
-        
-        # Jeśli plik jest zbyt duży dla API OpenAI (>25MB), dzielimy go na części
-        if wav_size > 25 * 1024 * 1024:
-            transcription = process_large_audio_file(audio, temp_dir)
-            # Analiza transkrypcji pod kątem toksyczności
-            bert_score, gpt_score = analyze_text(transcription)
-        else:
-            # Standardowe przetwarzanie dla mniejszych plików
-            with open(wav_path, "rb") as audio_file:
-                transcription = openai.Audio.transcribe("whisper-1", audio_file)["text"]
-                
-            print(f"TRANSKRYPCJA AUDIO: '{transcription}'")
-    
-            # Analiza transkrypcji pod kątem toksyczności
-            bert_score, gpt_score = analyze_text(transcription)
-            print(f"WYNIKI OCENY: BERT={bert_score}, GPT={gpt_score}")
-        
-        # Analiza transkrypcji pod kątem toksyczności
-        score, gpt_score = analyze_text(transcription)
-        
-        return transcription, score, gpt_score
-    
+        while True:
+            await semaphore.acquire()
+            failed = next((task for task in tasks if task.done() and not task.cancelled() and task.exception()), None)
+            if failed is not None:
+                semaphore.release()
+                raise failed.exception()
+            # Odczyt z potoku ffmpeg jest blokujący, więc idzie przez pulę I/O
+            pending = asyncio.ensure_future(run_io("audio_decode", next, chunks, None))
+            pcm = await asyncio.shield(pending)
+            if pcm is None:
+                semaphore.release()
+                break
+            tasks.append(asyncio.create_task(worker(len(tasks), pcm)))
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # Anulowanie nie przerwie `next` w wątku puli - czekamy na nie, zanim wywołujący zamknie generator
+        if pending is not None and not pending.done():
+            await asyncio.wait({pending})
+        raise
+
+async def process_large_audio_file(file, concurrency: int = AUDIO_TRANSCRIBE_CONCURRENCY, vad_report: dict = None):
+    """Dzieli nagranie w miejscach ciszy na fragmenty poniżej limitu 25 MB API i transkrybuje je równolegle."""
+    chunks = iter_transcription_chunks(file, vad_report=vad_report)
+    try:
+        transcriptions = await transcribe_chunks(chunks, concurrency=concurrency)
     finally:
-        # Czyszczenie plików tymczasowych
-        for root, dirs, files in os.walk(temp_dir, topdown=False):
-            for name in files:
-                os.remove(os.path.join(root, name))
-        os.rmdir(temp_dir)
-
-def process_large_audio_file(audio, temp_dir):
-    """Przetwarza duże pliki audio dzieląc je na mniejsze fragmenty."""
-    # Długość segmentu w milisekundach (5 minut)
-    segment_length = 5 * 60 * 1000
-    
-    # Obliczenie liczby segmentów
-    audio_length = len(audio)
-    segments = []
-    
-    # Podział audio na segmenty
-    for i in range(0, audio_length, segment_length):
-        segment = audio[i:i + segment_length]
-        segment_path = os.path.join(temp_dir, f"segment_{i//segment_length}.wav")
-        segment.export(segment_path, format="wav")
-        segments.append(segment_path)
-    
-    # Transkrypcja każdego segmentu
-    transcriptions = []
-    for segment_path in segments:
-        with open(segment_path, "rb") as audio_file:
-            segment_transcription = openai.Audio.transcribe("whisper-1", audio_file)["text"]
-            transcriptions.append(segment_transcription)
-    
-    # Połączenie wszystkich transkrypcji
-    return " ".join(transcriptions)
\ No newline at end of file
+        # Zamknięcie generatora kończy proces ffmpeg i sprząta ewentualny plik tymczasowy
+        await run_io("audio_decode", chunks.close)
+
+    # Połączenie transkrypcji w kolejności fragmentów
+    return " ".join(text.strip() for text in transcriptions if text.strip())
@@ -0,0 +1,200 @@
+import os
+import io
+import wave
+import shutil
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from models.vad import VAD_FRAME_MS, VAD_TRIM_ENABLED, frame_bytes, frame_energies_db, strip_silence
+
+# Format, w jakim audio trafia do transkrypcji: mono, 16 kHz, 16 bit
+AUDIO_SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+# Długość fragmentu PCM (w sekundach) - ogranicza szczytowe zużycie pamięci;
+# 5 minut WAV 16 kHz mono to ok. 9.6 MB, czyli poniżej limitu 25 MB API Whisper
+AUDIO_CHUNK_SECONDS = float(os.getenv("AUDIO_CHUNK_SECONDS", "300"))
+
+# Fragmenty tniemy w najcichszym miejscu ostatnich AUDIO_SPLIT_SEARCH_S sekund przed limitem,
+# żeby nie przecinać słów na granicy fragmentów
+AUDIO_SPLIT_SEARCH_S = float(os.getenv("AUDIO_SPLIT_SEARCH_S", "15"))
+_SPLIT_SMOOTHING_MS = 300
+
+_PIPE_BLOCK_SIZE = 64 * 1024
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+def pcm_to_wav_bytes(pcm: bytes, sample_rate: int = AUDIO_SAMPLE_RATE) -> bytes:
+    """Opakowuje surowe PCM s16le mono w nagłówek WAV, bez zapisu na dysk."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def _read_header(source, size=16) -> bytes:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:size])
+    position = source.tell()
+    header = source.read(size)
+    source.seek(position)
+    return header
+
+
+def _needs_seekable_input(header: bytes) -> bool:
+    # Kontenery MP4/M4A/MOV mogą mieć indeks (moov) na końcu pliku - ffmpeg nie odczyta ich z potoku
+    return header[4:8] == b"ftyp"
+
+
+def _feed_stdin(stdin, source):
+    try:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)
+            for offset in range(0, len(view), _PIPE_BLOCK_SIZE):
+                stdin.write(view[offset:offset + _PIPE_BLOCK_SIZE])
+        else:
+            while True:
+                block = source.read(_PIPE_BLOCK_SIZE)
+                if not block:
+                    break
+                stdin.write(block)
+    except (BrokenPipeError, ValueError):
+        # ffmpeg zakończył się wcześniej (np. błąd dekodowania) - komunikat przyjdzie przez stderr
+        pass
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+def iter_pcm_chunks(source, chunk_seconds: float = AUDIO_CHUNK_SECONDS, sample_rate: int = AUDIO_SAMPLE_RATE):
+    """Dekoduje dowolny format audio przez jeden potok ffmpeg i zwraca kolejne fragmenty PCM.
+
+    `source` może być ścieżką, deskryptorem pliku, obiektem plikowym albo bajtami. Każdy fragment to PCM s16le
+    mono o długości co najwyżej `chunk_seconds`, więc w pamięci jest naraz tylko jeden
+    fragment zamiast kilku pełnych kopii nagrania.
+    """
+    temp_path = None
+    pass_fds = ()
+    if isinstance(source, int):
+        # Deskryptor otwartego pliku (np. wspólna kopia wideo) - ffmpeg otwiera go przez /dev/fd
+        input_arg, stdin_source, pass_fds = f"/dev/fd/{source}", None, (source,)
+    elif isinstance(source, (str, os.PathLike)):
+        input_arg, stdin_source = str(source), None
+    elif isinstance(getattr(source, "name", None), str) and os.path.isfile(source.name):
+        input_arg, stdin_source = source.name, None
+    elif _needs_seekable_input(_read_header(source)):
+        # Jedyny przypadek, w którym potrzebujemy kopii na dysku
+        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_file:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                temp_file.write(source)
+            else:
+                shutil.copyfileobj(source, temp_file, _PIPE_BLOCK_SIZE)
+            temp_path = temp_file.name
+        input_arg, stdin_source = temp_path, None
+    else:
+        input_arg, stdin_source = "pipe:0", source
+
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", input_arg,
+        "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "-acodec", "pcm_s16le", "pipe:1",
+    ]
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE if stdin_source is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        pass_fds=pass_fds,
+    )
+    writer = None
+    if stdin_source is not None:
+        writer = threading.Thread(target=_feed_stdin, args=(process.stdin, stdin_source), daemon=True)
+        writer.start()
+
+    chunk_size = max(1, int(chunk_seconds * sample_rate)) * SAMPLE_WIDTH
+    buffer = bytearray()
+    try:
+        while True:
+            data = process.stdout.read(_PIPE_BLOCK_SIZE)
+            if not data:
+                break
+            buffer.extend(data)
+            while len(buffer) >= chunk_size:
+                yield bytes(buffer[:chunk_size])
+                del buffer[:chunk_size]
+
+        process.wait()
+        if process.returncode != 0:
+            raise AudioDecodeError(f"ffmpeg failed: {process.stderr.read().decode(errors='replace').strip()}")
+        if buffer:
+            yield bytes(buffer)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        if writer is not None:
+            writer.join(timeout=1)
+        process.stdout.close()
+        process.stderr.close()
+        if temp_path is not None:
+            os.unlink(temp_path)
+
+
+def find_split_point(pcm: bytes, sample_rate: int = AUDIO_SAMPLE_RATE, frame_ms: int = VAD_FRAME_MS) -> int:
+    """Przesunięcie (w bajtach) najcichszego miejsca w `pcm`; przy remisie wybiera najpóźniejsze."""
+    energies = frame_energies_db(pcm, sample_rate, frame_ms)
+    if len(energies) == 0:
+        return len(pcm)
+    # Wygładzenie oknem ~300 ms, żeby cięcie trafiało w pauzę, a nie w pojedynczą cichą ramkę
+    width = max(1, min(len(energies), _SPLIT_SMOOTHING_MS // frame_ms))
+    smoothed = np.convolve(energies, np.ones(width) / width, mode="same")
+    frame = len(smoothed) - 1 - int(np.argmin(smoothed[::-1]))
+    return frame * frame_bytes(sample_rate, frame_ms) or len(pcm)
+
+
+def align_chunks(blocks, sample_rate: int = AUDIO_SAMPLE_RATE, chunk_seconds: float = AUDIO_CHUNK_SECONDS,
+                 search_seconds: float = AUDIO_SPLIT_SEARCH_S):
+    """Skleja bloki PCM w fragmenty nie dłuższe niż `chunk_seconds`, cięte w ciszy.
+
+    Granica fragmentu to najcichsze miejsce w ostatnich `search_seconds` przed limitem.
+    Bufor nie przekracza jednego fragmentu i jednego bloku wejściowego.
+    """
+    chunk_size = max(1, int(chunk_seconds * sample_rate)) * SAMPLE_WIDTH
+    search_size = min(chunk_size, int(search_seconds * sample_rate) * SAMPLE_WIDTH)
+    buffer = bytearray()
+    for block in blocks:
+        buffer.extend(block)
+        while len(buffer) >= chunk_size:
+            window_start = chunk_size - search_size
+            cut = window_start + find_split_point(bytes(buffer[window_start:chunk_size]), sample_rate)
+            yield bytes(buffer[:cut])
+            del buffer[:cut]
+    if buffer:
+        yield bytes(buffer)
+
+
+def iter_transcription_chunks(source, chunk_seconds: float = AUDIO_CHUNK_SECONDS,
+                              search_seconds: float = AUDIO_SPLIT_SEARCH_S, sample_rate: int = AUDIO_SAMPLE_RATE,
+                              trim_silence: bool = VAD_TRIM_ENABLED, vad_report: dict = None):
+    """Fragmenty nagrania gotowe do transkrypcji: dekodowane potokiem ffmpeg, bez ciszy i cięte w pauzach.
+
+    Przy `trim_silence` długie pauzy są wycinane przed podziałem (`strip_silence`), więc
+    nagranie bez mowy nie daje żadnego fragmentu; podsumowanie trafia do `vad_report`.
+    """
+    # ffmpeg oddaje krótkie bloki, dzięki czemu bufor wyrównania pozostaje mały
+    blocks = iter_pcm_chunks(source, chunk_seconds=max(1.0, min(search_seconds, chunk_seconds)), sample_rate=sample_rate)
+    try:
+        speech = strip_silence(blocks, sample_rate, vad_report) if trim_silence else blocks
+        yield from align_chunks(speech, sample_rate, chunk_seconds, search_seconds)
+    finally:
+        blocks.close()
@@ -0,0 +1,173 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+
+class MicroBatcher:
+    """Zbiera pojedyncze zapytania z wielu wątków i przepuszcza je przez model jedną paczką.
+
+    Pierwsze zapytanie w kolejce otwiera okno o długości `max_wait_ms`; wszystko, co
+    przyjdzie w tym oknie (maksymalnie `max_batch_size` elementów), trafia do jednego
+    wywołania `predict_batch`. Każdy wywołujący dostaje własny `Future` z wynikiem.
+
+    Jeśli podano `run_batch` (np. zlecenie do puli CPU z `executors`), paczki są
+    liczone tam, a nowa paczka jest zbierana dopiero, gdy zwolni się jeden z
+    `max_concurrent_batches` slotów - w międzyczasie kolejka rośnie, a paczki są większe.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=16, max_wait_ms=5.0, name="batcher",
+                 run_batch=None, max_concurrent_batches=1):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self.run_batch = run_batch
+        self._slots = threading.Semaphore(max(1, int(max_concurrent_batches)))
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._batch_sizes = {}
+        self._max_batch_seen = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._inference_total = 0.0
+        self._errors = 0
+        self._cancelled = 0
+
+    def submit(self, item) -> Future:
+        """Dodaje element do kolejki i zwraca Future z jego wynikiem."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def predict(self, item, timeout=None):
+        """Wersja blokująca `submit` dla synchronicznych wywołań."""
+        return self.submit(item).result(timeout=timeout)
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._slots.acquire()
+            batch = [self._queue.get()]
+            deadline = batch[0][2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                if self.run_batch is None:
+                    self._process(batch)
+                else:
+                    self.run_batch(self._process, batch)
+            except Exception as e:
+                # Np. pula CPU zamknięta - paczka nie ruszyła, ale wątek zbierający musi działać dalej
+                self._slots.release()
+                self._fail(batch, e)
+
+    def _process(self, batch):
+        try:
+            self._process_batch(batch)
+        except Exception as e:
+            # Błąd poza obsługą pojedynczych elementów nie może zostawić wywołujących bez wyniku
+            self._fail(batch, e)
+        finally:
+            self._slots.release()
+
+    def _fail(self, batch, error):
+        failed = 0
+        for _, future, _ in batch:
+            if future.done():
+                continue
+            try:
+                future.set_exception(error)
+                failed += 1
+            except InvalidStateError:
+                # Anulowany w międzyczasie przez wywołującego
+                pass
+        with self._stats_lock:
+            self._errors += failed
+
+    def _process_batch(self, batch):
+        # Wywołujący, którego limit czasu już minął, anulował swój Future - nie liczymy go,
+        # a pozostałe są oznaczane jako uruchomione, więc nie da się ich już anulować
+        live = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+        if len(live) < len(batch):
+            with self._stats_lock:
+                self._cancelled += len(batch) - len(live)
+        batch = live
+        if not batch:
+            return
+
+        started = time.monotonic()
+        items = [item for item, _, _ in batch]
+
+        try:
+            results = self.predict_batch(items)
+        except Exception:
+            # Jeden wadliwy element (np. za długi tekst) nie może zepsuć wyniku pozostałym,
+            # więc w razie błędu liczymy każdy element osobno.
+            results = None
+
+        if results is not None and len(results) == len(batch):
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+        else:
+            for item, future, _ in batch:
+                try:
+                    future.set_result(self.predict_batch([item])[0])
+                except Exception as e:
+                    future.set_exception(e)
+                    with self._stats_lock:
+                        self._errors += 1
+
+        finished = time.monotonic()
+        waits = [started - enqueued for _, _, enqueued in batch]
+        size = len(batch)
+        with self._stats_lock:
+            self._requests += size
+            self._batches += 1
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+            self._inference_total += finished - started
+
+    def stats(self) -> dict:
+        """Statystyki do strojenia `max_batch_size` i `max_wait_ms`."""
+        with self._stats_lock:
+            batches = self._batches or 1
+            requests = self._requests or 1
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": self._batches,
+                "errors": self._errors,
+                "cancelled": self._cancelled,
+                "avg_batch_size": self._requests / batches,
+                "max_batch_size_seen": self._max_batch_seen,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_queue_wait_ms": self._wait_total / requests * 1000.0,
+                "max_queue_wait_ms": self._wait_max * 1000.0,
+                "avg_batch_inference_ms": self._inference_total / batches * 1000.0,
+            }
@@ -0,0 +1,231 @@
+import os
+import threading
+import statistics
+from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+
+# Model wielojęzyczny oceniający tekst oryginalny (bez tłumaczenia na angielski)
+MULTILINGUAL_MODEL = os.getenv("MULTILINGUAL_MODEL", "textdetox/xlmr-large-toxicity-classifier")
+MULTILINGUAL_TOXIC_LABELS = [label.strip() for label in os.getenv("MULTILINGUAL_TOXIC_LABELS", "toxic,LABEL_1").split(",") if label.strip()]
+
+# Liczba wątków inferencji na CPU (0 = domyślne ustawienie biblioteki)
+CLASSIFIER_NUM_THREADS = int(os.getenv("CLASSIFIER_NUM_THREADS", "0"))
+
+# Katalog z wyeksportowanym grafem ONNX; przy pierwszym uruchomieniu eksport trafia tutaj
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx/toxic-bert")
+
+# Długie teksty: zakładka między oknami (w tokenach) i liczba okien w jednym przejściu modelu
+LONG_TEXT_OVERLAP = int(os.getenv("LONG_TEXT_OVERLAP", "64"))
+LONG_TEXT_BATCH_SIZE = int(os.getenv("LONG_TEXT_BATCH_SIZE", "32"))
+
+# Dopuszczalna różnica wyników względem modelu FP32 w teście zgodności
+PARITY_TOLERANCE = float(os.getenv("PARITY_TOLERANCE", "0.05"))
+
+
+class ClassifierBackend:
+    """Wspólny interfejs backendów klasyfikatora toksyczności.
+
+    `predict` przyjmuje listę tekstów i zwraca listę wyników 0-1 w tej samej kolejności.
+    `needs_translation` mówi, czy tekst trzeba najpierw przetłumaczyć na angielski.
+    """
+
+    name = "base"
+    model_name = None
+    needs_translation = True
+
+    def load(self):
+        raise NotImplementedError
+
+    def predict(self, texts):
+        raise NotImplementedError
+
+    @property
+    def max_tokens(self) -> int:
+        """Maksymalna liczba tokenów tekstu (bez tokenów specjalnych) w jednym oknie."""
+        raise NotImplementedError
+
+    def split_windows(self, text, overlap=LONG_TEXT_OVERLAP):
+        """Tokenizuje tekst raz i dzieli go na zachodzące okna: lista (token_ids, start, end)."""
+        raise NotImplementedError
+
+    def score_windows(self, windows):
+        """Ocenia okna z `split_windows` paczkami bezpośrednio w modelu."""
+        raise NotImplementedError
+
+    def describe(self) -> dict:
+        return {"name": self.name, "model": self.model_name, "needs_translation": self.needs_translation}
+
+
+class PipelineBackend(ClassifierBackend):
+    """Backend oparty o `transformers.pipeline("text-classification")`.
+
+    Bez `toxic_labels` wynikiem jest najwyższy wynik spośród etykiet (toxic-bert ma same
+    kategorie toksyczności), w przeciwnym razie suma wyników wskazanych etykiet.
+    """
+
+    def __init__(self, name, model_name, needs_translation=True, toxic_labels=None):
+        self.name = name
+        self.model_name = model_name
+        self.needs_translation = needs_translation
+        self.toxic_labels = toxic_labels
+        self.pipeline = None
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        if self.pipeline is None:
+            with self._load_lock:
+                if self.pipeline is None:
+                    self.pipeline = self._build_pipeline()
+        return self
+
+    def _build_pipeline(self):
+        _configure_torch_threads()
+        return pipeline("text-classification", model=self.model_name, top_k=None)
+
+    def _score(self, label_scores):
+        if self.toxic_labels is None:
+            return max(item["score"] for item in label_scores)
+        return min(1.0, sum(item["score"] for item in label_scores if item["label"] in self.toxic_labels))
+
+    def predict(self, texts):
+        self.load()
+        # Jedno przejście modelu dla całej paczki tekstów
+        results = self.pipeline(texts, batch_size=len(texts))
+        return [self._score(label_scores) for label_scores in results]
+
+    @property
+    def max_tokens(self) -> int:
+        self.load()
+        tokenizer = self.pipeline.tokenizer
+        return min(tokenizer.model_max_length, 512) - tokenizer.num_special_tokens_to_add()
+
+    def split_windows(self, text, overlap=LONG_TEXT_OVERLAP):
+        self.load()
+        encoding = self.pipeline.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        ids, offsets = encoding["input_ids"], encoding["offset_mapping"]
+        if not ids:
+            return [([], 0, 0)]
+
+        size = self.max_tokens
+        step = max(1, size - overlap)
+        windows = []
+        for start in range(0, len(ids), step):
+            chunk = ids[start:start + size]
+            # Zakres znaków okna w tekście oryginalnym (do wskazania fragmentu)
+            windows.append((chunk, offsets[start][0], offsets[start + len(chunk) - 1][1]))
+            if start + size >= len(ids):
+                break
+        return windows
+
+    def score_windows(self, windows):
+        import torch
+
+        self.load()
+        tokenizer = self.pipeline.tokenizer
+        model = self.pipeline.model
+        config = model.config
+        multi_label = config.problem_type == "multi_label_classification" or config.num_labels == 1
+
+        scores = []
+        for i in range(0, len(windows), LONG_TEXT_BATCH_SIZE):
+            input_ids = [tokenizer.build_inputs_with_special_tokens(ids) for ids, _, _ in windows[i:i + LONG_TEXT_BATCH_SIZE]]
+            batch = tokenizer.pad({"input_ids": input_ids}, return_tensors="pt")
+            if "token_type_ids" in tokenizer.model_input_names:
+                batch["token_type_ids"] = torch.zeros_like(batch["input_ids"])
+            with torch.no_grad():
+                logits = model(**batch).logits
+            # Ta sama funkcja aktywacji, której używa pipeline dla danego modelu
+            probabilities = torch.sigmoid(logits) if multi_label else torch.softmax(logits, dim=-1)
+            for row in probabilities.tolist():
+                scores.append(self._score([
+                    {"label": config.id2label[j], "score": p} for j, p in enumerate(row)
+                ]))
+        return scores
+
+
+class QuantizedPipelineBackend(PipelineBackend):
+    """Model FP32 po dynamicznej kwantyzacji warstw liniowych do INT8 (PyTorch, CPU)."""
+
+    def _build_pipeline(self):
+        import torch
+
+        _configure_torch_threads()
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return pipeline("text-classification", model=model, tokenizer=tokenizer, top_k=None)
+
+
+class OnnxPipelineBackend(PipelineBackend):
+    """Graf ONNX uruchamiany przez ONNX Runtime (wymaga pakietu optimum[onnxruntime])."""
+
+    def __init__(self, name, model_name, export_dir, needs_translation=True, toxic_labels=None):
+        super().__init__(name, model_name, needs_translation=needs_translation, toxic_labels=toxic_labels)
+        self.export_dir = export_dir
+
+    def _build_pipeline(self):
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+
+        session_options = onnxruntime.SessionOptions()
+        if CLASSIFIER_NUM_THREADS > 0:
+            session_options.intra_op_num_threads = CLASSIFIER_NUM_THREADS
+
+        if os.path.isdir(self.export_dir):
+            model = ORTModelForSequenceClassification.from_pretrained(self.export_dir, session_options=session_options)
+            tokenizer = AutoTokenizer.from_pretrained(self.export_dir)
+        else:
+            # Jednorazowy eksport z modelu PyTorch i zapis na dysk dla kolejnych uruchomień
+            model = ORTModelForSequenceClassification.from_pretrained(self.model_name, export=True, session_options=session_options)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model.save_pretrained(self.export_dir)
+            tokenizer.save_pretrained(self.export_dir)
+        return pipeline("text-classification", model=model, tokenizer=tokenizer, top_k=None)
+
+
+def _configure_torch_threads():
+    if CLASSIFIER_NUM_THREADS > 0:
+        import torch
+        torch.set_num_threads(CLASSIFIER_NUM_THREADS)
+
+
+BACKEND_FACTORIES = {
+    "toxic-bert": lambda: PipelineBackend("toxic-bert", "unitary/toxic-bert", needs_translation=True),
+    "toxic-bert-int8": lambda: QuantizedPipelineBackend("toxic-bert-int8", "unitary/toxic-bert", needs_translation=True),
+    "toxic-bert-onnx": lambda: OnnxPipelineBackend("toxic-bert-onnx", "unitary/toxic-bert", ONNX_MODEL_DIR, needs_translation=True),
+    "multilingual": lambda: PipelineBackend(
+        "multilingual",
+        MULTILINGUAL_MODEL,
+        needs_translation=False,
+        toxic_labels=MULTILINGUAL_TOXIC_LABELS,
+    ),
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str) -> ClassifierBackend:
+    """Zwraca (i przy pierwszym użyciu ładuje) backend o podanej nazwie."""
+    if name not in BACKEND_FACTORIES:
+        raise ValueError(f"Unknown classifier backend '{name}'. Available: {', '.join(BACKEND_FACTORIES)}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKEND_FACTORIES[name]().load()
+        return _backends[name]
+
+
+def check_parity(backend_name: str, texts, reference_name: str = "toxic-bert", tolerance: float = PARITY_TOLERANCE) -> dict:
+    """Porównuje wyniki backendu z modelem referencyjnym (FP32) na tych samych tekstach."""
+    backend = get_backend(backend_name)
+    reference = get_backend(reference_name)
+    scores = backend.predict(list(texts))
+    reference_scores = reference.predict(list(texts))
+    diffs = [abs(a - b) for a, b in zip(scores, reference_scores)]
+    return {
+        "backend": backend_name,
+        "reference": reference_name,
+        "tolerance": tolerance,
+        "max_abs_diff": max(diffs),
+        "mean_abs_diff": statistics.mean(diffs),
+        "passed": max(diffs) <= tolerance,
+    }
@@ -1,108 +1,138 @@
+import io
 import os
 import json
 import PyPDF2
-import docx
 import csv
-from io import BytesIO
 from typing import BinaryIO, Dict, Any
 import magic
-import tempfile
 import zipfile
 import xml.etree.ElementTree as ET
-import openai
-from models.video_analysis import analyze_video
+from models.video_analysis import analyze_video, VIDEO_SAMPLE_FRAMES, VIDEO_CANDIDATE_FRAMES, VIDEO_PHASH_THRESHOLD
 from models.audio_analyzer import analyze_audio
-from models.image_moderator import analyze_image
+from models.image_moderator import analyze_image, IMAGE_PIPELINE_VERSION
+from models.text_classifier import TEXT_PIPELINE_VERSION
+from models.transcription_backends import TRANSCRIPTION_BACKEND
+from models.structured_analysis import ANALYSIS_MODE, STRUCTURED_SYSTEM_PROMPT, analyze_structured
+from models.verdict_cache import VerdictCache, content_hash
+from models.archive_scanner import ArchiveScan, scan_archive
+from openai_client import chat_completion, message_content
+from executors import run_io
+from uploads import SpooledUpload, MIME_SNIFF_BYTES
 
-# Use API key from config
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Extractors stop once this many characters of text have been produced
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "10000"))
 
-async def analyze_file_content(file: BinaryIO, filename: str) -> Dict[str, Any]:
+# Verdicts of whole files keyed by the SHA-256 of their content (reposted attachments)
+FILE_CACHE_SIZE = int(os.getenv("FILE_CACHE_SIZE", "2000"))
+FILE_CACHE_TTL_S = float(os.getenv("FILE_CACHE_TTL_S", str(24 * 3600)))
+FILE_CACHE_MONGO = os.getenv("FILE_CACHE_MONGO", "1") == "1"
+FILE_CACHE_MONGO_TTL_S = float(os.getenv("FILE_CACHE_MONGO_TTL_S", str(30 * 24 * 3600)))
+
+# Pipeline version - a change to any analyzer a file can be routed to invalidates cached verdicts
+FILE_PIPELINE_VERSION = content_hash(
+    ANALYSIS_MODE,
+    STRUCTURED_SYSTEM_PROMPT,
+    IMAGE_PIPELINE_VERSION,
+    TEXT_PIPELINE_VERSION,
+    TRANSCRIPTION_BACKEND,
+    f"{VIDEO_SAMPLE_FRAMES}:{VIDEO_CANDIDATE_FRAMES}:{VIDEO_PHASH_THRESHOLD}",
+    str(EXTRACT_MAX_CHARS),
+    os.getenv("FILE_CACHE_VERSION", ""),
+)[:16]
+
+file_cache = VerdictCache(
+    "file",
+    FILE_PIPELINE_VERSION,
+    maxsize=FILE_CACHE_SIZE,
+    ttl=FILE_CACHE_TTL_S,
+    persistent=FILE_CACHE_MONGO,
+    persistent_ttl=FILE_CACHE_MONGO_TTL_S,
+)
+
+async def analyze_file_content(upload: SpooledUpload, scan: ArchiveScan = None) -> Dict[str, Any]:
     """
     Analyze any file type and return content description and toxicity score.
     
+    Repeated files are answered from the verdict cache, keyed by the SHA-256 computed
+    while the file was received, before anything is decoded.
+    
     Args:
-        file: File-like object containing the file data
-        filename: Original filename with extension
+        upload: The received file (a single spooled copy, see uploads.receive_upload)
+        scan: Limits shared with the enclosing archive when the file is an archive member
     
     Returns:
         Dictionary with description and toxicity_score
     """
+    # The extension is part of the key because it also decides which analyzer runs
+    cache_key = f"{upload.sha256}:{os.path.splitext(upload.filename or '')[1].lower()}"
+    cached = await run_io("file_cache", file_cache.get, cache_key)
+    if cached is not None:
+        return {**cached, "stages": ["cache"]}
+    
+    result = await _analyze_file_content(upload, scan)
+    
+    if _is_cacheable(result, scan):
+        verdict = {key: value for key, value in result.items() if key != "stages"}
+        await run_io("file_cache", file_cache.set, cache_key, verdict)
+    return result
+
+# Descriptions produced by the error paths of the analyzers instead of a real description
+_ERROR_DESCRIPTIONS = ("No description available", "Error", "Video rejected")
+
+def _is_cacheable(result: Dict[str, Any], scan: ArchiveScan) -> bool:
+    """Only complete verdicts are cached, with the same rules as the text and image caches.
+
+    No errors or timeouts in any stage, no error descriptions and no archive scans cut
+    short by limits.
+    """
+    if result.get("toxicity_score", -1) < 0:
+        return False
+    if str(result.get("description", "")).startswith(_ERROR_DESCRIPTIONS):
+        return False
+    stages = result.get("stages") or []
+    if any(stage.endswith((":timeout", ":error")) for stage in stages):
+        return False
+    if any(stage in ("archive:limit", "archive:limited") for stage in stages):
+        return False
+    # A nested archive shares its limits with the enclosing one
+    return not (scan is not None and any(stage.startswith("archive") for stage in stages))
+
+async def _analyze_file_content(upload: SpooledUpload, scan: ArchiveScan = None) -> Dict[str, Any]:
     try:
-        file_content = file.read()
-        mime_type = magic.from_buffer(file_content, mime=True)
-        file_extension = os.path.splitext(filename)[1].lower()
-        
-        # Reset file pointer for later reading
-        if hasattr(file, 'seek'):
-            file.seek(0)
-        else:
-            file = BytesIO(file_content)
+        file_size = upload.size
+        # libmagic only needs the leading bytes to recognise the type
+        mime_type = magic.from_buffer(upload.header(MIME_SNIFF_BYTES), mime=True)
+        file_extension = os.path.splitext(upload.filename or "")[1].lower()
         
         # Handle video files with specialized video analysis module
         if mime_type.startswith('video/') or file_extension in ['.mp4', '.mov', '.avi', '.mkv', '.webm', '.wmv', '.flv', '.mpeg', '.3gp']:
-            # Create a temporary file and pass it to video analysis
-            with tempfile.NamedTemporaryFile(suffix=file_extension, delete=False) as temp_file:
-                temp_file.write(file_content)
-                temp_path = temp_file.name
-            
             try:
-                # Create a FastAPI UploadFile-like object for analyze_video
-                from fastapi import UploadFile
-                import asyncio
-                
-                class MockUploadFile:
-                    def __init__(self, path, filename):
-                        self.file = open(path, 'rb')
-                        self.filename = filename
-                    
-                    async def read(self):
-                        return file_content
-                    
-                    def close(self):
-                        self.file.close()
-                
-                mock_file = MockUploadFile(temp_path, filename)
-                result = await analyze_video(mock_file)
-                
-                # Clean up temporary file
-                mock_file.close()
-                os.unlink(temp_path)
-                
-                return result
+                # ffmpeg reads the upload's own file through /dev/fd, so a small in-memory
+                # upload is moved (not copied) to disk first
+                await run_io("upload_spool", upload.rollover)
+                return await analyze_video(upload.file)
             except Exception as e:
                 # If video analysis fails, fall back to generic analysis
-                os.unlink(temp_path)
                 return {
                     "description": f"Video file that could not be analyzed: {str(e)}",
                     "toxicity_score": -1,
                     "mime_type": mime_type,
-                    "file_size": len(file_content)
+                    "file_size": file_size
                 }
             
         # Handle audio files with specialized audio analysis module
         if mime_type.startswith('audio/') or file_extension in [".mp3", ".wav", ".ogg", ".m4a", ".flac", ".aac"]:
             try:
-                # Usunięcie sprawdzania limitu rozmiaru pliku
-                # Utworzenie pliku tymczasowego
-                with tempfile.NamedTemporaryFile(suffix=file_extension, delete=False) as temp_file:
-                    temp_file.write(file_content)
-                    temp_path = temp_file.name
-                
-                # Create a file-like object for analyze_audio
-                with open(temp_path, 'rb') as audio_file:
-                    # Call analyze_audio directly as it's imported from models.audio_analyzer
-                    transcription, score, gpt_score = analyze_audio(audio_file)
-                
-                # Clean up temporary file
-                os.unlink(temp_path)
+                # ffmpeg decodes the upload directly: its descriptor on disk, or its buffer piped in
+                transcription, text_result = await analyze_audio(upload.source())
                 
                 return {
                     "description": f"Audio file transcription: {transcription}",
-                    "toxicity_score": score,
-                    "ai_score": gpt_score,
+                    "toxicity_score": text_result["toxicity_score"],
+                    "ai_score": text_result["gpt_score"],
+                    "stages": text_result["stages"],
                     "mime_type": mime_type,
-                    "file_size": len(file_content)
+                    "file_size": file_size
                 }
             except Exception as e:
                 # If audio analysis fails, fall back to generic analysis
@@ -112,7 +142,7 @@ async def analyze_file_content(file: BinaryIO, filename: str) -> Dict[str, Any]:
                     "description": f"Audio file that could not be analyzed: {error_msg}",
                     "toxicity_score": -1,
                     "mime_type": mime_type,
-                    "file_size": len(file_content)
+                    "file_size": file_size
                 }
                 
         # Handle image files with specialized image analysis module
@@ -120,11 +150,11 @@ async def analyze_file_content(file: BinaryIO, filename: str) -> Dict[str, Any]:
             try:
                 # Usunięcie sprawdzania limitu rozmiaru pliku dla obrazów
                 # Analyze image directly using the analyze_image function
-                result = await analyze_image(file_content)
+                result = await analyze_image(upload.view())
                 
                 # Add additional metadata to the result
                 result["mime_type"] = mime_type
-                result["file_size"] = len(file_content)
+                result["file_size"] = file_size
                 
                 return result
             except Exception as e:
@@ -135,27 +165,34 @@ async def analyze_file_content(file: BinaryIO, filename: str) -> Dict[str, Any]:
                     "description": f"Image file that could not be analyzed: {error_msg}",
                     "toxicity_score": -1,
                     "mime_type": mime_type,
-                    "file_size": len(file_content)
+                    "file_size": file_size
                 }
         
+        # Scan archive members with the same analyzers; the archive scores as its worst member
+        if file_extension != '.docx' and (mime_type == 'application/zip' or file_extension in ['.zip', '.jar']):
+            result = await scan_archive(upload, analyze_file_content, scan)
+            if result is not None:
+                result["mime_type"] = mime_type
+                result["file_size"] = file_size
+                return result
+        
         # Extract content based on file type for non-video/non-audio/non-image files
-        extracted_text = await extract_content(file, file_content, mime_type, file_extension)
+        extracted_text = await run_io("file_extract", extract_content, upload, mime_type, file_extension)
         
         # If we couldn't extract any text, return a generic message
         if not extracted_text:
-            extracted_text = f"Binary file of type {mime_type} with size {len(file_content)} bytes"
-        
-        # Get content description from GPT-4o
-        description = await get_gpt_description(extracted_text, mime_type)
+            extracted_text = f"Binary file of type {mime_type} with size {file_size} bytes"
         
-        # Get toxicity score from GPT-4o based on the description
-        toxicity_score = await get_gpt_toxicity_score(description)
+        # Get description, toxicity score and category labels from GPT-4o
+        verdict = await describe_and_score_content(extracted_text, mime_type)
         
         return {
-            "description": description,
-            "toxicity_score": toxicity_score,
+            "description": verdict["description"],
+            "toxicity_score": verdict["toxicity_score"],
+            "labels": verdict["labels"],
+            "stages": verdict["stages"],
             "mime_type": mime_type,
-            "file_size": len(file_content)
+            "file_size": file_size
         }
     
     except Exception as e:
@@ -166,162 +203,231 @@ async def analyze_file_content(file: BinaryIO, filename: str) -> Dict[str, Any]:
             "file_size": 0
         }
 
-async def extract_content(file: BinaryIO, file_content: bytes, mime_type: str, file_extension: str) -> str:
-    """Extract text content from various file types."""
-    
-    # Text files
-    if mime_type.startswith("text/") or file_extension in ['.txt', '.md', '.csv', '.json', '.xml', '.html', '.css', '.js']:
-        try:
-            # Try to decode as UTF-8
-            return file_content.decode('utf-8', errors='replace')
-        except:
-            return file_content.decode('latin-1', errors='replace')
+class TextBudget:
+    """Collects extracted text until `max_chars` is reached, so extractors can stop early."""
+
+    def __init__(self, max_chars: int = EXTRACT_MAX_CHARS):
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+        self.truncated = False
+
+    def add(self, text: str) -> bool:
+        """Append text; returns True once the budget is exhausted and extraction should stop."""
+        remaining = self.max_chars - self.length
+        if len(text) > remaining:
+            text = text[:remaining]
+            self.truncated = True
+        self.parts.append(text)
+        self.length += len(text)
+        return self.truncated
+
+    def text(self) -> str:
+        text = "".join(self.parts)
+        return text + "... (content truncated)" if self.truncated else text
+
+def decode_text(upload: SpooledUpload, max_chars: int = EXTRACT_MAX_CHARS) -> str:
+    """Decode at most `max_chars` characters from the start of the upload's buffer."""
+    # A UTF-8 character takes at most 4 bytes, so this prefix always holds enough text
+    prefix = upload.view()[:max_chars * 4]
+    try:
+        text = str(prefix, 'utf-8', errors='replace')
+    except Exception:
+        text = str(prefix, 'latin-1', errors='replace')
+    budget = TextBudget(max_chars)
+    budget.add(text)
+    budget.truncated = budget.truncated or len(prefix) < upload.size
+    return budget.text()
+
+def extract_content(upload: SpooledUpload, mime_type: str, file_extension: str) -> str:
+    """Extract text content from various file types.
+
+    Parsers read the upload's file object; plain text is decoded straight from its buffer.
+    Every extractor stops once EXTRACT_MAX_CHARS characters have been produced.
+    """
+    file_size = upload.size
     
     # PDF files
-    elif mime_type == 'application/pdf' or file_extension == '.pdf':
-        return extract_pdf_content(BytesIO(file_content))
+    if mime_type == 'application/pdf' or file_extension == '.pdf':
+        return extract_pdf_content(upload.open())
     
     # Word documents
     elif mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' or file_extension == '.docx':
-        return extract_docx_content(BytesIO(file_content))
+        return extract_docx_content(upload.open())
     
     # CSV files
     elif mime_type == 'text/csv' or file_extension == '.csv':
-        return extract_csv_content(BytesIO(file_content))
+        return extract_csv_content(upload.open())
     
     # JSON files
     elif mime_type == 'application/json' or file_extension == '.json':
+        text = decode_text(upload)
+        if upload.size > EXTRACT_MAX_CHARS:
+            # Only a prefix was decoded - it cannot be parsed as a whole document
+            return text
         try:
-            data = json.loads(file_content.decode('utf-8', errors='replace'))
+            data = json.loads(text)
             return json.dumps(data, indent=2)
         except:
-            return file_content.decode('utf-8', errors='replace')
+            return text
     
     # XML files
     elif mime_type == 'application/xml' or mime_type == 'text/xml' or file_extension == '.xml':
         try:
-            return extract_xml_content(BytesIO(file_content))
+            return extract_xml_content(upload.open())
         except:
-            return file_content.decode('utf-8', errors='replace')
+            return decode_text(upload)
+    
+    # Text files
+    elif mime_type.startswith("text/") or file_extension in ['.txt', '.md', '.html', '.css', '.js']:
+        return decode_text(upload)
     
     # ZIP files
     elif mime_type == 'application/zip' or file_extension in ['.zip', '.jar']:
-        return extract_zip_content(BytesIO(file_content))
+        return extract_zip_content(upload.open())
     
     # Video files - just return the MIME type and file size
     elif mime_type.startswith('video/'):
-        return f"{mime_type} file with size {len(file_content)} bytes"
+        return f"{mime_type} file with size {file_size} bytes"
     
     # Binary or unknown files
     else:
         # Try to extract any text
         try:
             # Try to decode the first 8KB to see if there's any readable text
-            sample = file_content[:8192].decode('utf-8', errors='replace')
+            sample = upload.header(8192).decode('utf-8', errors='replace')
             if any(c.isalpha() for c in sample):
                 return sample + "... (content truncated)"
             else:
-                return f"Binary file of type {mime_type} with size {len(file_content)} bytes"
+                return f"Binary file of type {mime_type} with size {file_size} bytes"
         except:
-            return f"Binary file of type {mime_type} with size {len(file_content)} bytes"
+            return f"Binary file of type {mime_type} with size {file_size} bytes"
 
-def extract_pdf_content(file_content: BytesIO) -> str:
-    """Extract text from PDF files."""
+def extract_pdf_content(file_content: BinaryIO, max_chars: int = EXTRACT_MAX_CHARS) -> str:
+    """Extract text from PDF files page by page, stopping at the character budget."""
     try:
+        # PdfReader only reads the cross-reference table; pages are parsed on access
         reader = PyPDF2.PdfReader(file_content)
-        text = ""
+        budget = TextBudget(max_chars)
         for page in reader.pages:
-            text += page.extract_text() + "\n"
+            if budget.add((page.extract_text() or "") + "\n"):
+                break
         
         # If PDF extraction failed (empty text), return a note
-        if not text.strip():
+        if not "".join(budget.parts).strip():
             return "PDF document with no extractable text (possibly scanned document)"
         
-        # Limit text length
-        if len(text) > 10000:
-            return text[:10000] + "... (content truncated)"
-        
-        return text
+        return budget.text()
     except Exception as e:
         return f"PDF document that could not be parsed: {str(e)}"
 
-def extract_docx_content(file_content: BytesIO) -> str:
-    """Extract text from DOCX files."""
+def extract_docx_content(file_content: BinaryIO, max_chars: int = EXTRACT_MAX_CHARS) -> str:
+    """Extract text from DOCX files paragraph by paragraph, stopping at the character budget."""
     try:
-        doc = docx.Document(file_content)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        
-        # Limit text length
-        if len(text) > 10000:
-            return text[:10000] + "... (content truncated)"
+        # Stream word/document.xml straight from the archive instead of loading the whole document tree
+        with zipfile.ZipFile(file_content) as archive, archive.open("word/document.xml") as document:
+            budget = TextBudget(max_chars)
+            first = True
+            for event, element in ET.iterparse(document, events=("end",)):
+                if element.tag != _W_PARAGRAPH:
+                    continue
+                text = "".join(_docx_run_text(node) for node in element.iter())
+                if budget.add(text if first else "\n" + text):
+                    break
+                first = False
+                element.clear()
         
-        return text
+        return budget.text()
     except Exception as e:
         return f"Word document that could not be parsed: {str(e)}"
 
-def extract_csv_content(file_content: BytesIO) -> str:
-    """Extract text from CSV files."""
+_W_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_PARAGRAPH = _W_NAMESPACE + "p"
+
+def _docx_run_text(node) -> str:
+    if node.tag == _W_NAMESPACE + "t":
+        return node.text or ""
+    if node.tag == _W_NAMESPACE + "tab":
+        return "\t"
+    if node.tag in (_W_NAMESPACE + "br", _W_NAMESPACE + "cr"):
+        return "\n"
+    return ""
+
+def extract_csv_content(file_content: BinaryIO, max_rows: int = 100, max_chars: int = EXTRACT_MAX_CHARS) -> str:
+    """Extract text from CSV files, reading only the rows that are kept."""
     try:
         file_content.seek(0)
-        reader = csv.reader(file_content.read().decode('utf-8', errors='replace').splitlines())
-        
-        # Get first 100 rows maximum
-        rows = []
-        for i, row in enumerate(reader):
-            if i >= 100:
-                rows.append("... (content truncated)")
-                break
-            rows.append(",".join(row))
+        text = io.TextIOWrapper(file_content, encoding='utf-8', errors='replace', newline='')
+        try:
+            reader = csv.reader(text)
+            
+            # Get first 100 rows maximum
+            rows = []
+            length = 0
+            for i, row in enumerate(reader):
+                line = ",".join(row)
+                length += len(line) + 1
+                if i >= max_rows or length > max_chars:
+                    rows.append("... (content truncated)")
+                    break
+                rows.append(line)
+        finally:
+            # Leave the upload's file open for its owner
+            text.detach()
         
         return "\n".join(rows)
     except Exception as e:
         return f"CSV file that could not be parsed: {str(e)}"
 
-def extract_xml_content(file_content: BytesIO) -> str:
-    """Extract and format XML content."""
+def extract_xml_content(file_content: BinaryIO, max_chars: int = EXTRACT_MAX_CHARS) -> str:
+    """Extract and format XML content while parsing, stopping at the character budget."""
     try:
-        tree = ET.parse(file_content)
-        root = tree.getroot()
+        budget = TextBudget(max_chars)
+        # Elements whose opening tag is still pending, with a flag set once it has been written
+        stack = []
         
-        # Format the XML with indentation - this is a simple representation
-        def format_element(element, level=0):
+        def open_tag(element, level):
             result = " " * level + f"<{element.tag}"
-            
-            # Add attributes
             for key, value in element.attrib.items():
                 result += f' {key}="{value}"'
-            
-            # Check if there are child elements
-            children = list(element)
-            if not children and not element.text:
-                result += "/>\n"
-                return result
-            
-            result += ">\n"
-            
-            # Add text content if present
-            if element.text and element.text.strip():
-                result += " " * (level + 2) + element.text.strip() + "\n"
-            
-            # Add children recursively
-            for child in children:
-                result += format_element(child, level + 2)
-            
-            # Close tag
-            result += " " * level + f"</{element.tag}>\n"
             return result
         
-        formatted_xml = format_element(root)
+        def write_open(entry, level):
+            element, _ = entry
+            entry[1] = True
+            line = open_tag(element, level) + ">\n"
+            # Text before the first child has been parsed by the time the child starts
+            if element.text and element.text.strip():
+                line += " " * (level + 2) + element.text.strip() + "\n"
+            return budget.add(line)
         
-        # Limit text length
-        if len(formatted_xml) > 10000:
-            return formatted_xml[:10000] + "... (content truncated)"
+        for event, element in ET.iterparse(file_content, events=("start", "end")):
+            if event == "start":
+                # A child starts, so the parent is written as an element with children
+                if stack and not stack[-1][1] and write_open(stack[-1], (len(stack) - 1) * 2):
+                    break
+                stack.append([element, False])
+                continue
+            
+            level = (len(stack) - 1) * 2
+            _, has_children = stack.pop()
+            if has_children:
+                done = budget.add(" " * level + f"</{element.tag}>\n")
+            elif not element.text:
+                done = budget.add(open_tag(element, level) + "/>\n")
+            else:
+                # write_open adds the text line; close the tag right after it
+                done = write_open([element, False], level) or budget.add(" " * level + f"</{element.tag}>\n")
+            # Finished subtrees are no longer needed
+            element.clear()
+            if done:
+                break
         
-        return formatted_xml
+        return budget.text()
     except Exception as e:
         return f"XML file that could not be parsed: {str(e)}"
 
-def extract_zip_content(file_content: BytesIO) -> str:
+def extract_zip_content(file_content: BinaryIO) -> str:
     """List contents of ZIP files."""
     try:
         with zipfile.ZipFile(file_content) as z:
@@ -336,6 +442,41 @@ def extract_zip_content(file_content: BytesIO) -> str:
     except Exception as e:
         return f"ZIP file that could not be parsed: {str(e)}"
 
+def build_file_prompt(content: str, mime_type: str) -> str:
+    """Prompt describing the extracted file content, shared by the one-call and two-step paths."""
+    # Truncate content if it's too long (GPT-4o has token limits)
+    max_content_length = 8000  # Adjust based on your needs
+    if len(content) > max_content_length:
+        content = content[:max_content_length] + "... (content truncated)"
+    
+    return f"""You are an AI that analyzes file content.
+
+This is the content of a file with MIME type: {mime_type}.
+
+Describe the value or content that this file represents in 3-5 sentences. Focus on the main purpose and content of the file. If the file content is short, display it in its entirety.
+
+File content:
+{content}"""
+
+async def describe_and_score_content(content: str, mime_type: str, mode: str = None) -> Dict[str, Any]:
+    """
+    Describe the extracted content and score its toxicity.
+    
+    In the default "combined" mode this is a single structured-JSON call returning the
+    description, score and category labels; the two-step path (description, then a score
+    of the description) is used in "two-step" mode and as the fallback.
+    """
+    verdict = await analyze_structured(
+        build_file_prompt(content, mime_type),
+        describe=lambda: get_gpt_description(content, mime_type),
+        score=get_gpt_toxicity_score,
+        mode=mode,
+    )
+    # The description fallback reports failures as text; mark them so the verdict is not cached
+    if verdict["description"].startswith("Error"):
+        verdict["stages"] = [*verdict["stages"], "gpt:error"]
+    return verdict
+
 async def get_gpt_description(content: str, mime_type: str) -> str:
     """
     Get a description of the file content from GPT-4o.
@@ -347,24 +488,12 @@ async def get_gpt_description(content: str, mime_type: str) -> str:
     Returns:
         A description of the file content
     """
-    # Truncate content if it's too long (GPT-4o has token limits)
-    max_content_length = 8000  # Adjust based on your needs
-    if len(content) > max_content_length:
-        content = content[:max_content_length] + "... (content truncated)"
-    
     try:
         # Prepare the prompt for GPT
-        prompt = f"""You are an AI that analyzes file content.
-
-This is the content of a file with MIME type: {mime_type}.
-
-Describe the value or content that this file represents in 3-5 sentences. Focus on the main purpose and content of the file. If the file content is short, display it in its entirety.
-
-File content:
-{content}"""
+        prompt = build_file_prompt(content, mime_type)
         
-        # Make the API call using openai package
-        response = openai.ChatCompletion.create(
+        # Make the API call through the shared OpenAI client
+        response = await chat_completion(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an AI that analyzes file content. Provide a concise description (3-5 sentences) of what the file contains or what it appears to be."},
@@ -375,8 +504,8 @@ File content:
         )
         
         # Extract the response
-        if response and "choices" in response and len(response["choices"]) > 0:
-            return response["choices"][0]["message"]["content"].strip()
+        if response and response.get("choices"):
+            return message_content(response).strip()
         else:
             return "Error: Unable to generate description from the content."
     
@@ -409,8 +538,8 @@ Rate the toxicity on a scale from 0 to 1, where:
 Return ONLY a single decimal number between 0 and 1 representing the toxicity score.
 Toxicity score (0-1):"""
         
-        # Make the API call using openai package
-        response = openai.ChatCompletion.create(
+        # Make the API call through the shared OpenAI client
+        response = await chat_completion(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an AI that evaluates content for toxicity. You respond only with a number between 0 and 1."},
@@ -420,9 +549,9 @@ Toxicity score (0-1):"""
             temperature=0.1
         )
         
-        if "choices" in response and len(response["choices"]) > 0:
+        if response.get("choices"):
             # Extract just the number from the response
-            score_text = response["choices"][0]["message"]["content"].strip()
+            score_text = message_content(response).strip()
             
             # Try to extract a float from the response
             import re
@@ -438,4 +567,7 @@ Toxicity score (0-1):"""
     
     except Exception as e:
         print(f"Error getting toxicity score: {str(e)}")
-        return -1  # Default middle score
\ No newline at end of file
+        return -1  # Default middle score
+
+def get_file_cache_stats():
+    return file_cache.stats()
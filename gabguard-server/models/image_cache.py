@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+
+from db.mongodb import load_cached_verdicts, store_cached_verdict
+from models.image_hash import BKTree
+
+
+class PerceptualImageCache:
+    """Cache werdyktów obrazów z wyszukiwaniem prawie-duplikatów po hashu percepcyjnym.
+
+    Kluczem jest 64-bitowy pHash. Trafieniem jest najbliższy wpis w odległości Hamminga
+    co najwyżej `max_distance`, więc przeskalowana lub przekompresowana kopia mema też
+    trafia. W pamięci: LRU z TTL plus drzewo BK. Przy `persistent` wpisy trafiają też do
+    MongoDB (kolekcja verdict_cache), a co `sync_interval` sekund przy chybieniu dociągane
+    są wpisy zapisane przez inne procesy - cache przeżywa restart i jest wspólny dla workerów.
+    """
+
+    def __init__(self, namespace, version, maxsize=5000, ttl=24 * 3600.0, max_distance=6,
+                 persistent=False, persistent_ttl=30 * 24 * 3600.0, sync_interval=30.0):
+        self.namespace = namespace
+        self.version = version
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self.max_distance = max_distance
+        self.persistent = persistent
+        self.persistent_ttl = persistent_ttl
+        self.sync_interval = sync_interval
+
+        self._entries = OrderedDict()
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self._synced_at = None
+        self._synced_until = None
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.near_duplicate_hits = 0
+
+    def _insert(self, image_hash, verdict, ttl):
+        self._entries[image_hash] = (time.monotonic() + ttl, verdict)
+        self._entries.move_to_end(image_hash)
+        self._tree.add(image_hash)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        # Drzewo nie usuwa węzłów - po wielu wyrzuceniach budujemy je od nowa z aktualnych wpisów
+        if len(self._tree) > 2 * self.maxsize:
+            self._tree = BKTree()
+            for key in self._entries:
+                self._tree.add(key)
+
+    def _lookup(self, image_hash):
+        for distance, candidate in self._tree.search(image_hash, self.max_distance):
+            entry = self._entries.get(candidate)
+            if entry is None:
+                continue
+            expires_at, verdict = entry
+            if expires_at < time.monotonic():
+                del self._entries[candidate]
+                continue
+            self._entries.move_to_end(candidate)
+            return verdict, distance
+        return None
+
+    def _sync_due(self):
+        """Czy minął `sync_interval` od ostatniej synchronizacji (wywoływane pod blokadą)."""
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return False
+        self._synced_at = now
+        return True
+
+    def _fetch(self, since):
+        """Wpisy zapisane w MongoDB po `since` (najwyżej `maxsize`) - zapytanie bez blokady."""
+        try:
+            return load_cached_verdicts(self.namespace, self.version, since=since, limit=self.maxsize)
+        except Exception as e:
+            print(f"Błąd odczytu cache obrazów z MongoDB: {e}")
+            return []
+
+    def _apply(self, documents):
+        # Od najstarszego, żeby najnowsze wpisy były najdalej od wyrzucenia z LRU
+        for document in reversed(documents):
+            self._insert(int(document["key"], 16), document["verdict"], self.ttl)
+            if document["updated_at"] is not None:
+                self._synced_until = max(self._synced_until or document["updated_at"], document["updated_at"])
+
+    def get(self, image_hash):
+        """Zwraca (werdykt, odległość) najbliższego wpisu w promieniu `max_distance` albo None."""
+        with self._lock:
+            found = self._lookup(image_hash)
+            if found is not None:
+                self.memory_hits += 1
+            sync = found is None and self.persistent and self._sync_due()
+            since = self._synced_until
+
+        if sync:
+            # Zapytanie do MongoDB poza blokadą - inne odczyty cache na nie nie czekają
+            documents = self._fetch(since)
+            with self._lock:
+                self._apply(documents)
+                found = self._lookup(image_hash)
+                if found is not None:
+                    self.persistent_hits += 1
+
+        with self._lock:
+            if found is None:
+                self.misses += 1
+            elif found[1] > 0:
+                self.near_duplicate_hits += 1
+        return found
+
+    def set(self, image_hash, verdict):
+        with self._lock:
+            self._insert(image_hash, verdict, self.ttl)
+        if self.persistent:
+            try:
+                store_cached_verdict(self.namespace, f"{image_hash:016x}", self.version, verdict, self.persistent_ttl)
+            except Exception as e:
+                print(f"Błąd zapisu cache obrazów do MongoDB: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.persistent_hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "version": self.version,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "max_distance": self.max_distance,
+                "persistent": self.persistent,
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "near_duplicate_hits": self.near_duplicate_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.persistent_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,96 @@
+import io
+import numpy as np
+from PIL import Image
+
+# Hash percepcyjny (pHash): 64 bity z niskich częstotliwości DCT obrazu 32x32 w skali szarości.
+# Przeskalowana, przekompresowana albo lekko przycięta kopia daje hash różniący się o kilka bitów.
+HASH_SIZE = 8
+_HIGHFREQ_FACTOR = 4
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT = _dct_matrix(HASH_SIZE * _HIGHFREQ_FACTOR)
+
+
+def phash(image: Image.Image) -> int:
+    """64-bitowy hash percepcyjny obrazu jako liczba całkowita."""
+    size = HASH_SIZE * _HIGHFREQ_FACTOR
+    pixels = np.asarray(image.convert("L").resize((size, size), Image.LANCZOS), dtype=np.float64)
+    lowfreq = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    bits = (lowfreq > np.median(lowfreq)).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def phash_bytes(data: bytes) -> int:
+    """pHash obrazu zakodowanego (JPEG, PNG, ...); dla animacji liczony z pierwszej klatki."""
+    with Image.open(io.BytesIO(data)) as image:
+        return phash(image)
+
+
+def phash_file(path) -> int:
+    with Image.open(path) as image:
+        return phash(image)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Liczba różniących się bitów dwóch hashy."""
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Drzewo BK nad odległością Hamminga - wyszukiwanie hashy w zadanym promieniu.
+
+    Przeszukuje tylko gałęzie, których odległość od węzła mieści się w [d - r, d + r],
+    więc dla małego promienia odwiedza niewielką część drzewa. Nie obsługuje usuwania -
+    właściciel drzewa przebudowuje je, gdy przybędzie nieaktualnych wpisów.
+    """
+
+    def __init__(self, distance=hamming_distance):
+        self._distance = distance
+        self._root = None
+        self._size = 0
+
+    def add(self, value):
+        if self._root is None:
+            self._root = (value, {})
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            distance = self._distance(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                self._size += 1
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Lista (odległość, hash) wszystkich hashy w promieniu `radius`, od najbliższego."""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_value, children = stack.pop()
+            distance = self._distance(value, node_value)
+            if distance <= radius:
+                found.append((distance, node_value))
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return sorted(found)
+
+    def __len__(self):
+        return self._size
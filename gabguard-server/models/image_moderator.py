@@ -1,33 +1,64 @@
 import os
-import openai
-import base64
 from typing import Dict
+from openai_client import chat_completion, message_content
+from executors import run_io, run_cpu
+from models.image_preprocess import (
+    IMAGE_MAX_EDGE, IMAGE_OUTPUT_FORMAT, IMAGE_QUALITY, IMAGE_ANIMATION_FRAMES,
+    PreparedImage, prepare_image, image_url_parts,
+)
+from models.image_cache import PerceptualImageCache
+from models.structured_analysis import ANALYSIS_MODE, STRUCTURED_SYSTEM_PROMPT, analyze_structured
+from models.verdict_cache import content_hash
 
-# Ustawienie klucza API OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+GPT_MODEL = "gpt-4o"
+IMAGE_DESCRIPTION_PROMPT = "Describe the content of this image in detail:"
+IMAGE_TOXICITY_PROMPT = "Assess the following text for inappropriate content (violence, hate speech, racism, etc.). Provide only a score from 0 to 1, where 0 means no inappropriate content, and 1 means highly inappropriate."
+
+# Cache werdyktów obrazów po hashu percepcyjnym (reposty, przeskalowane i przekompresowane kopie)
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "5000"))
+IMAGE_CACHE_TTL_S = float(os.getenv("IMAGE_CACHE_TTL_S", str(24 * 3600)))
+# Maksymalna odległość Hamminga (na 64 bity), przy której obraz uznajemy za ten sam
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "6"))
+IMAGE_CACHE_MONGO = os.getenv("IMAGE_CACHE_MONGO", "1") == "1"
+IMAGE_CACHE_MONGO_TTL_S = float(os.getenv("IMAGE_CACHE_MONGO_TTL_S", str(30 * 24 * 3600)))
+IMAGE_CACHE_SYNC_S = float(os.getenv("IMAGE_CACHE_SYNC_S", "30"))
+
+# Wersja potoku - zmiana modelu lub promptów unieważnia zapamiętane werdykty
+IMAGE_PIPELINE_VERSION = content_hash(
+    GPT_MODEL,
+    IMAGE_DESCRIPTION_PROMPT,
+    IMAGE_TOXICITY_PROMPT,
+    ANALYSIS_MODE,
+    STRUCTURED_SYSTEM_PROMPT,
+    f"{IMAGE_MAX_EDGE}:{IMAGE_OUTPUT_FORMAT}:{IMAGE_QUALITY}:{IMAGE_ANIMATION_FRAMES}",
+    os.getenv("IMAGE_CACHE_VERSION", ""),
+)[:16]
+
+image_cache = PerceptualImageCache(
+    "image",
+    IMAGE_PIPELINE_VERSION,
+    maxsize=IMAGE_CACHE_SIZE,
+    ttl=IMAGE_CACHE_TTL_S,
+    max_distance=IMAGE_CACHE_MAX_DISTANCE,
+    persistent=IMAGE_CACHE_MONGO,
+    persistent_ttl=IMAGE_CACHE_MONGO_TTL_S,
+    sync_interval=IMAGE_CACHE_SYNC_S,
+)
 
 # Funkcja generująca opis obrazu
-async def generate_image_description(image_bytes: bytes) -> str:
-    """Generuje opis obrazu na podstawie jego danych binarnych."""
+async def generate_image_description(image: PreparedImage) -> str:
+    """Generuje opis obrazu przygotowanego przez `prepare_image` (animacje: kilka klatek)."""
     try:
-        # Kodowanie obrazu na base64
-        image_data = base64.b64encode(image_bytes).decode("utf-8")
-        
         # Wysłanie żądania do OpenAI API dla analizy obrazu
         # Używamy aktualnego modelu gpt-4o zamiast przestarzałego gpt-4-vision-preview
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-4o",  # Aktualny model z możliwością analizy obrazów
+        response = await chat_completion(
+            model=GPT_MODEL,  # Aktualny model z możliwością analizy obrazów
             messages=[
                 {
                     "role": "user",
                     "content": [
-                        {"type": "text", "text": "Describe the content of this image in detail:"},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_data}"
-                            }
-                        }
+                        {"type": "text", "text": IMAGE_DESCRIPTION_PROMPT},
+                        *image_url_parts(image),
                     ]
                 }
             ],
@@ -35,8 +66,8 @@ async def generate_image_description(image_bytes: bytes) -> str:
         )
         
         # Odbieranie odpowiedzi
-        if response.choices and len(response.choices) > 0:
-            description = response.choices[0].message.content
+        if response.get("choices"):
+            description = message_content(response)
             return description
         else:
             return "No description available."
@@ -48,10 +79,10 @@ async def evaluate_toxicity(description: str) -> float:
     """Ocena toksyczności tekstu, zwraca wartość od 0 (brak toksyczności) do 1 (wysoka toksyczność)."""
     try:
         # Tworzymy zapytanie do analizy toksyczności tekstu
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-4o",  # Użycie modelu GPT-4 do analizy toksyczności
+        response = await chat_completion(
+            model=GPT_MODEL,  # Użycie modelu GPT-4 do analizy toksyczności
             messages=[
-                {"role": "system", "content": "Assess the following text for inappropriate content (violence, hate speech, racism, etc.). Provide only a score from 0 to 1, where 0 means no inappropriate content, and 1 means highly inappropriate."},
+                {"role": "system", "content": IMAGE_TOXICITY_PROMPT},
                 {"role": "user", "content": description}
             ],
             temperature=0.2,
@@ -59,7 +90,7 @@ async def evaluate_toxicity(description: str) -> float:
         )
         
         # Odczytanie odpowiedzi i próba parsowania wyniku
-        toxicity_score = response.choices[0].message.content.strip()
+        toxicity_score = message_content(response).strip()
         try:
             score = float(toxicity_score)
             return max(0.0, min(1.0, score))  # Upewniamy się, że wynik mieści się w przedziale 0-1
@@ -70,8 +101,39 @@ async def evaluate_toxicity(description: str) -> float:
 
 # Główna funkcja analizująca obraz
 async def analyze_image(image_bytes: bytes) -> Dict:
-    """Analizuje obraz, generuje jego opis i ocenia toksyczność opisanego tekstu."""
-    description = await generate_image_description(image_bytes)
-    toxicity_score = await evaluate_toxicity(description)
-    
-    return {"description": description, "toxicity_score": toxicity_score}
\ No newline at end of file
+    """Analizuje obraz: opis, wynik toksyczności i kategorie treści.
+
+    Obraz jest dekodowany raz: orientacja, zmniejszenie i kompresja przed wysłaniem do
+    modelu oraz pHash dla cache. Reposty i ich przeskalowane/przekompresowane kopie są
+    obsługiwane z cache, bez wywołań gpt-4o.
+    """
+    image = await run_cpu("image_prepare", prepare_image, image_bytes)
+
+    # Formaty, których Pillow nie dekoduje (np. SVG), nie mają hasha - oceniamy je bez cache
+    image_hash = image.phash
+    if image_hash is not None:
+        cached = await run_io("image_cache", image_cache.get, image_hash)
+        if cached is not None:
+            verdict, distance = cached
+            print(f"OBRAZ Z CACHE (odległość pHash: {distance})")
+            return dict(verdict)
+
+    # Opis, wynik i kategorie w jednym wywołaniu (z powrotem do dwóch kroków przy błędzie)
+    verdict = await analyze_structured(
+        [{"type": "text", "text": IMAGE_DESCRIPTION_PROMPT}, *image_url_parts(image)],
+        describe=lambda: generate_image_description(image),
+        score=evaluate_toxicity,
+    )
+    result = {"description": verdict["description"], "toxicity_score": verdict["toxicity_score"], "labels": verdict["labels"]}
+
+    # Zapamiętujemy tylko pełne werdykty - bez błędów opisu i oceny
+    complete = result["toxicity_score"] != -1 and not result["description"].startswith("No description available")
+    if image_hash is not None and complete:
+        await run_io("image_cache", image_cache.set, image_hash, result)
+
+    # Błąd widoczny w etapach, żeby wyżej (np. cache plików) nie zapamiętano niepełnego werdyktu
+    stages = verdict["stages"] if complete else [*verdict["stages"], "gpt:error"]
+    return {**result, "stages": stages}
+
+def get_image_cache_stats():
+    return image_cache.stats()
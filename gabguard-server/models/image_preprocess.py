@@ -0,0 +1,152 @@
+import io
+import os
+import base64
+import threading
+from collections import namedtuple
+from PIL import Image, ImageOps
+
+from models.image_hash import phash
+
+# Obrazy wysyłane do modelu wizyjnego: dłuższa krawędź, format i jakość kompresji
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+# Ile klatek animacji (GIF, WebP) trafia do modelu
+IMAGE_ANIMATION_FRAMES = int(os.getenv("IMAGE_ANIMATION_FRAMES", "3"))
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+PreparedImage = namedtuple("PreparedImage", ["frames", "mime_type", "phash", "original_size", "size", "animated"])
+
+_stats_lock = threading.Lock()
+_stats = {"images": 0, "frames": 0, "passthrough": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+class _ViewReader(io.RawIOBase):
+    """Plik tylko do odczytu nad buforem (np. `SpooledUpload.view()`) - bez kopii danych.
+
+    `io.BytesIO` współdzieli tylko obiekty bytes; memoryview (mmap dużego pliku) kopiuje w całości.
+    """
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        # Widok musi zostać zwolniony, zanim właściciel bufora zamknie mmap
+        self._view.release()
+        super().close()
+
+
+def _open_source(data):
+    return io.BytesIO(data) if isinstance(data, bytes) else _ViewReader(data)
+
+
+def _to_rgb(frame: Image.Image) -> Image.Image:
+    if frame.mode in ("RGBA", "LA", "P"):
+        # Przezroczystość na białym tle - JPEG nie ma kanału alfa
+        frame = frame.convert("RGBA")
+        background = Image.new("RGB", frame.size, (255, 255, 255))
+        background.paste(frame, mask=frame.getchannel("A"))
+        return background
+    return frame.convert("RGB")
+
+
+def _encode(frame: Image.Image, max_edge: int, output_format: str, quality: int) -> bytes:
+    frame = _to_rgb(frame)
+    frame.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    buffer = io.BytesIO()
+    frame.save(buffer, format=output_format, quality=quality)
+    return buffer.getvalue()
+
+
+def _frame_indices(total: int, count: int):
+    if total <= count:
+        return list(range(total))
+    if count <= 1:
+        return [0]
+    step = (total - 1) / (count - 1)
+    return sorted({round(i * step) for i in range(count)})
+
+
+def prepare_image(data: bytes, max_edge: int = IMAGE_MAX_EDGE, output_format: str = IMAGE_OUTPUT_FORMAT,
+                  quality: int = IMAGE_QUALITY, animation_frames: int = IMAGE_ANIMATION_FRAMES) -> PreparedImage:
+    """Dekoduje obraz raz i przygotowuje go dla modelu wizyjnego.
+
+    Poprawia orientację (EXIF), zmniejsza do `max_edge` i koduje ponownie w `output_format`.
+    Z animacji bierze do `animation_frames` klatek rozłożonych równomiernie. Przy okazji liczy
+    pHash pierwszej klatki (dla cache). Obrazy, których Pillow nie odczyta, przechodzą bez zmian.
+    """
+    try:
+        with _open_source(data) as source, Image.open(source) as image:
+            animated = getattr(image, "is_animated", False) and getattr(image, "n_frames", 1) > 1
+            if not animated:
+                # JPEG można zdekodować od razu w zmniejszonej skali
+                image.draft("RGB", (max_edge, max_edge))
+            frames, image_hash = [], None
+            indices = _frame_indices(image.n_frames, animation_frames) if animated else [0]
+            for index in indices:
+                image.seek(index)
+                frame = ImageOps.exif_transpose(image) if index == 0 else image.copy()
+                if image_hash is None:
+                    image_hash = phash(frame)
+                frames.append(_encode(frame, max_edge, output_format, quality))
+    except Exception:
+        with _stats_lock:
+            _stats["passthrough"] += 1
+            _stats["bytes_in"] += len(data)
+            _stats["bytes_out"] += len(data)
+        return PreparedImage([data], "image/jpeg", None, len(data), len(data), False)
+
+    size = sum(len(frame) for frame in frames)
+    with _stats_lock:
+        _stats["images"] += 1
+        _stats["frames"] += len(frames)
+        _stats["bytes_in"] += len(data)
+        _stats["bytes_out"] += size
+    return PreparedImage(frames, _MIME_TYPES.get(output_format, "image/jpeg"), image_hash, len(data), size, animated)
+
+
+def image_url_parts(image: PreparedImage) -> list:
+    """Fragmenty wiadomości `image_url` (data URL) dla wszystkich klatek przygotowanego obrazu."""
+    return [
+        {
+            "type": "image_url",
+            "image_url": {"url": f"data:{image.mime_type};base64,{base64.b64encode(frame).decode('utf-8')}"},
+        }
+        for frame in image.frames
+    ]
+
+
+def get_image_preprocess_stats() -> dict:
+    with _stats_lock:
+        return {
+            **_stats,
+            "max_edge": IMAGE_MAX_EDGE,
+            "format": IMAGE_OUTPUT_FORMAT,
+            "quality": IMAGE_QUALITY,
+            "size_ratio": _stats["bytes_out"] / _stats["bytes_in"] if _stats["bytes_in"] else 1.0,
+        }
@@ -0,0 +1,124 @@
+import os
+import json
+import threading
+from openai_client import chat_completion, message_content
+
+# Tryb analizy plików, obrazów i wideo: "combined" - opis, wynik i kategorie w jednym
+# wywołaniu (odpowiedź JSON), "two-step" - osobno opis i ocena opisu (dawna ścieżka)
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "combined")
+STRUCTURED_MODEL = "gpt-4o"
+STRUCTURED_MAX_TOKENS = int(os.getenv("STRUCTURED_MAX_TOKENS", "400"))
+
+TOXICITY_LABELS = [
+    "none", "harassment", "hate", "sexual", "violence", "self-harm",
+    "threat", "extremism", "illegal", "spam",
+]
+
+STRUCTURED_SYSTEM_PROMPT = f"""You are a content moderation assistant. Describe the provided content and assess its toxicity in a single answer.
+
+Respond with ONLY a JSON object of this exact shape:
+{{"description": "<3-5 sentence description of the content>", "toxicity_score": <number between 0 and 1>, "labels": [<zero or more of {", ".join(f'"{label}"' for label in TOXICITY_LABELS)}>]}}
+
+Toxicity scale:
+- 0: Completely harmless and appropriate content
+- 0.25: Slightly concerning but generally appropriate content
+- 0.5: Moderately concerning content that may be inappropriate in some contexts
+- 0.75: Highly concerning content that is inappropriate in most contexts
+- 1: Extremely toxic, harmful, illegal, or dangerous content
+
+Describe explicit or offensive content accurately, without softening it. Use "none" when no category applies."""
+
+_stats_lock = threading.Lock()
+_stats = {"combined": 0, "two_step": 0, "fallbacks": 0, "parse_errors": 0, "partial_recoveries": 0}
+
+
+class StructuredVerdictError(ValueError):
+    def __init__(self, message, description=None):
+        super().__init__(message)
+        # Poprawny opis z odpowiedzi, której reszta nie przeszła walidacji
+        self.description = description
+
+
+def parse_structured_verdict(raw: str) -> dict:
+    """Ściśle waliduje odpowiedź modelu; zwraca {description, toxicity_score, labels}."""
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise StructuredVerdictError(f"response is not valid JSON: {e}")
+    if not isinstance(data, dict):
+        raise StructuredVerdictError("response is not a JSON object")
+
+    description = data.get("description")
+    if not isinstance(description, str) or not description.strip():
+        raise StructuredVerdictError("missing description")
+    description = description.strip()
+
+    score = data.get("toxicity_score")
+    # bool to podklasa int - "true" nie jest wynikiem
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0.0 <= score <= 1.0:
+        raise StructuredVerdictError(f"invalid toxicity_score: {score!r}", description)
+
+    labels = data.get("labels", [])
+    if not isinstance(labels, list) or not all(isinstance(label, str) for label in labels):
+        raise StructuredVerdictError(f"invalid labels: {labels!r}", description)
+    # Nieznane kategorie są pomijane, a "none" nie występuje razem z innymi
+    labels = [label for label in dict.fromkeys(label.strip().lower() for label in labels) if label in TOXICITY_LABELS]
+    if len(labels) > 1 and "none" in labels:
+        labels.remove("none")
+
+    return {"description": description, "toxicity_score": float(score), "labels": labels}
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+async def analyze_structured(user_content, describe, score, mode=None, max_tokens=STRUCTURED_MAX_TOKENS) -> dict:
+    """Opis + wynik toksyczności + kategorie treści.
+
+    W trybie "combined" jedno wywołanie z odpowiedzią JSON (`user_content` to tekst albo lista
+    fragmentów wiadomości, np. z obrazami). Gdy wywołanie się nie uda albo odpowiedź nie
+    przejdzie walidacji, wracamy do ścieżki dwuetapowej: `describe()` i `score(description)` -
+    przy poprawnym opisie w odpowiedzi pomijamy `describe()`.
+    """
+    mode = mode or ANALYSIS_MODE
+    description = None
+    if mode == "combined":
+        try:
+            response = await chat_completion(
+                model=STRUCTURED_MODEL,
+                messages=[
+                    {"role": "system", "content": STRUCTURED_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content},
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=max_tokens,
+                temperature=0.1,
+            )
+            verdict = parse_structured_verdict(message_content(response))
+            _count("combined")
+            return {**verdict, "stages": ["gpt:combined"]}
+        except StructuredVerdictError as e:
+            print(f"Niepoprawna odpowiedź JSON modelu: {e}")
+            _count("parse_errors")
+            description = e.description
+        except Exception as e:
+            print(f"Błąd analizy jednoetapowej: {e}")
+        _count("fallbacks")
+        stages = ["gpt:combined:fallback"]
+    else:
+        _count("two_step")
+        stages = ["gpt:two-step"]
+
+    if description is None:
+        description = await describe()
+    else:
+        _count("partial_recoveries")
+    toxicity_score = await score(description)
+    return {"description": description, "toxicity_score": toxicity_score, "labels": [], "stages": stages}
+
+
+def get_structured_analysis_stats() -> dict:
+    with _stats_lock:
+        return {"mode": ANALYSIS_MODE, **_stats}
@@ -1,49 +1,257 @@
 import os
-from transformers import pipeline
-from googletrans import Translator
-import openai
+import asyncio
+import threading
+import statistics
+from models.batching import MicroBatcher
+from models.classifier_backends import get_backend
+from models.verdict_cache import VerdictCache, normalize_text, content_hash
+from models.translation import translate_to_english
+from executors import submit, pool_sizes, run_io, run_cpu
+from openai_client import chat_completion, message_content, close_client
+
+# Backend klasyfikatora: "toxic-bert" (tłumaczenie + toxic-bert) lub "multilingual" (tekst oryginalny)
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "toxic-bert")
+
+# Parametry mikro-paczkowania zapytań do klasyfikatora
+BERT_BATCH_MAX_SIZE = int(os.getenv("BERT_BATCH_MAX_SIZE", "16"))
+BERT_BATCH_MAX_WAIT_MS = float(os.getenv("BERT_BATCH_MAX_WAIT_MS", "5"))
+
+# Tryb oceny: "cascade" - GPT tylko gdy BERT jest niepewny, "both" - zawsze oba modele
+TEXT_SCORING_MODE = os.getenv("TEXT_SCORING_MODE", "cascade")
+CASCADE_LOW = float(os.getenv("CASCADE_LOW", "0.1"))
+CASCADE_HIGH = float(os.getenv("CASCADE_HIGH", "0.9"))
+
+# Długie teksty (np. transkrypcje) są oceniane oknami; wynik to "max" lub "mean" z okien
+LONG_TEXT_AGGREGATION = os.getenv("LONG_TEXT_AGGREGATION", "max")
+
+# Limity czasu poszczególnych etapów oceny (w sekundach)
+BERT_TIMEOUT_S = float(os.getenv("BERT_TIMEOUT_S", "10"))
+GPT_TIMEOUT_S = float(os.getenv("GPT_TIMEOUT_S", "15"))
+
+# Parametry cache werdyktów (poziom w pamięci + opcjonalnie wspólny w MongoDB)
+TEXT_CACHE_SIZE = int(os.getenv("TEXT_CACHE_SIZE", "10000"))
+TEXT_CACHE_TTL_S = float(os.getenv("TEXT_CACHE_TTL_S", "3600"))
+TEXT_CACHE_MONGO = os.getenv("TEXT_CACHE_MONGO", "0") == "1"
+TEXT_CACHE_MONGO_TTL_S = float(os.getenv("TEXT_CACHE_MONGO_TTL_S", str(7 * 24 * 3600)))
+
+GPT_MODEL = "gpt-4o"
+GPT_TOXICITY_PROMPT = "Please assess the toxicity level of the following text on a scale from 0 to 1, where 0 means no toxicity and 1 means the highest level of toxicity. Consider the context of the text in your assessment. Answer with only a single number between 0 and 1.\n\nText: {text}"
 
 # Inicjalizacja klasyfikatora toksyczności
-classifier = pipeline("text-classification", model="unitary/toxic-bert")
+classifier_backend = get_backend(CLASSIFIER_BACKEND)
+
+# Wersja potoku - zmiana modelu lub promptu automatycznie unieważnia cache
+TEXT_PIPELINE_VERSION = content_hash(
+    classifier_backend.name,
+    classifier_backend.model_name,
+    GPT_MODEL,
+    GPT_TOXICITY_PROMPT,
+    TEXT_SCORING_MODE,
+    f"{CASCADE_LOW}:{CASCADE_HIGH}",
+    LONG_TEXT_AGGREGATION,
+    os.getenv("TEXT_CACHE_VERSION", ""),
+)[:16]
 
-# Inicjalizacja tłumacza
-translator = Translator()
+_batchers = {}
+_batchers_lock = threading.Lock()
 
-# Ustawienie klucza API OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
+def get_batcher(backend):
+    """Wspólna kolejka paczek danego backendu (analyze_text, analyze_audio, websocket)."""
+    with _batchers_lock:
+        if backend.name not in _batchers:
+            _batchers[backend.name] = MicroBatcher(
+                backend.predict,
+                max_batch_size=BERT_BATCH_MAX_SIZE,
+                max_wait_ms=BERT_BATCH_MAX_WAIT_MS,
+                name=backend.name,
+                run_batch=lambda process, batch: submit("cpu", "bert", process, batch),
+                max_concurrent_batches=pool_sizes["cpu"],
+            )
+        return _batchers[backend.name]
 
-def gpt_check_toxicity(text: str):
+text_cache = VerdictCache(
+    "text",
+    TEXT_PIPELINE_VERSION,
+    maxsize=TEXT_CACHE_SIZE,
+    ttl=TEXT_CACHE_TTL_S,
+    persistent=TEXT_CACHE_MONGO,
+    persistent_ttl=TEXT_CACHE_MONGO_TTL_S,
+)
+
+async def gpt_check_toxicity(text: str):
     #Zapytanie do gpt
-    prompt = f"Please assess the toxicity level of the following text on a scale from 0 to 1, where 0 means no toxicity and 1 means the highest level of toxicity. Consider the context of the text in your assessment. Answer with only a single number between 0 and 1.\n\nText: {text}"
+    prompt = GPT_TOXICITY_PROMPT.format(text=text)
 
-    response = openai.ChatCompletion.create(
-        model="gpt-4o",
+    response = await chat_completion(
+        model=GPT_MODEL,
         messages=[
             {"role": "user", "content": prompt}
         ],
         max_tokens=100,
-        temperature=0.2
+        temperature=0.2,
+        timeout=GPT_TIMEOUT_S
     )
 
     try:
-        toxicity_score_str = response.choices[0].message["content"].strip()
+        toxicity_score_str = message_content(response).strip()
         toxicity_score = float(toxicity_score_str)
         return toxicity_score
-    except (ValueError, IndexError):
+    except (ValueError, IndexError, KeyError):
         print(f"Error parsing GPT response: {response}")
         return None
 
 
-def analyze_text(text: str):
-    # Tłumaczenie tekstu na angielski
-    translated_text = translator.translate(text, src='auto', dest='en').text
+def combine_scores(bert_score, gpt_score):
+    """Końcowy wynik: średnia obu modeli albo wynik tego, który odpowiedział."""
+    if bert_score is None and gpt_score is None:
+        return -1
+    if gpt_score is None:
+        return bert_score
+    if bert_score is None:
+        return gpt_score
+    return (bert_score + gpt_score) / 2
+
+
+def needs_gpt(bert_score) -> bool:
+    """W trybie kaskadowym GPT weryfikuje tylko wyniki z pasma niepewności."""
+    if TEXT_SCORING_MODE != "cascade" or bert_score is None:
+        return True
+    return CASCADE_LOW <= bert_score <= CASCADE_HIGH
+
+
+async def _with_timeout(stage, awaitable, timeout, stages):
+    # Etap, który nie zdąży w limicie lub zawiedzie, nie blokuje całej oceny - zwraca None
+    try:
+        result = await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        stages.append(f"{stage}:timeout")
+        return None
+    except Exception as e:
+        print(f"Błąd etapu {stage}: {e}")
+        stages.append(f"{stage}:error")
+        return None
+    stages.append(stage)
+    return result
+
+
+async def _bert_score(text, backend=None, details=None):
+    backend = backend or classifier_backend
+    batcher = get_batcher(backend)
+
+    # Token to co najmniej jeden znak, więc krótki tekst na pewno mieści się w jednym oknie
+    if len(text) <= backend.max_tokens:
+        return await asyncio.wrap_future(batcher.submit(text))
+
+    windows = await run_cpu("bert_windows", backend.split_windows, text)
+    if len(windows) == 1:
+        return await asyncio.wrap_future(batcher.submit(text))
+
+    # Tekst dłuższy niż limit modelu: oceniamy wszystkie okna zamiast obcinać tekst
+    scores = await run_cpu("bert_windows", backend.score_windows, windows)
+    worst = max(range(len(scores)), key=scores.__getitem__)
+    if details is not None:
+        # Treść okna, nie przesunięcia: oceniany tekst bywa tłumaczeniem, a wynik z cache
+        # pasuje też do wiadomości różniących się wielkością liter i spacjami
+        details["window"] = {
+            "text": text[windows[worst][1]:windows[worst][2]],
+            "score": scores[worst],
+            "windows": len(windows),
+        }
+    return max(scores) if LONG_TEXT_AGGREGATION == "max" else statistics.mean(scores)
+
+
+async def _prepare_text(text, backend, stages):
+    # Backendy wielojęzyczne oceniają tekst oryginalny, pozostałe - tłumaczenie
+    if not backend.needs_translation:
+        stages.append("translate:native")
+        return text
+    # Tłumaczenie tekstu na angielski (pomijane dla angielskiego, z cache i limitem czasu)
+    translated_text, translate_stage = await translate_to_english(text)
+    stages.append(translate_stage)
+    return translated_text
+
+
+async def classify_text(text: str, backend_name: str = None) -> dict:
+    """Sam klasyfikator (bez GPT) przez wybrany backend - ta sama ścieżka co w analyze_text_async."""
+    backend = get_backend(backend_name) if backend_name else classifier_backend
+    stages = []
+    details = {}
+    prepared_text = await _prepare_text(text, backend, stages)
+    score = await _with_timeout("bert", _bert_score(prepared_text, backend, details), BERT_TIMEOUT_S, stages)
+    return {"backend": backend.name, "score": score, "stages": stages, **details}
+
+
+async def analyze_text_async(text: str) -> dict:
+    # Powtarzające się wiadomości (spam, copy-pasta) obsługujemy z cache;
+    # odczyt z MongoDB jest blokujący, więc idzie przez pulę I/O
+    cache_key = content_hash(normalize_text(text))
+    if text_cache.persistent:
+        cached = await run_io("text_cache", text_cache.get, cache_key)
+    else:
+        cached = text_cache.get(cache_key)
+    if cached is not None:
+        return {**cached, "stages": ["cache"]}
+
+    stages = []
+    details = {}
+    translated_text = await _prepare_text(text, classifier_backend, stages)
+
+    if TEXT_SCORING_MODE == "cascade":
+        # Najpierw BERT, GPT tylko dla niepewnych wyników
+        bert_score = await _with_timeout("bert", _bert_score(translated_text, details=details), BERT_TIMEOUT_S, stages)
+        gpt_result = None
+        if needs_gpt(bert_score):
+            gpt_result = await _with_timeout("gpt", gpt_check_toxicity(translated_text), GPT_TIMEOUT_S, stages)
+    else:
+        # Oba modele są niezależne, więc czekamy tylko na wolniejszy z nich
+        bert_score, gpt_result = await asyncio.gather(
+            _with_timeout("bert", _bert_score(translated_text, details=details), BERT_TIMEOUT_S, stages),
+            _with_timeout("gpt", gpt_check_toxicity(translated_text), GPT_TIMEOUT_S, stages),
+        )
+
+    verdict = {
+        "toxicity_score": combine_scores(bert_score, gpt_result),
+        "bert_score": bert_score,
+        "gpt_score": gpt_result,
+        **details,
+    }
+
+    # Zapamiętujemy tylko pełne wyniki - bez przekroczonych limitów i błędów żadnego etapu
+    # (po nieudanym tłumaczeniu toxic-bert ocenia tekst nieprzetłumaczony, więc wynik jest niepewny)
+    gpt_failed = any(stage.startswith("gpt") for stage in stages) and gpt_result is None
+    stage_failed = any(stage.endswith((":timeout", ":error")) for stage in stages)
+    if bert_score is not None and not gpt_failed and not stage_failed:
+        if text_cache.persistent:
+            await run_io("text_cache", text_cache.set, cache_key, verdict)
+        else:
+            text_cache.set(cache_key, verdict)
+
+    return {**verdict, "stages": stages}
+
+
+def analyze_text(text: str) -> dict:
+    """Synchroniczna wersja `analyze_text_async` (skrypty, benchmarki).
+
+    Każde wywołanie ma własną pętlę zdarzeń, więc jej klient OpenAI jest zamykany na końcu.
+    """
+    async def run():
+        try:
+            return await analyze_text_async(text)
+        finally:
+            await close_client()
+
+    return asyncio.run(run())
+
 
-    # Wstępna analiza tekstu przy użyciu BERT
-    result = classifier(translated_text)[0]
+def get_batching_stats():
+    with _batchers_lock:
+        batchers = list(_batchers.values())
+    return {
+        "backend": classifier_backend.describe(),
+        "batchers": {batcher.name: batcher.stats() for batcher in batchers},
+    }
 
-    # Podwójna weryfikacja z GPT
-    gpt_result = gpt_check_toxicity(translated_text)
 
-    # Wyświetlenie wyników
-    return result['score'], gpt_result # Zwracamy jako krotkę (trzy wartości)
\ No newline at end of file
+def get_text_cache_stats():
+    return text_cache.stats()
\ No newline at end of file
@@ -0,0 +1,122 @@
+import os
+import io
+import threading
+import numpy as np
+from executors import STT_POOL_SIZE, run_stt
+from models.audio_frontend import AUDIO_SAMPLE_RATE, pcm_to_wav_bytes
+from openai_client import transcribe
+
+# Wybór backendu transkrypcji: "openai" (API Whisper) albo "faster-whisper" (lokalnie na CPU)
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "openai")
+
+# Lokalny model: nazwa rozmiaru (np. "small") albo ścieżka do katalogu modelu w formacie CTranslate2
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "small")
+LOCAL_WHISPER_DEVICE = os.getenv("LOCAL_WHISPER_DEVICE", "cpu")
+# Kwantyzacja wag (int8 to najszybszy wariant na CPU)
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+# Wątki obliczeń na jedno wywołanie (0 = domyślne ustawienie biblioteki)
+LOCAL_WHISPER_THREADS = int(os.getenv("LOCAL_WHISPER_THREADS", "0"))
+LOCAL_WHISPER_BEAM_SIZE = int(os.getenv("LOCAL_WHISPER_BEAM_SIZE", "1"))
+# Pusty = automatyczne wykrywanie języka
+LOCAL_WHISPER_LANGUAGE = os.getenv("LOCAL_WHISPER_LANGUAGE", "") or None
+
+
+class TranscriptionBackend:
+    """Wspólny interfejs backendów transkrypcji mowy.
+
+    `transcribe_pcm` przyjmuje PCM s16le mono i zwraca rozpoznany tekst.
+    """
+
+    name = "base"
+    model_name = None
+    local = False
+
+    def load(self):
+        return self
+
+    async def transcribe_pcm(self, pcm: bytes, sample_rate: int = AUDIO_SAMPLE_RATE, index: int = 0) -> str:
+        raise NotImplementedError
+
+    def describe(self) -> dict:
+        return {"name": self.name, "model": self.model_name, "local": self.local}
+
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """Transkrypcja przez API OpenAI (limit 25 MB na wywołanie, wspólna pula połączeń)."""
+
+    def __init__(self, name, model_name="whisper-1"):
+        self.name = name
+        self.model_name = model_name
+
+    async def transcribe_pcm(self, pcm, sample_rate=AUDIO_SAMPLE_RATE, index=0):
+        wav_bytes = pcm_to_wav_bytes(pcm, sample_rate)
+        return (await transcribe(wav_bytes, filename=f"chunk_{index}.wav", model=self.model_name))["text"]
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """Lokalny Whisper (CTranslate2, wymaga pakietu faster-whisper) w puli "stt".
+
+    Model jest ładowany raz, przy pierwszym wywołaniu, w wątku puli - nie blokuje pętli
+    zdarzeń. Jedna instancja obsługuje STT_POOL_SIZE równoległych transkrypcji.
+    """
+
+    local = True
+
+    def __init__(self, name, model_name, device=LOCAL_WHISPER_DEVICE, compute_type=LOCAL_WHISPER_COMPUTE_TYPE):
+        self.name = name
+        self.model_name = model_name
+        self.device = device
+        self.compute_type = compute_type
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                from faster_whisper import WhisperModel
+
+                self._model = WhisperModel(
+                    self.model_name,
+                    device=self.device,
+                    compute_type=self.compute_type,
+                    cpu_threads=LOCAL_WHISPER_THREADS,
+                    num_workers=STT_POOL_SIZE,
+                )
+            return self._model
+
+    def _transcribe(self, pcm, sample_rate):
+        model = self._get_model()
+        if sample_rate == AUDIO_SAMPLE_RATE:
+            audio = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+        else:
+            # Inna częstotliwość - biblioteka sama przepróbkuje dane z nagłówkiem WAV
+            audio = io.BytesIO(pcm_to_wav_bytes(pcm, sample_rate))
+        segments, _ = model.transcribe(audio, beam_size=LOCAL_WHISPER_BEAM_SIZE, language=LOCAL_WHISPER_LANGUAGE)
+        # `segments` to generator - dekodowanie odbywa się dopiero tutaj, w wątku puli
+        return " ".join(segment.text.strip() for segment in segments)
+
+    async def transcribe_pcm(self, pcm, sample_rate=AUDIO_SAMPLE_RATE, index=0):
+        return await run_stt("transcribe_local", self._transcribe, pcm, sample_rate)
+
+    def describe(self):
+        return {**super().describe(), "device": self.device, "compute_type": self.compute_type, "workers": STT_POOL_SIZE}
+
+
+BACKEND_FACTORIES = {
+    "openai": lambda: OpenAIWhisperBackend("openai", "whisper-1"),
+    "faster-whisper": lambda: FasterWhisperBackend("faster-whisper", LOCAL_WHISPER_MODEL),
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_transcription_backend(name: str = None) -> TranscriptionBackend:
+    """Zwraca backend o podanej nazwie (domyślnie TRANSCRIPTION_BACKEND)."""
+    name = name or TRANSCRIPTION_BACKEND
+    if name not in BACKEND_FACTORIES:
+        raise ValueError(f"Unknown transcription backend '{name}'. Available: {', '.join(BACKEND_FACTORIES)}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKEND_FACTORIES[name]().load()
+        return _backends[name]
@@ -0,0 +1,102 @@
+import os
+import asyncio
+import threading
+from googletrans import Translator
+from langid.langid import LanguageIdentifier, model
+from models.verdict_cache import LRUTTLCache, content_hash
+from executors import run_io
+
+# Języki, spośród których wybiera lokalny identyfikator (mniejszy zbiór = mniej pomyłek)
+LANGID_LANGUAGES = [lang.strip() for lang in os.getenv("LANGID_LANGUAGES", "en,pl,de,uk,ru,cs,sk,es,fr,it").split(",") if lang.strip()]
+ENGLISH_MIN_CONFIDENCE = float(os.getenv("ENGLISH_MIN_CONFIDENCE", "0.9"))
+
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "20000"))
+TRANSLATION_CACHE_TTL_S = float(os.getenv("TRANSLATION_CACHE_TTL_S", str(24 * 3600)))
+TRANSLATION_TIMEOUT_S = float(os.getenv("TRANSLATION_TIMEOUT_S", "5"))
+
+# Polskie znaki diakrytyczne jednoznacznie wykluczają angielski
+_POLISH_CHARS = set("ąćęłńóśźżĄĆĘŁŃÓŚŹŻ")
+
+# Inicjalizacja identyfikatora języka (offline, model wbudowany w langid)
+identifier = LanguageIdentifier.from_modelstring(model, norm_probs=True)
+identifier.set_languages(LANGID_LANGUAGES)
+
+# Inicjalizacja tłumacza
+translator = Translator()
+
+translation_cache = LRUTTLCache(maxsize=TRANSLATION_CACHE_SIZE, ttl=TRANSLATION_CACHE_TTL_S)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "skipped_english": 0,
+    "cache_hits": 0,
+    "translated": 0,
+    "timeouts": 0,
+    "errors": 0,
+}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def detect_language(text: str):
+    """Zwraca (kod_języka, pewność) z lokalnego modelu langid."""
+    return identifier.classify(text)
+
+
+def is_english(text: str) -> bool:
+    if not any(c.isalpha() for c in text):
+        # Same emoji, liczby czy linki - nie ma czego tłumaczyć
+        return True
+    if any(c in _POLISH_CHARS for c in text):
+        return False
+    lang, confidence = detect_language(text)
+    return lang == "en" and confidence >= ENGLISH_MIN_CONFIDENCE
+
+
+async def translate_to_english(text: str):
+    """Tłumaczy tekst na angielski, pomijając tłumacza, gdy to niepotrzebne.
+
+    Zwraca (tekst_po_angielsku, etap), gdzie etap opisuje, co faktycznie się stało:
+    "translate:skipped", "translate:cache", "translate", "translate:timeout" lub
+    "translate:error". Przy przekroczeniu limitu czasu lub błędzie oceniany jest
+    tekst oryginalny, żeby wolny tłumacz nie wstrzymywał oceny.
+    """
+    if is_english(text):
+        _count("skipped_english")
+        return text, "translate:skipped"
+
+    cache_key = content_hash(text)
+    cached = translation_cache.get(cache_key)
+    if cached is not None:
+        _count("cache_hits")
+        return cached, "translate:cache"
+
+    try:
+        result = await asyncio.wait_for(
+            run_io("translate", translator.translate, text, src='auto', dest='en'),
+            TRANSLATION_TIMEOUT_S,
+        )
+    except asyncio.TimeoutError:
+        _count("timeouts")
+        return text, "translate:timeout"
+    except Exception as e:
+        print(f"Błąd tłumaczenia: {e}")
+        _count("errors")
+        return text, "translate:error"
+
+    _count("translated")
+    translation_cache.set(cache_key, result.text)
+    return result.text, "translate"
+
+
+def get_translation_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    total = sum(stats.values())
+    stats["total"] = total
+    stats["skip_ratio"] = stats["skipped_english"] / total if total else 0.0
+    stats["cache_size"] = len(translation_cache)
+    return stats
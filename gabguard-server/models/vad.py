@@ -0,0 +1,151 @@
+import os
+from collections import deque, namedtuple
+import numpy as np
+
+# Detekcja mowy na podstawie energii ramek PCM s16le mono
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+VAD_ENERGY_THRESHOLD_DB = float(os.getenv("VAD_ENERGY_THRESHOLD_DB", "-40"))
+VAD_MIN_SILENCE_MS = int(os.getenv("VAD_MIN_SILENCE_MS", "600"))
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "250"))
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", "200"))
+VAD_MAX_UTTERANCE_S = float(os.getenv("VAD_MAX_UTTERANCE_S", "30"))
+
+# Wycinanie ciszy z nagrań przed wysłaniem do transkrypcji
+VAD_TRIM_ENABLED = os.getenv("VAD_TRIM_ENABLED", "1") == "1"
+
+SAMPLE_WIDTH = 2
+
+SpeechSegment = namedtuple("SpeechSegment", ["pcm", "start_s", "end_s"])
+
+
+def frame_bytes(sample_rate: int, frame_ms: int = VAD_FRAME_MS) -> int:
+    return int(sample_rate * frame_ms / 1000) * SAMPLE_WIDTH
+
+
+def frame_energies_db(pcm: bytes, sample_rate: int, frame_ms: int = VAD_FRAME_MS) -> np.ndarray:
+    """Energia RMS (dBFS) kolejnych pełnych ramek sygnału."""
+    samples_per_frame = frame_bytes(sample_rate, frame_ms) // SAMPLE_WIDTH
+    samples = np.frombuffer(pcm, dtype="<i2")
+    frames = len(samples) // samples_per_frame
+    if frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames_data = samples[:frames * samples_per_frame].astype(np.float32).reshape(frames, samples_per_frame)
+    rms = np.sqrt(np.mean(frames_data ** 2, axis=1)) / 32768.0
+    return 20.0 * np.log10(rms + 1e-10)
+
+
+def speech_frames(pcm: bytes, sample_rate: int, frame_ms: int = VAD_FRAME_MS, threshold_db: float = VAD_ENERGY_THRESHOLD_DB) -> np.ndarray:
+    """Maska ramek zawierających mowę."""
+    return frame_energies_db(pcm, sample_rate, frame_ms) > threshold_db
+
+
+class StreamingSegmenter:
+    """Dzieli strumień PCM na wypowiedzi zakończone ciszą.
+
+    `feed` przyjmuje dowolne kawałki bajtów i zwraca listę zakończonych wypowiedzi
+    (`SpeechSegment`). Wypowiedź kończy się po `min_silence_ms` ciszy albo po
+    `max_utterance_s` - to twardy limit pamięci bufora niezależnie od długości sesji.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=VAD_FRAME_MS, threshold_db=VAD_ENERGY_THRESHOLD_DB,
+                 min_silence_ms=VAD_MIN_SILENCE_MS, min_speech_ms=VAD_MIN_SPEECH_MS,
+                 padding_ms=VAD_PADDING_MS, max_utterance_s=VAD_MAX_UTTERANCE_S):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_size = frame_bytes(sample_rate, frame_ms)
+        self.threshold_db = threshold_db
+        self.silence_frames = max(1, min_silence_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_utterance_frames = max(1, int(max_utterance_s * 1000 // frame_ms))
+        self.max_buffer_bytes = (self.max_utterance_frames + 1) * self.frame_size
+
+        self._pending = bytearray()
+        self._preroll = deque(maxlen=max(1, padding_ms // frame_ms))
+        self._utterance = bytearray()
+        self._utterance_start = 0
+        self._speech_count = 0
+        self._silence_run = 0
+        self._frame_index = 0
+
+    def _emit(self):
+        segment = None
+        frames = len(self._utterance) // self.frame_size
+        if self._speech_count >= self.min_speech_frames:
+            start_s = self._utterance_start * self.frame_ms / 1000.0
+            segment = SpeechSegment(bytes(self._utterance), start_s, start_s + frames * self.frame_ms / 1000.0)
+        self._utterance = bytearray()
+        self._speech_count = 0
+        self._silence_run = 0
+        return segment
+
+    def _process_frame(self, frame, is_speech):
+        index = self._frame_index
+        self._frame_index += 1
+
+        if not self._utterance:
+            if not is_speech:
+                self._preroll.append(frame)
+                return None
+            # Początek wypowiedzi - dołączamy krótki zapas sprzed progu, żeby nie uciąć głoski
+            self._utterance_start = index - len(self._preroll)
+            for previous in self._preroll:
+                self._utterance.extend(previous)
+            self._preroll.clear()
+
+        self._utterance.extend(frame)
+        if is_speech:
+            self._speech_count += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+
+        frames = len(self._utterance) // self.frame_size
+        if self._silence_run >= self.silence_frames or frames >= self.max_utterance_frames:
+            return self._emit()
+        return None
+
+    def feed(self, data: bytes):
+        self._pending.extend(data)
+        segments = []
+        frames = len(self._pending) // self.frame_size
+        # Energia wszystkich pełnych ramek liczona jednym wywołaniem zamiast ramka po ramce
+        speech = speech_frames(bytes(self._pending[:frames * self.frame_size]), self.sample_rate, self.frame_ms, self.threshold_db)
+        for i in range(frames):
+            offset = i * self.frame_size
+            segment = self._process_frame(bytes(self._pending[offset:offset + self.frame_size]), bool(speech[i]))
+            if segment is not None:
+                segments.append(segment)
+        del self._pending[:frames * self.frame_size]
+        return segments
+
+    def flush(self):
+        """Kończy sesję: zwraca ostatnią wypowiedź (jeśli zawiera mowę) i zeruje stan."""
+        segment = self._emit() if self._utterance else None
+        self._pending.clear()
+        self._preroll.clear()
+        self._frame_index = 0
+        return [segment] if segment is not None else []
+
+
+def strip_silence(blocks, sample_rate=16000, report=None, **segmenter_options):
+    """Zwraca z bloków PCM tylko wypowiedzi - długie pauzy i nagrania bez mowy są wycinane.
+
+    Pauzy wewnątrz wypowiedzi krótsze niż `min_silence_ms` zostają, a każda wypowiedź ma
+    zapas `padding_ms` na początku. Jeśli podano `report`, zapisuje w nim długość wejścia
+    (`input_s`), pozostawionej mowy (`speech_s`) i wyciętej ciszy (`removed_s`) w sekundach.
+    """
+    segmenter = StreamingSegmenter(sample_rate=sample_rate, **segmenter_options)
+    report = report if report is not None else {}
+    report.update({"input_s": 0.0, "speech_s": 0.0, "removed_s": 0.0})
+    bytes_per_second = sample_rate * SAMPLE_WIDTH
+
+    def account(segments):
+        for segment in segments:
+            report["speech_s"] += len(segment.pcm) / bytes_per_second
+            yield segment.pcm
+
+    for block in blocks:
+        report["input_s"] += len(block) / bytes_per_second
+        yield from account(segmenter.feed(block))
+    yield from account(segmenter.flush())
+    report["removed_s"] = max(0.0, report["input_s"] - report["speech_s"])
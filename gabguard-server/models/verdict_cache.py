@@ -0,0 +1,140 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from db.mongodb import get_cached_verdict, store_cached_verdict
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Sprowadza tekst do postaci kanonicznej: NFKC, casefold i pojedyncze spacje."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def content_hash(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8") if isinstance(part, str) else part)
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class LRUTTLCache:
+    """Ograniczony słownik LRU, którego wpisy wygasają po `ttl` sekundach."""
+
+    def __init__(self, maxsize=10000, ttl=3600.0):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class VerdictCache:
+    """Dwupoziomowa pamięć werdyktów: LRU w procesie + opcjonalnie wspólna kolekcja MongoDB.
+
+    Każdy wpis jest związany z `version` (model + prompt). Zmiana wersji czyści poziom
+    w pamięci, a wpisy w MongoDB z inną wersją są traktowane jak brak trafienia.
+    """
+
+    def __init__(self, namespace, version, maxsize=10000, ttl=3600.0, persistent=False, persistent_ttl=7 * 24 * 3600.0):
+        self.namespace = namespace
+        self._version = version
+        self.memory = LRUTTLCache(maxsize=maxsize, ttl=ttl)
+        self.persistent = persistent
+        self.persistent_ttl = persistent_ttl
+
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    @version.setter
+    def version(self, value):
+        if value != self._version:
+            self._version = value
+            self.memory.clear()
+            with self._lock:
+                self.invalidations += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return value
+
+        if self.persistent:
+            try:
+                value = get_cached_verdict(self.namespace, key, self._version)
+            except Exception as e:
+                print(f"Błąd odczytu cache werdyktów z MongoDB: {e}")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+                with self._lock:
+                    self.persistent_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.persistent:
+            try:
+                store_cached_verdict(self.namespace, key, self._version, value, self.persistent_ttl)
+            except Exception as e:
+                print(f"Błąd zapisu cache werdyktów do MongoDB: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.persistent_hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "version": self._version,
+                "size": len(self.memory),
+                "maxsize": self.memory.maxsize,
+                "persistent": self.persistent,
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.persistent_hits) / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -1,55 +1,135 @@
 import os
+import io
+import json
+import shutil
+import asyncio
 import tempfile
 import subprocess
-import openai
-from pathlib import Path
 import logging
+from fractions import Fraction
+from executors import run_io, run_cpu
+from models.image_hash import hamming_distance, phash_bytes
+from models.image_preprocess import prepare_image, image_url_parts
+from models.audio_analyzer import process_large_audio_file
+from models.structured_analysis import analyze_structured
+from openai_client import chat_completion, message_content
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure OpenAI API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Budget of frames sent to the vision model, and the number of candidate frames
+# (evenly spaced seeks) that scene changes and near-duplicates are detected on
+VIDEO_SAMPLE_FRAMES = int(os.getenv("VIDEO_SAMPLE_FRAMES", "5"))
+VIDEO_CANDIDATE_FRAMES = int(os.getenv("VIDEO_CANDIDATE_FRAMES", "24"))
+# Frames whose perceptual hashes differ by at most this many bits (of 64) count as the same shot
+VIDEO_PHASH_THRESHOLD = int(os.getenv("VIDEO_PHASH_THRESHOLD", "10"))
+# Upper bound on the ffmpeg frame-extraction processes running at once for one video
+VIDEO_FFMPEG_CONCURRENCY = int(os.getenv("VIDEO_FFMPEG_CONCURRENCY", "4"))
 
-async def analyze_video(video_file):
+# Uploads above these limits are rejected before anything is decoded
+VIDEO_MAX_BYTES = int(os.getenv("VIDEO_MAX_BYTES", str(512 * 1024 * 1024)))
+VIDEO_MAX_DURATION_S = float(os.getenv("VIDEO_MAX_DURATION_S", "3600"))
+
+
+class VideoRejected(ValueError):
+    pass
+
+
+class VideoSource:
+    """The single seekable copy of a video that every ffmpeg process reads through /dev/fd/N.
+
+    A file object with a real descriptor (a regular file, or an upload's SpooledTemporaryFile,
+    which rolls over to disk on `fileno()`) is used as is. Anything else (bytes, BytesIO) is
+    written once to an anonymous temporary file. Each ffmpeg process reopens /dev/fd/N with
+    its own offset, so the audio and frame readers can run concurrently on the same copy.
+    """
+
+    def __init__(self, source):
+        self._owned = None
+        fd = _real_fileno(source)
+        if fd is None:
+            self._owned = tempfile.TemporaryFile()
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                self._owned.write(source)
+            else:
+                source.seek(0)
+                shutil.copyfileobj(source, self._owned, 1024 * 1024)
+            self._owned.flush()
+            fd = self._owned.fileno()
+        self.fd = fd
+        self.path = f"/dev/fd/{fd}"
+        self.size = os.fstat(fd).st_size
+
+    def run(self, command, **kwargs):
+        """Run an ffmpeg/ffprobe command that reads `self.path`; returns stdout bytes."""
+        return subprocess.run(command, pass_fds=(self.fd,), capture_output=True, **kwargs).stdout
+
+    def close(self):
+        if self._owned is not None:
+            self._owned.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _real_fileno(source):
     try:
-        # Create a temporary directory to store files
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Save the uploaded video to a temporary file
-            temp_video_path = Path(temp_dir) / "temp_video.mp4"
-            video_content = await video_file.read()
-            with open(temp_video_path, "wb") as f:
-                f.write(video_content)
-            
-            # Extract audio from the video
-            temp_audio_path = Path(temp_dir) / "temp_audio.mp3"
-            extract_audio_command = [
-                "ffmpeg", "-i", str(temp_video_path), 
-                "-q:a", "0", "-map", "a", str(temp_audio_path), "-y"
-            ]
-            subprocess.run(extract_audio_command, check=True, stderr=subprocess.PIPE)
-            
-            # Extract video frames (1 frame per second)
-            temp_frames_dir = Path(temp_dir) / "frames"
-            temp_frames_dir.mkdir(exist_ok=True)
-            extract_frames_command = [
-                "ffmpeg", "-i", str(temp_video_path),
-                "-vf", "fps=1", f"{temp_frames_dir}/frame_%04d.jpg", "-y"
-            ]
-            subprocess.run(extract_frames_command, check=True, stderr=subprocess.PIPE)
-            
-            # Process audio with OpenAI
-            audio_description = await analyze_audio_content(temp_audio_path)
-            
-            # Process video frames with OpenAI
-            video_description = await analyze_visual_content(temp_frames_dir)
+        fd = source.fileno()
+        source.flush()
+        return fd
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def _source_size(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    position = source.tell()
+    size = source.seek(0, os.SEEK_END)
+    source.seek(position)
+    return size
+
+
+async def analyze_video(source):
+    """Analyze a video given as a file object or bytes, without writing extra copies of it."""
+    try:
+        # Size policy is checked before the video is spooled or decoded
+        size = await run_io("video_spool", _source_size, source)
+        if size > VIDEO_MAX_BYTES:
+            raise VideoRejected(f"video is {size} bytes, limit is {VIDEO_MAX_BYTES}")
+
+        with await run_io("video_spool", VideoSource, source) as video:
+            probe = await run_io("ffprobe", probe_video, video)
+            duration = probe["duration"]
+            if duration and duration > VIDEO_MAX_DURATION_S:
+                raise VideoRejected(f"video is {duration:.0f} s long, limit is {VIDEO_MAX_DURATION_S:.0f} s")
+
+            # The audio track is decoded straight from the video while frames are sampled,
+            # so both branches (and their OpenAI calls) run concurrently
+            audio_description, video_description = await asyncio.gather(
+                analyze_audio_content(video.fd, has_audio=probe["audio"]),
+                _sample_and_analyze_frames(video, duration, probe["frame_rate"]),
+            )
             
             # Combine analysis and determine toxicity score
             combined_result = await combine_analysis(video_description, audio_description)
             
+            # A failed branch makes the verdict partial; surface it so it is not cached as complete
+            failed = [f"{name}:error" for name, result in (("audio", audio_description), ("frames", video_description)) if result.get("error")]
+            silent = [] if probe["audio"] else ["audio:none"]
+            combined_result["stages"] = [*combined_result.get("stages", []), *silent, *failed]
             return combined_result
-            
+
+    except VideoRejected as e:
+        logger.warning(f"Video rejected: {str(e)}")
+        return {
+            "description": f"Video rejected: {str(e)}",
+            "toxicity_score": -1
+        }
     except Exception as e:
         logger.error(f"Error analyzing video: {str(e)}")
         return {
@@ -57,16 +137,146 @@ async def analyze_video(video_file):
             "toxicity_score": -1 
         }
 
-async def analyze_audio_content(audio_path):
+async def _sample_and_analyze_frames(video, duration, frame_rate=None):
     try:
-        # First transcribe the audio
-        with open(audio_path, "rb") as audio_file:
-            transcription = openai.Audio.transcribe(
-                "whisper-1",
-                audio_file
-            )
-            
-        transcript_text = transcription["text"] if isinstance(transcription, dict) else transcription.text
+        candidates = await sample_frames(video, duration, VIDEO_CANDIDATE_FRAMES, frame_rate=frame_rate)
+        selected = await run_cpu("phash", select_distinct_frames, candidates)
+    except Exception as e:
+        # Reported like a failed vision call, so the audio branch still completes
+        logger.error(f"Error extracting video frames: {str(e)}")
+        return {"analysis": f"Error extracting video frames: {str(e)}", "error": True}
+    logger.info(f"Video frames: {len(candidates)} candidates, {len(selected)} sent for analysis")
+    return await analyze_visual_content(selected)
+
+def probe_video(video):
+    """Return the container duration in seconds, whether the video has an audio track and
+    the frame rate of its video stream, from a single ffprobe run (None when unknown)."""
+    probe_command = [
+        "ffprobe", "-v", "error", "-show_entries", "format=duration:stream=codec_type,avg_frame_rate",
+        "-of", "json", video.path
+    ]
+    try:
+        info = json.loads(video.run(probe_command))
+    except ValueError:
+        # Nothing to go on: the audio branch decodes anyway and reports a real error
+        return {"duration": None, "audio": True, "frame_rate": None}
+    try:
+        duration = float(info.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    streams = info.get("streams", [])
+    video_streams = [stream for stream in streams if stream.get("codec_type") == "video"]
+    return {
+        "duration": duration,
+        "audio": not streams or any(stream.get("codec_type") == "audio" for stream in streams),
+        "frame_rate": _frame_rate(video_streams[0].get("avg_frame_rate")) if video_streams else None,
+    }
+
+def _frame_rate(value):
+    # ffprobe reports rates as fractions ("30000/1001"); "0/0" means unknown
+    try:
+        rate = float(Fraction(value))
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return rate or None
+
+def sample_timestamps(duration, count=VIDEO_SAMPLE_FRAMES, frame_rate=None):
+    """Evenly spaced timestamps from the first to (almost) the last second of the video.
+
+    No more timestamps than there are frames in that span, so a short clip does not
+    seek (and hash) the same frame over and over.
+    """
+    # Seeking to the very end returns no frame, so the last sample stays one second earlier
+    last = max(0.0, duration - 1.0)
+    if frame_rate:
+        count = min(count, int(last * frame_rate) + 1)
+    elif last == 0:
+        count = 1
+    if count <= 1:
+        return [0.0]
+    return [round(last * i / (count - 1), 3) for i in range(count)]
+
+def _extract_frame(video, timestamp):
+    # -ss before -i seeks on the input (jumps to the nearest keyframe), so only
+    # a few frames are decoded no matter how long the video is; the JPEG comes back on stdout
+    extract_frame_command = [
+        "ffmpeg", "-v", "error", "-ss", str(timestamp), "-i", video.path,
+        "-frames:v", "1", "-q:v", "2", "-f", "image2pipe", "-vcodec", "mjpeg", "pipe:1"
+    ]
+    return video.run(extract_frame_command, check=True)
+
+def _split_jpegs(stream):
+    # image2pipe concatenates the JPEGs; each one ends with the EOI marker
+    frames = []
+    start = stream.find(b"\xff\xd8")
+    while start != -1:
+        end = stream.find(b"\xff\xd9", start)
+        if end == -1:
+            break
+        frames.append(stream[start:end + 2])
+        start = stream.find(b"\xff\xd8", end + 2)
+    return frames
+
+def _extract_keyframes(video, count):
+    # Fallback for streams without a known duration: decode keyframes only, at most `count`
+    extract_frames_command = [
+        "ffmpeg", "-v", "error", "-skip_frame", "nokey", "-i", video.path,
+        "-vsync", "vfr", "-frames:v", str(count), "-q:v", "2",
+        "-f", "image2pipe", "-vcodec", "mjpeg", "pipe:1"
+    ]
+    return _split_jpegs(video.run(extract_frames_command, check=True))
+
+async def sample_frames(video, duration, count=VIDEO_SAMPLE_FRAMES, concurrency=VIDEO_FFMPEG_CONCURRENCY, frame_rate=None):
+    """Extract only the candidate frames (as JPEG bytes), seeking to each timestamp in parallel.
+
+    At most `concurrency` ffmpeg processes run at once; a seek that fails only drops its frame.
+    """
+    if not duration:
+        return await run_io("ffmpeg", _extract_keyframes, video, count)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def extract(timestamp):
+        async with semaphore:
+            return await run_io("ffmpeg", _extract_frame, video, timestamp)
+
+    frames = await asyncio.gather(*[extract(timestamp) for timestamp in sample_timestamps(duration, count, frame_rate)], return_exceptions=True)
+    failed = sum(isinstance(frame, Exception) for frame in frames)
+    if failed:
+        logger.warning(f"Video frames: {failed} of {len(frames)} seeks failed")
+    return [frame for frame in frames if frame and not isinstance(frame, Exception)]
+
+def select_distinct_frames(frames, budget=VIDEO_SAMPLE_FRAMES, threshold=VIDEO_PHASH_THRESHOLD):
+    """Pick up to `budget` visually distinct frames, preferring the strongest scene changes.
+
+    A frame is a scene change when its perceptual hash is far from the previous candidate;
+    frames within `threshold` bits of an already kept frame are dropped as near-duplicates.
+    A static video therefore yields a single frame, a dynamic one up to `budget`.
+    """
+    hashes = [phash_bytes(frame) for frame in frames]
+    kept = []
+    for index, (frame, frame_hash) in enumerate(zip(frames, hashes)):
+        if any(hamming_distance(frame_hash, kept_hash) <= threshold for _, _, _, kept_hash in kept):
+            continue
+        # The opening frame is always kept; later ones are ranked by the size of the cut
+        change = hamming_distance(frame_hash, hashes[index - 1]) if index else float("inf")
+        kept.append((change, index, frame, frame_hash))
+
+    if len(kept) > budget:
+        kept = sorted(kept, key=lambda item: item[0], reverse=True)[:budget]
+    return [frame for _, _, frame, _ in sorted(kept, key=lambda item: item[1])]
+
+async def analyze_audio_content(audio_source, has_audio=True):
+    if not has_audio:
+        # ffmpeg fails on an output without streams, so a silent clip never reaches the decoder
+        return {
+            "transcript": "",
+            "analysis": "The video has no audio track"
+        }
+
+    try:
+        # First transcribe the audio with the configured backend (silence trimmed, long tracks chunked)
+        transcript_text = await process_large_audio_file(audio_source)
         
         # Analyze the transcription for content and toxicity
         analysis_prompt = f"""
@@ -79,7 +289,7 @@ async def analyze_audio_content(audio_path):
         2. Identify any potentially toxic, harmful, offensive, or inappropriate content
         """
         
-        response = openai.ChatCompletion.create(
+        response = await chat_completion(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an AI that analyzes audio transcripts for content and toxicity."},
@@ -87,7 +297,7 @@ async def analyze_audio_content(audio_path):
             ]
         )
         
-        analysis_content = response['choices'][0]['message']['content']
+        analysis_content = message_content(response)
         
         return {
             "transcript": transcript_text,
@@ -98,44 +308,23 @@ async def analyze_audio_content(audio_path):
         logger.error(f"Error analyzing audio: {str(e)}")
         return {
             "transcript": "",
-            "analysis": "Error analyzing audio content"
+            "analysis": "Error analyzing audio content",
+            "error": True
         }
 
-async def analyze_visual_content(frames_dir):
+async def analyze_visual_content(frames):
     try:
-        # Get a sample of frames (first, middle, and last to represent the video)
-        frame_files = sorted(list(frames_dir.glob("*.jpg")))
-        
-        if not frame_files:
+        if not frames:
             return {"analysis": "No frames extracted from video"}
         
-        # Select representative frames (start, 1/4, middle, 3/4, end)
-        if len(frame_files) >= 5:
-            selected_frames = [
-                frame_files[0],
-                frame_files[len(frame_files) // 4],
-                frame_files[len(frame_files) // 2],
-                frame_files[3 * len(frame_files) // 4],
-                frame_files[-1]
-            ]
-        else:
-            # If fewer than 5 frames, use all available
-            selected_frames = frame_files
-        
-        # Create base64 encoded images
-        base64_images = []
-        for frame in selected_frames:
-            with open(frame, "rb") as img_file:
-                image_data = img_file.read()
-                import base64
-                base64_image = base64.b64encode(image_data).decode('utf-8')
-                base64_images.append(base64_image)
+        # Downscale and recompress the frames before they are sent to the vision model
+        images = [await run_cpu("image_prepare", prepare_image, frame) for frame in frames]
         
         # Create a prompt describing frames for GPT-4 Vision
         prompt = "Analyze these frames from a video. Describe what you see and identify any potentially toxic, harmful, offensive, or inappropriate content."
         
         # Call GPT-4 Vision API with the updated model name
-        response = openai.ChatCompletion.create(
+        response = await chat_completion(
             model="gpt-4o",  # Updated from gpt-4-vision-preview
             messages=[
                 {
@@ -149,19 +338,14 @@ async def analyze_visual_content(frames_dir):
                             "type": "text",
                             "text": prompt
                         },
-                        *[{
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{img}"
-                            }
-                        } for img in base64_images]
+                        *[part for image in images for part in image_url_parts(image)]
                     ]
                 }
             ],
             max_tokens=1000
         )
         
-        analysis_content = response['choices'][0]['message']['content']
+        analysis_content = message_content(response)
         
         return {
             "analysis": analysis_content
@@ -170,12 +354,12 @@ async def analyze_visual_content(frames_dir):
     except Exception as e:
         logger.error(f"Error analyzing video frames: {str(e)}")
         return {
-            "analysis": f"Error analyzing video frames: {str(e)}"
+            "analysis": f"Error analyzing video frames: {str(e)}",
+            "error": True
         }
 
 async def combine_analysis(video_result, audio_result):
     try:
-        # Step 1: Create the unified description
         combination_prompt = f"""
         Combine the following video and audio analysis from the same video into a coherent and detailed description.
 
@@ -196,21 +380,47 @@ async def combine_analysis(video_result, audio_result):
         - The overall impact the content may have on a viewer
 
         Be explicit where needed — include strong language if it appears. Do not sanitize or neutralize the content.
-        Do not assign any scores — just describe the video as it is, including disturbing or offensive details.
         """
-        
-        description_response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an AI that writes detailed descriptions by combining visual and audio information."},
-                {"role": "user", "content": combination_prompt}
-            ]
+
+        # Description, score and labels in one structured call; the two-step path is the fallback
+        verdict = await analyze_structured(
+            combination_prompt,
+            describe=lambda: _describe_video(combination_prompt),
+            score=_score_video_description,
         )
+
+        return {
+            "description": verdict["description"],
+            "toxicity_score": verdict["toxicity_score"],
+            "labels": verdict["labels"],
+            "stages": verdict["stages"]
+        }
         
-        description_content = description_response['choices'][0]['message']['content'].strip()
+    except Exception as e:
+        logger.error(f"Error combining analysis: {str(e)}")
+        return {
+            "description": "Error combining video and audio analysis",
+            "toxicity_score": -1,
+            "stages": ["gpt:error"]
+        }
 
-        # Step 2: Ask for toxicity score based on the description
-        scoring_prompt = f"""
+async def _describe_video(combination_prompt):
+    # Step 1 of the two-step path: create the unified description
+    description_response = await chat_completion(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "You are an AI that writes detailed descriptions by combining visual and audio information."},
+            {"role": "user", "content": combination_prompt + """
+        Do not assign any scores — just describe the video as it is, including disturbing or offensive details.
+        """}
+        ]
+    )
+    
+    return message_content(description_response).strip()
+
+async def _score_video_description(description_content):
+    # Step 2 of the two-step path: ask for toxicity score based on the description
+    scoring_prompt = f"""
         Analyze the following description of a video:
 
         \"\"\"
@@ -224,28 +434,16 @@ async def combine_analysis(video_result, audio_result):
         Provide ONLY the numeric value (e.g., 0.35) without any extra explanation.
         """
 
-        scoring_response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an AI that assigns toxicity scores to video content based on neutral descriptions."},
-                {"role": "user", "content": scoring_prompt}
-            ]
-        )
-
-        score_text = scoring_response['choices'][0]['message']['content'].strip()
-        try:
-            toxicity_score = float(score_text)
-        except ValueError:
-            toxicity_score = -1
+    scoring_response = await chat_completion(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "You are an AI that assigns toxicity scores to video content based on neutral descriptions."},
+            {"role": "user", "content": scoring_prompt}
+        ]
+    )
 
-        return {
-            "description": description_content,
-            "toxicity_score": toxicity_score
-        }
-        
-    except Exception as e:
-        logger.error(f"Error combining analysis: {str(e)}")
-        return {
-            "description": "Error combining video and audio analysis",
-            "toxicity_score": -1
-        }
\ No newline at end of file
+    score_text = message_content(scoring_response).strip()
+    try:
+        return float(score_text)
+    except ValueError:
+        return -1
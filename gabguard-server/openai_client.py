@@ -0,0 +1,216 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+import httpx
+
+# Adres API - w testach można go skierować na lokalny serwer zastępczy
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Pula połączeń i limity współbieżności (globalny oraz per model, np. "gpt-4o=8,whisper-1=4")
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_MODEL_CONCURRENCY = os.getenv("OPENAI_MODEL_CONCURRENCY", "gpt-4o=12,whisper-1=4")
+
+# Domyślny limit czasu całego wywołania (razem z ponowieniami) i polityka ponowień
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_BACKOFF_BASE_S = float(os.getenv("OPENAI_BACKOFF_BASE_S", "0.5"))
+OPENAI_BACKOFF_MAX_S = float(os.getenv("OPENAI_BACKOFF_MAX_S", "8"))
+
+
+class OpenAIError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _parse_model_limits(spec: str) -> dict:
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, limit = item.split("=", 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+_model_limits = _parse_model_limits(OPENAI_MODEL_CONCURRENCY)
+
+# Klient i semafory są związane z pętlą zdarzeń, w której powstały - osobny stan dla każdej
+# pętli (serwer, wątki z asyncio.run), zwalniany razem z pętlą
+_states = weakref.WeakKeyDictionary()
+_states_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def configure(base_url: str = None, api_key: str = None):
+    """Zmienia adres lub klucz API (np. w testach) - kolejne wywołania użyją nowego klienta."""
+    global OPENAI_API_BASE, OPENAI_API_KEY
+    if base_url is not None:
+        OPENAI_API_BASE = base_url
+    if api_key is not None:
+        OPENAI_API_KEY = api_key
+    with _states_lock:
+        _states.clear()
+
+
+def _get_state():
+    loop = asyncio.get_running_loop()
+    with _states_lock:
+        state = _states.get(loop)
+        if state is None:
+            state = _states[loop] = {
+                "client": httpx.AsyncClient(
+                    base_url=OPENAI_API_BASE,
+                    headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                    ),
+                ),
+                "global": asyncio.Semaphore(OPENAI_MAX_CONCURRENCY),
+                "models": {},
+            }
+    return state
+
+
+def _model_semaphore(state, model):
+    if model not in state["models"]:
+        state["models"][model] = asyncio.Semaphore(_model_limits.get(model, OPENAI_MAX_CONCURRENCY))
+    return state["models"][model]
+
+
+def _model_stats(model):
+    if model not in _stats:
+        _stats[model] = {
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "in_flight": 0,
+            "total_latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+    return _stats[model]
+
+
+def _backoff(attempt, retry_after=None):
+    if retry_after is not None:
+        return retry_after
+    # Pełny jitter: losowe opóźnienie z rosnącego przedziału
+    return random.uniform(0, min(OPENAI_BACKOFF_MAX_S, OPENAI_BACKOFF_BASE_S * (2 ** attempt)))
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def _request(model, path, timeout=None, **kwargs) -> dict:
+    state = _get_state()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (timeout or OPENAI_TIMEOUT_S)
+    started = time.monotonic()
+
+    with _stats_lock:
+        stats = _model_stats(model)
+        stats["calls"] += 1
+        stats["in_flight"] += 1
+
+    try:
+        attempt = 0
+        while True:
+            retry_after = None
+            # Najpierw limit modelu, potem globalny: wywołania czekające na zajęty model
+            # (np. seria transkrypcji) nie trzymają globalnych slotów potrzebnych gpt-4o
+            async with _model_semaphore(state, model), state["global"]:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f"OpenAI {path} deadline exceeded")
+
+                try:
+                    response = await state["client"].post(path, timeout=remaining, **kwargs)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    error = OpenAIError(f"OpenAI {path} transport error: {e}")
+                else:
+                    if response.status_code < 400:
+                        return response.json()
+                    error = OpenAIError(f"OpenAI {path} returned {response.status_code}: {response.text[:200]}", response.status_code)
+                    if response.status_code != 429 and response.status_code < 500:
+                        raise error
+                    retry_after = _retry_after(response)
+
+            # 429 i 5xx (oraz błędy sieci) ponawiamy, dopóki mieści się to w limicie czasu;
+            # na czas oczekiwania sloty są zwolnione
+            delay = _backoff(attempt, retry_after)
+            if attempt >= OPENAI_MAX_RETRIES or loop.time() + delay >= deadline:
+                raise error
+            attempt += 1
+            with _stats_lock:
+                stats["retries"] += 1
+            await asyncio.sleep(delay)
+    except BaseException:
+        with _stats_lock:
+            stats["errors"] += 1
+        raise
+    finally:
+        latency_ms = (time.monotonic() - started) * 1000.0
+        with _stats_lock:
+            stats["in_flight"] -= 1
+            stats["total_latency_ms"] += latency_ms
+            stats["max_latency_ms"] = max(stats["max_latency_ms"], latency_ms)
+
+
+async def chat_completion(messages, model="gpt-4o", timeout=None, **params) -> dict:
+    """Wywołanie /chat/completions; zwraca odpowiedź API jako słownik."""
+    response = await _request(model, "/chat/completions", timeout=timeout, json={"model": model, "messages": messages, **params})
+    usage = response.get("usage") or {}
+    with _stats_lock:
+        stats = _model_stats(model)
+        stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        stats["completion_tokens"] += usage.get("completion_tokens", 0)
+    return response
+
+
+async def transcribe(audio: bytes, filename="audio.wav", model="whisper-1", timeout=None, **params) -> dict:
+    """Wywołanie /audio/transcriptions dla danych audio w pamięci."""
+    return await _request(
+        model,
+        "/audio/transcriptions",
+        timeout=timeout,
+        files={"file": (filename, audio)},
+        data={"model": model, **params},
+    )
+
+
+def message_content(response: dict) -> str:
+    """Treść pierwszej odpowiedzi modelu."""
+    return response["choices"][0]["message"]["content"]
+
+
+def get_openai_stats() -> dict:
+    with _stats_lock:
+        result = {}
+        for model, stats in _stats.items():
+            finished = (stats["calls"] - stats["in_flight"]) or 1
+            result[model] = {**stats, "avg_latency_ms": stats["total_latency_ms"] / finished}
+    return {
+        "max_concurrency": OPENAI_MAX_CONCURRENCY,
+        "model_concurrency": dict(_model_limits),
+        "models": result,
+    }
+
+
+async def close_client():
+    """Zamyka klienta bieżącej pętli zdarzeń (przy zamykaniu serwera albo na końcu asyncio.run)."""
+    with _states_lock:
+        state = _states.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state["client"].aclose()
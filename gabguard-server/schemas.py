@@ -11,16 +11,22 @@ class TextResponse(BaseModel):
     user_id: str
     text: str
     toxicity_score: float
+    stages: List[str] = []  # Etapy oceny, które faktycznie się wykonały (np. "bert", "gpt", "cache")
+    window: Optional[Dict[str, Any]] = None  # Najbardziej toksyczne okno długiego tekstu (jego treść po ewentualnym tłumaczeniu, wynik, liczba okien)
 
 class AudioResponse(BaseModel):
     user_id: str
     transcription: str
     toxicity_score: float
+    stages: List[str] = []
+    window: Optional[Dict[str, Any]] = None
+    removed_silence_s: Optional[float] = None  # Ile sekund ciszy wycięto przed transkrypcją
 
 class FileAnalysisResponse(BaseModel):
     user_id: str
     description: str  # Changed from transcription to description to match endpoint
     toxicity_score: float
+    labels: List[str] = []  # Content categories from the structured analysis (e.g. "hate", "violence")
 
 class ViolationRequest(BaseModel):
     user_id: str
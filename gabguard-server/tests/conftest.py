@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import classifier_backends
+
+
+class FakeBackend(classifier_backends.ClassifierBackend):
+    """Backend bez modelu - testy logiki oceny nie pobierają modeli z HuggingFace."""
+
+    name = "fake"
+    model_name = "fake"
+    score = 0.01
+
+    def load(self):
+        return self
+
+    def predict(self, texts):
+        return [self.score for _ in texts]
+
+    @property
+    def max_tokens(self) -> int:
+        return 512
+
+
+for _name in classifier_backends.BACKEND_FACTORIES:
+    classifier_backends.BACKEND_FACTORIES[_name] = FakeBackend
@@ -0,0 +1,62 @@
+import io
+import os
+import threading
+import zipfile
+
+import pytest
+
+from models.archive_scanner import ArchiveLimitExceeded, ArchiveScan, spool_member
+
+MB = 1024 * 1024
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_reserve_is_all_or_nothing():
+    scan = ArchiveScan(members_left=1, bytes_left=100)
+
+    assert scan.reserve(members=1, size=60)
+    assert not scan.reserve(size=50)
+    assert scan.budget == {"members_left": 0, "bytes_left": 40}
+    assert not scan.reserve(members=1)
+
+
+def test_failed_member_returns_its_reservation():
+    data = _zip({"big.bin": os.urandom(3 * MB)})
+    scan = ArchiveScan(bytes_left=2 * MB)
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive, pytest.raises(ArchiveLimitExceeded):
+        spool_member(archive, archive.getinfo("big.bin"), scan)
+
+    assert scan.budget["bytes_left"] == 2 * MB
+
+
+def test_concurrent_members_share_a_hard_byte_limit():
+    data = _zip({f"{index}.bin": os.urandom(3 * MB) for index in range(4)})
+    scan = ArchiveScan(bytes_left=7 * MB)
+    spooled, errors = [], []
+
+    def extract(name):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            try:
+                spooled.append(spool_member(archive, archive.getinfo(name), scan.child()))
+            except ArchiveLimitExceeded as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=extract, args=(f"{index}.bin",)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(member.size for member in spooled) <= 7 * MB
+    assert scan.budget["bytes_left"] == 7 * MB - sum(member.size for member in spooled)
+    assert len(spooled) <= 2 and errors
+    for member in spooled:
+        member.close()
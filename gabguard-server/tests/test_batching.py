@@ -0,0 +1,101 @@
+import pytest
+
+from models.batching import MicroBatcher
+
+TIMEOUT = 5
+
+
+def test_failing_run_batch_fails_futures_and_keeps_worker():
+    calls = []
+
+    def run_batch(process, batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("pool is shut down")
+        process(batch)
+
+    batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_wait_ms=0, run_batch=run_batch)
+
+    with pytest.raises(RuntimeError, match="pool is shut down"):
+        batcher.submit(1).result(timeout=TIMEOUT)
+    assert batcher.submit(2).result(timeout=TIMEOUT) == 4
+    assert batcher.stats()["errors"] == 1
+
+
+def test_error_outside_per_item_handling_fails_whole_batch():
+    calls = []
+
+    def predict(items):
+        calls.append(items)
+        # Wynik bez długości psuje całą paczkę, a nie pojedynczy element
+        return 42 if len(calls) == 1 else [item * 2 for item in items]
+
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=50)
+
+    futures = [batcher.submit(item) for item in range(3)]
+
+    for future in futures:
+        assert isinstance(future.exception(timeout=TIMEOUT), TypeError)
+    assert batcher.submit(5).result(timeout=TIMEOUT) == 10
+
+
+class RecordingPredict:
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if self.fail_on in items:
+            raise ValueError(f"bad item {self.fail_on}")
+        return [item * 10 for item in items]
+
+
+def test_requests_within_the_window_share_one_batch():
+    predict = RecordingPredict()
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=200)
+
+    futures = [batcher.submit(item) for item in range(4)]
+
+    assert [future.result(timeout=TIMEOUT) for future in futures] == [0, 10, 20, 30]
+    assert predict.batches == [[0, 1, 2, 3]]
+    assert batcher.stats()["batch_size_histogram"] == {4: 1}
+
+
+def test_batch_size_is_capped():
+    predict = RecordingPredict()
+    batcher = MicroBatcher(predict, max_batch_size=2, max_wait_ms=200)
+
+    futures = [batcher.submit(item) for item in range(5)]
+
+    assert [future.result(timeout=TIMEOUT) for future in futures] == [0, 10, 20, 30, 40]
+    assert max(len(batch) for batch in predict.batches) == 2
+    assert sorted(item for batch in predict.batches for item in batch) == list(range(5))
+
+
+def test_failing_item_does_not_fail_the_rest_of_the_batch():
+    predict = RecordingPredict(fail_on=2)
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=200)
+
+    futures = [batcher.submit(item) for item in range(4)]
+
+    with pytest.raises(ValueError, match="bad item 2"):
+        futures[2].result(timeout=TIMEOUT)
+    assert [futures[index].result(timeout=TIMEOUT) for index in (0, 1, 3)] == [0, 10, 30]
+    # Paczka, a potem każdy element osobno
+    assert predict.batches[0] == [0, 1, 2, 3]
+    assert predict.batches[1:] == [[0], [1], [2], [3]]
+    assert batcher.stats()["errors"] == 1
+
+
+def test_cancelled_request_is_skipped():
+    predict = RecordingPredict()
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=200)
+
+    cancelled = batcher.submit(1)
+    assert cancelled.cancel()
+    kept = batcher.submit(2)
+
+    assert kept.result(timeout=TIMEOUT) == 20
+    assert predict.batches == [[2]]
+    assert batcher.stats()["cancelled"] == 1
@@ -0,0 +1,100 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from models import classifier_backends
+from models.classifier_backends import PipelineBackend
+
+TOXIC_TOKEN = 99
+
+
+class WordTokenizer:
+    """Token = słowo; okno modelu mieści `model_max_length - 2` tokenów."""
+
+    model_input_names = ["input_ids", "attention_mask"]
+
+    def __init__(self, model_max_length=6):
+        self.model_max_length = model_max_length
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False, verbose=False):
+        words = list(re.finditer(r"\S+", text))
+        return {
+            "input_ids": [TOXIC_TOKEN if word.group() == "idiot" else index + 1 for index, word in enumerate(words)],
+            "offset_mapping": [word.span() for word in words],
+        }
+
+    def build_inputs_with_special_tokens(self, ids):
+        return [101, *ids, 102]
+
+    def pad(self, batch, return_tensors=None):
+        import torch
+
+        length = max(len(ids) for ids in batch["input_ids"])
+        return {"input_ids": torch.tensor([ids + [0] * (length - len(ids)) for ids in batch["input_ids"]])}
+
+
+def _backend(model_max_length=6, model=None):
+    backend = PipelineBackend("words", "words")
+    backend.pipeline = SimpleNamespace(tokenizer=WordTokenizer(model_max_length), model=model)
+    return backend
+
+
+TEXT = "one two three four five six seven eight nine ten"
+
+
+def test_short_text_is_a_single_window():
+    windows = _backend(model_max_length=512).split_windows("a b c", overlap=1)
+
+    assert windows == [([1, 2, 3], 0, 5)]
+
+
+def test_empty_text_is_one_empty_window():
+    assert _backend().split_windows("   ") == [([], 0, 0)]
+
+
+def test_windows_overlap_and_cover_the_text():
+    windows = _backend().split_windows(TEXT, overlap=1)
+
+    assert [ids for ids, _, _ in windows] == [[1, 2, 3, 4], [4, 5, 6, 7], [7, 8, 9, 10]]
+    assert [TEXT[start:end] for _, start, end in windows] == [
+        "one two three four",
+        "four five six seven",
+        "seven eight nine ten",
+    ]
+
+
+def test_last_window_ends_at_the_text_end():
+    windows = _backend().split_windows(TEXT, overlap=2)
+
+    # Krok 2 tokeny: ostatnie okno zaczyna się tak, by objąć koniec tekstu, i na nim się kończy
+    assert [ids[0] for ids, _, _ in windows] == [1, 3, 5, 7]
+    assert windows[-1][2] == len(TEXT)
+
+
+def test_overlap_larger_than_window_still_advances():
+    windows = _backend().split_windows("a b c d e f", overlap=10)
+
+    assert [ids[0] for ids, _, _ in windows] == [1, 2, 3]
+
+
+def test_score_windows_keeps_order_across_model_batches(monkeypatch):
+    torch = pytest.importorskip("torch")
+
+    def model(input_ids):
+        # Jeden logit "toxic": wysoki dla okien z obraźliwym słowem
+        toxic = (input_ids == TOXIC_TOKEN).any(dim=1, keepdim=True)
+        return SimpleNamespace(logits=toxic.float() * 20.0 - 10.0)
+
+    model.config = SimpleNamespace(problem_type="multi_label_classification", num_labels=1, id2label={0: "toxic"})
+    monkeypatch.setattr(classifier_backends, "LONG_TEXT_BATCH_SIZE", 2)
+    backend = _backend(model=model)
+    windows = backend.split_windows("a b c d e f g idiot h i j k", overlap=1)
+
+    scores = backend.score_windows(windows)
+
+    assert len(scores) == len(windows) == 4
+    assert [round(score) for score in scores] == [0, 0, 1, 0]
@@ -0,0 +1,120 @@
+import io
+import zipfile
+
+from models.file_analyzer import TextBudget, extract_csv_content, extract_docx_content, extract_xml_content
+
+TRUNCATED = "... (content truncated)"
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+class CountingReader(io.BytesIO):
+    """Plik, który zapamiętuje, ile bajtów z niego przeczytano."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def docx(paragraphs):
+    body = "".join(f"<w:p>{paragraph}</w:p>" for paragraph in paragraphs)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", f"<w:document {W}><w:body>{body}</w:body></w:document>")
+    buffer.seek(0)
+    return buffer
+
+
+def test_budget_exactly_filled_is_not_truncated():
+    budget = TextBudget(10)
+
+    assert not budget.add("12345")
+    assert not budget.add("67890")
+    assert budget.text() == "1234567890"
+
+
+def test_budget_exhausted_mid_text():
+    budget = TextBudget(10)
+
+    assert not budget.add("1234567")
+    assert budget.add("89abc")
+    assert budget.length == 10
+    assert budget.text() == "123456789a" + TRUNCATED
+
+
+def test_budget_stays_exhausted():
+    budget = TextBudget(3)
+    budget.add("abcd")
+
+    assert budget.add("")
+    assert budget.text() == "abc" + TRUNCATED
+
+
+def test_xml_is_formatted_while_parsing():
+    document = b'<root><a x="1">hi</a><b/><c><d>deep</d></c></root>'
+
+    assert extract_xml_content(io.BytesIO(document)) == (
+        "<root>\n"
+        '  <a x="1">\n'
+        "    hi\n"
+        "  </a>\n"
+        "  <b/>\n"
+        "  <c>\n"
+        "    <d>\n"
+        "      deep\n"
+        "    </d>\n"
+        "  </c>\n"
+        "</root>\n"
+    )
+
+
+def test_xml_budget_exhausted_mid_element_stops_parsing():
+    rows = "".join(f"<row id=\"{index}\"><text>line {index}</text></row>" for index in range(50000))
+    source = CountingReader(f"<rows>{rows}</rows>".encode())
+
+    text = extract_xml_content(source, max_chars=100)
+
+    assert text.endswith(TRUNCATED)
+    assert len(text) == 100 + len(TRUNCATED)
+    assert source.bytes_read < len(source.getvalue()) // 10
+
+
+def test_malformed_xml_is_reported():
+    assert extract_xml_content(io.BytesIO(b"<root><a></root>")).startswith("XML file that could not be parsed")
+
+
+def test_docx_paragraphs_tabs_and_breaks():
+    source = docx([
+        "<w:r><w:t>Hello</w:t><w:tab/><w:t>world</w:t></w:r>",
+        "<w:r><w:t>line</w:t><w:br/><w:t>break</w:t></w:r>",
+    ])
+
+    assert extract_docx_content(source) == "Hello\tworld\nline\nbreak"
+
+
+def test_docx_budget_exhausted_mid_paragraph():
+    source = docx([f"<w:r><w:t>paragraph {index} text</w:t></w:r>" for index in range(1000)])
+
+    text = extract_docx_content(source, max_chars=30)
+
+    assert text == "paragraph 0 text\nparagraph 1 t" + TRUNCATED
+
+
+def test_docx_without_document_part_is_reported():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("other.xml", "<x/>")
+
+    assert extract_docx_content(buffer).startswith("Word document that could not be parsed")
+
+
+def test_csv_stops_at_row_limit():
+    data = "".join(f"{index},value {index}\n" for index in range(1000)).encode()
+
+    text = extract_csv_content(io.BytesIO(data), max_rows=3)
+
+    assert text.split("\n") == ["0,value 0", "1,value 1", "2,value 2", TRUNCATED]
@@ -0,0 +1,84 @@
+import io
+import random
+
+import numpy as np
+from PIL import Image
+
+from models.image_hash import BKTree, hamming_distance, phash, phash_bytes
+from models.video_analysis import _split_jpegs, select_distinct_frames
+
+
+def pattern(seed, size=256):
+    blocks = np.random.default_rng(seed).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    return Image.fromarray(blocks).resize((size, size), Image.NEAREST)
+
+
+def jpeg(image, quality=90):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_hamming_distance():
+    assert hamming_distance(0, 0) == 0
+    assert hamming_distance(0b1011, 0b0001) == 2
+    assert hamming_distance(0, 2 ** 64 - 1) == 64
+
+
+def test_phash_tolerates_rescaling_and_recompression():
+    original = phash(pattern(1))
+    copy = phash_bytes(jpeg(pattern(1).resize((160, 160)), quality=40))
+
+    assert hamming_distance(original, copy) <= 6
+    assert hamming_distance(original, phash(pattern(2))) > 12
+
+
+def test_bk_tree_search_matches_brute_force_at_radius_boundary():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    query = values[0] ^ 0b111  # dokładnie 3 bity od pierwszego wpisu
+    tree = BKTree()
+    for value in values:
+        tree.add(value)
+
+    for radius in (0, 2, 3, 4, 28):
+        expected = sorted((hamming_distance(query, value), value) for value in values if hamming_distance(query, value) <= radius)
+        assert tree.search(query, radius) == expected
+    assert tree.search(query, 3)[0] == (3, values[0])
+    assert tree.search(query, 2) == []
+
+
+def test_bk_tree_ignores_duplicates():
+    tree = BKTree()
+    for value in (5, 5, 6, 5):
+        tree.add(value)
+
+    assert len(tree) == 2
+    assert tree.search(5, 0) == [(0, 5)]
+    assert BKTree().search(5, 64) == []
+
+
+def test_split_jpegs_returns_complete_frames_only():
+    frames = [jpeg(pattern(seed, size=64)) for seed in range(3)]
+
+    stream = b"".join(frames) + frames[0][:100]
+
+    assert _split_jpegs(stream) == frames
+
+
+def test_near_duplicate_frames_are_dropped():
+    shot = jpeg(pattern(1))
+    rescaled = jpeg(pattern(1).resize((200, 200)), quality=60)
+    cut = jpeg(pattern(2))
+
+    assert select_distinct_frames([shot, rescaled, cut, rescaled], budget=5, threshold=10) == [shot, cut]
+
+
+def test_budget_keeps_the_opening_frame_and_biggest_changes():
+    frames = [jpeg(pattern(seed)) for seed in range(6)]
+
+    selected = select_distinct_frames(frames, budget=3, threshold=10)
+
+    assert len(selected) == 3
+    assert selected[0] == frames[0]
+    assert selected == [frame for frame in frames if frame in selected]
@@ -0,0 +1,31 @@
+import io
+
+from PIL import Image
+
+from models.image_preprocess import prepare_image
+from uploads import SpooledUpload
+
+
+def _png(size=(640, 480)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_view_of_spooled_upload_gives_same_result_as_bytes():
+    data = _png()
+    upload = SpooledUpload(max_memory=1024)
+    upload.write(data)
+    assert upload.on_disk
+
+    from_view = prepare_image(upload.view(), max_edge=256)
+    from_bytes = prepare_image(data, max_edge=256)
+
+    assert from_view.phash is not None
+    assert from_view.phash == from_bytes.phash
+    assert from_view.frames == from_bytes.frames
+    assert from_view.original_size == len(data)
+    # Bez kopii, ale też bez wiszących eksportów - mapowanie da się zamknąć
+    upload._view.release()
+    upload._mmap.close()
+    upload.file.close()
@@ -0,0 +1,24 @@
+import asyncio
+
+import openai_client
+
+
+def test_each_event_loop_gets_its_own_client():
+    async def client():
+        return openai_client._get_state()["client"]
+
+    first, second = asyncio.run(client()), asyncio.run(client())
+
+    assert first is not second
+
+
+def test_close_client_closes_only_the_current_loop_client():
+    async def use_and_close():
+        client = openai_client._get_state()["client"]
+        await openai_client.close_client()
+        return client
+
+    client = asyncio.run(use_and_close())
+
+    assert client.is_closed
+    assert all(state["client"] is not client for state in openai_client._states.values())
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from models.structured_analysis import StructuredVerdictError, parse_structured_verdict
+
+
+def verdict(**fields):
+    return json.dumps({"description": "A cat photo.", "toxicity_score": 0.1, "labels": ["none"], **fields})
+
+
+def test_valid_verdict():
+    assert parse_structured_verdict(verdict(description="  A cat photo.  ", toxicity_score=1)) == {
+        "description": "A cat photo.",
+        "toxicity_score": 1.0,
+        "labels": ["none"],
+    }
+
+
+@pytest.mark.parametrize("raw", [
+    "The content is harmless. Score: 0.1",
+    '```json\n{"description": "x", "toxicity_score": 0.1}\n```',
+    '{"description": "x", "toxicity_score": 0.1',
+    "",
+    None,
+])
+def test_non_json_output_is_rejected(raw):
+    with pytest.raises(StructuredVerdictError, match="not valid JSON") as error:
+        parse_structured_verdict(raw)
+    assert error.value.description is None
+
+
+def test_json_that_is_not_an_object_is_rejected():
+    with pytest.raises(StructuredVerdictError, match="not a JSON object"):
+        parse_structured_verdict('[{"description": "x"}]')
+
+
+@pytest.mark.parametrize("description", [None, "", "   ", 42])
+def test_missing_description_is_rejected(description):
+    with pytest.raises(StructuredVerdictError, match="missing description"):
+        parse_structured_verdict(verdict(description=description))
+
+
+@pytest.mark.parametrize("score", [None, "0.5", True, -0.1, 1.5])
+def test_invalid_score_keeps_the_description(score):
+    with pytest.raises(StructuredVerdictError, match="invalid toxicity_score") as error:
+        parse_structured_verdict(verdict(toxicity_score=score))
+    assert error.value.description == "A cat photo."
+
+
+@pytest.mark.parametrize("labels", ["hate", [1, 2], {"hate": True}])
+def test_invalid_labels_keep_the_description(labels):
+    with pytest.raises(StructuredVerdictError, match="invalid labels") as error:
+        parse_structured_verdict(verdict(labels=labels))
+    assert error.value.description == "A cat photo."
+
+
+def test_labels_are_normalized():
+    result = parse_structured_verdict(verdict(labels=[" Hate ", "none", "hate", "made-up", "THREAT"]))
+
+    assert result["labels"] == ["hate", "threat"]
+
+
+def test_missing_labels_default_to_empty():
+    raw = json.dumps({"description": "x", "toxicity_score": 0})
+
+    assert parse_structured_verdict(raw)["labels"] == []
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from models import text_classifier
+from models.classifier_backends import ClassifierBackend
+from models.verdict_cache import content_hash, normalize_text
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    monkeypatch.setattr(text_classifier.text_cache, "persistent", False)
+    monkeypatch.setattr(text_classifier, "TEXT_SCORING_MODE", "cascade")
+    text_classifier.text_cache.memory.clear()
+    yield text_classifier.text_cache
+    text_classifier.text_cache.memory.clear()
+
+
+def _translate_with(stage):
+    async def translate(text):
+        return text, stage
+    return translate
+
+
+def _cached(text):
+    return text_classifier.text_cache.memory.get(content_hash(normalize_text(text)))
+
+
+def test_verdict_after_translation_timeout_is_not_cached(memory_cache, monkeypatch):
+    monkeypatch.setattr(text_classifier, "translate_to_english", _translate_with("translate:timeout"))
+
+    result = asyncio.run(text_classifier.analyze_text_async("Ty głupi idioto"))
+
+    assert "translate:timeout" in result["stages"]
+    assert result["bert_score"] is not None
+    assert _cached("Ty głupi idioto") is None
+
+
+def test_verdict_after_translation_error_is_not_cached(memory_cache, monkeypatch):
+    monkeypatch.setattr(text_classifier, "translate_to_english", _translate_with("translate:error"))
+
+    asyncio.run(text_classifier.analyze_text_async("Zamknij się wreszcie"))
+
+    assert _cached("Zamknij się wreszcie") is None
+
+
+def test_complete_verdict_is_cached(memory_cache, monkeypatch):
+    monkeypatch.setattr(text_classifier, "translate_to_english", _translate_with("translate"))
+
+    result = asyncio.run(text_classifier.analyze_text_async("Miłego dnia"))
+
+    assert _cached("Miłego dnia")["toxicity_score"] == result["toxicity_score"]
+    assert asyncio.run(text_classifier.analyze_text_async("  MIŁEGO   dnia "))["stages"] == ["cache"]
+
+
+class WordWindowBackend(ClassifierBackend):
+    """Okna po dwa słowa; wynik okna to udział słowa "idiot"."""
+
+    name = "word-windows"
+
+    def load(self):
+        return self
+
+    @property
+    def max_tokens(self) -> int:
+        return 8
+
+    def split_windows(self, text, overlap=0):
+        words, start = [], 0
+        for word in text.split(" "):
+            words.append((word, start, start + len(word)))
+            start += len(word) + 1
+        return [
+            ([word for word, _, _ in words[i:i + 2]], words[i][1], words[min(i + 1, len(words) - 1)][2])
+            for i in range(0, len(words), 2)
+        ]
+
+    def score_windows(self, windows):
+        return [ids.count("idiot") / len(ids) for ids, _, _ in windows]
+
+
+def test_long_text_reports_the_worst_window_text():
+    details = {}
+
+    score = asyncio.run(text_classifier._bert_score("have a nice day you idiot", WordWindowBackend(), details))
+
+    assert score == 0.5
+    assert details["window"] == {"text": "you idiot", "score": 0.5, "windows": 3}
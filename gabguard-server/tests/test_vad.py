@@ -0,0 +1,100 @@
+import numpy as np
+
+from models.audio_frontend import align_chunks
+from models.vad import StreamingSegmenter, strip_silence
+
+RATE = 16000
+FRAME_MS = 30
+FRAME_SAMPLES = RATE * FRAME_MS // 1000
+OPTIONS = {"frame_ms": FRAME_MS, "min_silence_ms": 600, "min_speech_ms": 240, "padding_ms": 180, "max_utterance_s": 30}
+
+
+def speech(frames):
+    t = np.arange(frames * FRAME_SAMPLES) / RATE
+    return (np.sin(2 * np.pi * 220 * t) * 0.3 * 32767).astype("<i2").tobytes()
+
+
+def silence(frames):
+    return bytes(frames * FRAME_SAMPLES * 2)
+
+
+def segment_all(data, chunk_size=None, **options):
+    segmenter = StreamingSegmenter(sample_rate=RATE, **{**OPTIONS, **options})
+    chunk_size = chunk_size or len(data)
+    segments = []
+    for offset in range(0, len(data), chunk_size):
+        segments += segmenter.feed(data[offset:offset + chunk_size])
+    return segments + segmenter.flush()
+
+
+def test_utterance_ends_after_silence_with_padding():
+    segments = segment_all(silence(30) + speech(30) + silence(30))
+
+    assert len(segments) == 1
+    # 6 ramek zapasu przed mową, 30 ramek mowy i 20 ramek ciszy kończącej wypowiedź
+    assert round(segments[0].start_s, 2) == 0.72
+    assert round(segments[0].end_s, 2) == 2.4
+    assert len(segments[0].pcm) == 56 * FRAME_SAMPLES * 2
+
+
+def test_chunk_boundaries_do_not_change_segments():
+    data = silence(10) + speech(20) + silence(25) + speech(15) + silence(5)
+
+    whole = segment_all(data)
+    pieces = segment_all(data, chunk_size=777)
+
+    assert len(whole) == 2
+    assert [(s.pcm, s.start_s, s.end_s) for s in pieces] == [(s.pcm, s.start_s, s.end_s) for s in whole]
+
+
+def test_short_noise_is_not_speech():
+    assert segment_all(silence(20) + speech(3) + silence(30)) == []
+
+
+def test_long_speech_is_split_at_max_utterance():
+    segments = segment_all(speech(100), max_utterance_s=1)
+
+    # 1 s = 33 ramki; pozostała jedna ramka jest za krótka na wypowiedź
+    assert [len(s.pcm) // (FRAME_SAMPLES * 2) for s in segments] == [33, 33, 33]
+    assert [round(s.start_s, 2) for s in segments] == [0.0, 0.99, 1.98]
+
+
+def test_strip_silence_reports_removed_audio():
+    report = {}
+    blocks = [silence(50), speech(40), silence(60)]
+
+    kept = b"".join(strip_silence(blocks, RATE, report, **OPTIONS))
+
+    assert report["input_s"] == 150 * FRAME_MS / 1000
+    assert report["speech_s"] == len(kept) / (RATE * 2)
+    assert round(report["removed_s"], 2) == round(report["input_s"] - report["speech_s"], 2)
+    assert speech(40) in kept
+
+
+def test_silent_recording_yields_nothing():
+    report = {}
+
+    assert list(strip_silence([silence(100)], RATE, report, **OPTIONS)) == []
+    assert report["speech_s"] == 0.0
+
+
+def test_chunks_are_cut_in_the_pause_before_the_limit():
+    # 1 s fragmenty, cięcie szukane w ostatnich 0.5 s; pauza zaczyna się po 0.75 s
+    data = speech(25) + silence(5) + speech(60)
+    blocks = [data[offset:offset + 4000] for offset in range(0, len(data), 4000)]
+
+    chunks = list(align_chunks(blocks, RATE, chunk_seconds=1.0, search_seconds=0.5))
+
+    assert b"".join(chunks) == data
+    assert all(len(chunk) <= RATE * 2 for chunk in chunks)
+    first_cut = len(chunks[0]) // (FRAME_SAMPLES * 2)
+    assert 25 <= first_cut <= 30
+
+
+def test_chunks_without_pause_stay_within_the_limit():
+    data = speech(100)
+
+    chunks = list(align_chunks([data], RATE, chunk_seconds=1.0, search_seconds=0.5))
+
+    assert b"".join(chunks) == data
+    assert all(0 < len(chunk) <= RATE * 2 for chunk in chunks)
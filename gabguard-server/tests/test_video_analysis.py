@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from models import video_analysis
+
+
+class FakeVideo:
+    def __init__(self, probe):
+        self.path = "/dev/null"
+        self.probe = probe
+
+    def run(self, command, **kwargs):
+        return json.dumps(self.probe).encode()
+
+
+def test_probe_reports_missing_audio_track():
+    video = FakeVideo({"streams": [{"codec_type": "video", "avg_frame_rate": "25/1"}], "format": {"duration": "3.5"}})
+
+    assert video_analysis.probe_video(video) == {"duration": 3.5, "audio": False, "frame_rate": 25.0}
+
+
+def test_probe_reports_audio_track():
+    video = FakeVideo({
+        "streams": [{"codec_type": "video", "avg_frame_rate": "0/0"}, {"codec_type": "audio"}],
+        "format": {"duration": "N/A"},
+    })
+
+    assert video_analysis.probe_video(video) == {"duration": None, "audio": True, "frame_rate": None}
+
+
+def test_video_without_audio_has_empty_transcript(monkeypatch):
+    combined = {}
+
+    async def frames(video, duration, frame_rate):
+        return {"analysis": "A cat on a sofa"}
+
+    async def combine(video_result, audio_result):
+        combined["audio"] = audio_result
+        return {"description": "A cat on a sofa", "toxicity_score": 0.0, "labels": [], "stages": ["gpt"]}
+
+    async def transcribe(source):
+        raise AssertionError("a video without an audio track must not be decoded")
+
+    monkeypatch.setattr(video_analysis, "probe_video", lambda video: {"duration": 4.0, "audio": False, "frame_rate": 25.0})
+    monkeypatch.setattr(video_analysis, "_sample_and_analyze_frames", frames)
+    monkeypatch.setattr(video_analysis, "combine_analysis", combine)
+    monkeypatch.setattr(video_analysis, "process_large_audio_file", transcribe)
+
+    result = asyncio.run(video_analysis.analyze_video(b"\x00" * 64))
+
+    assert combined["audio"]["transcript"] == ""
+    assert "error" not in combined["audio"]
+    assert result["stages"] == ["gpt", "audio:none"]
+
+
+def test_short_clip_is_sampled_once():
+    assert video_analysis.sample_timestamps(0.8, 24, frame_rate=30.0) == [0.0]
+    assert video_analysis.sample_timestamps(0.8, 24) == [0.0]
+
+
+def test_candidates_are_capped_by_frame_count():
+    timestamps = video_analysis.sample_timestamps(1.5, 24, frame_rate=10.0)
+
+    assert timestamps == [0.0, 0.1, 0.2, 0.3, 0.4, 0.5]
+
+
+def test_long_video_keeps_requested_candidates():
+    timestamps = video_analysis.sample_timestamps(61.0, 24, frame_rate=25.0)
+
+    assert len(timestamps) == 24
+    assert timestamps[0] == 0.0 and timestamps[-1] == 60.0
@@ -0,0 +1,260 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from executors import run_io
+
+# Przesyłane pliki: do UPLOAD_SPOOL_MAX_MEMORY bajtów w pamięci, większe w pliku tymczasowym
+# na dysku; powyżej UPLOAD_MAX_BYTES przesyłanie jest przerywane (413) jeszcze w trakcie odbioru
+UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY", str(8 * 1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(512 * 1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+# Ile bajtów z początku pliku trafia do libmagic przy rozpoznawaniu typu MIME
+MIME_SNIFF_BYTES = int(os.getenv("MIME_SNIFF_BYTES", "65536"))
+
+# Nagłówki i granice multipart ponad samą treść pliku (dla wstępnej kontroli Content-Length)
+_MULTIPART_OVERHEAD = 64 * 1024
+
+# Opis treści żądania dla dokumentacji OpenAPI (endpoint nie deklaruje parametru File)
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+_stats_lock = threading.Lock()
+_stats = {"uploads": 0, "bytes": 0, "spooled_to_disk": 0, "rejected_too_large": 0, "max_size": 0}
+
+
+class UploadError(ValueError):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class SpooledUpload:
+    """Jedyna kopia przesłanego pliku: w pamięci, a po przekroczeniu `max_memory` na dysku.
+
+    Analizatory dostają widok tej kopii zamiast własnych bajtów: `view()` (memoryview bez
+    kopiowania - bufor BytesIO albo mmap pliku), `source()` (deskryptor pliku na dysku dla
+    procesów ffmpeg, inaczej widok w pamięci) albo `open()` (obiekt plikowy od początku).
+    SHA-256 treści (`sha256`) jest liczony przy zapisie, w trakcie odbioru.
+    """
+
+    def __init__(self, filename=None, content_type=None, max_memory=UPLOAD_SPOOL_MAX_MEMORY):
+        self.filename = filename
+        self.content_type = content_type
+        self.max_memory = max_memory
+        self.file = io.BytesIO()
+        self.size = 0
+        # Hash treści liczony w trakcie odbioru - klucz cache werdyktów bez ponownego czytania pliku
+        self._digest = hashlib.sha256()
+        self._view = None
+        self._mmap = None
+
+    @property
+    def on_disk(self) -> bool:
+        return not isinstance(self.file, io.BytesIO)
+
+    def write(self, data):
+        if not self.on_disk and self.size + len(data) > self.max_memory:
+            self.rollover()
+        self.file.write(data)
+        self._digest.update(data)
+        self.size += len(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def rollover(self):
+        """Przenosi zawartość z pamięci do pliku tymczasowego (np. dla ffmpeg przez /dev/fd)."""
+        if self.on_disk:
+            return
+        self._release()
+        disk = tempfile.TemporaryFile(dir=UPLOAD_SPOOL_DIR)
+        disk.write(self.file.getbuffer())
+        self.file.close()
+        self.file = disk
+        with _stats_lock:
+            _stats["spooled_to_disk"] += 1
+
+    def header(self, size: int = MIME_SNIFF_BYTES) -> bytes:
+        self.file.seek(0)
+        data = self.file.read(size)
+        self.file.seek(0)
+        return data
+
+    def view(self) -> memoryview:
+        if self._view is None:
+            if not self.on_disk:
+                self._view = self.file.getbuffer()
+            elif self.size == 0:
+                self._view = memoryview(b"")
+            else:
+                self.file.flush()
+                self._mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._mmap)
+        return self._view
+
+    def source(self):
+        if self.on_disk:
+            self.file.flush()
+            return self.file.fileno()
+        return self.view()
+
+    def open(self):
+        self.file.seek(0)
+        return self.file
+
+    def _release(self):
+        try:
+            if self._view is not None:
+                self._view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            # Ktoś wciąż trzyma wycinek widoku - mapowanie zwolni GC
+            pass
+        self._view = self._mmap = None
+
+    def close(self):
+        self._release()
+        try:
+            self.file.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def receive_upload(request, field: str = "file", max_bytes: int = UPLOAD_MAX_BYTES,
+                         max_memory: int = UPLOAD_SPOOL_MAX_MEMORY) -> SpooledUpload:
+    """Odbiera plik z żądania multipart/form-data strumieniowo, prosto do `SpooledUpload`.
+
+    Treść nie jest nigdzie buforowana w całości: każdy odebrany fragment trafia od razu do
+    kopii w pamięci albo (po przekroczeniu `max_memory`) do pliku tymczasowego, a limit
+    `max_bytes` jest sprawdzany na bieżąco. Pozostałe pola formularza są pomijane.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError("expected a multipart/form-data request")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes + _MULTIPART_OVERHEAD:
+        _count_rejected()
+        raise UploadTooLarge(f"upload is {declared} bytes, limit is {max_bytes}")
+
+    state = {"upload": None, "target": False, "headers": {}, "name": b"", "value": b"", "received": 0}
+    pending = []
+
+    def on_part_begin():
+        state["headers"], state["target"] = {}, False
+
+    def on_header_field(data, start, end):
+        state["name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["name"].lower()] = state["value"]
+        state["name"], state["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if state["upload"] is None and disposition.get(b"name") == field.encode() and b"filename" in disposition:
+            state["upload"] = SpooledUpload(
+                filename=disposition[b"filename"].decode("utf-8", errors="replace"),
+                content_type=state["headers"].get(b"content-type", b"").decode("latin-1") or None,
+                max_memory=max_memory,
+            )
+            state["target"] = True
+
+    def on_part_data(data, start, end):
+        if not state["target"]:
+            return
+        state["received"] += end - start
+        if state["received"] > max_bytes:
+            raise UploadTooLarge(f"upload exceeds the {max_bytes} byte limit")
+        pending.append(data[start:end])
+
+    def on_part_end():
+        state["target"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if not pending:
+                continue
+            data = b"".join(pending) if len(pending) > 1 else pending[0]
+            pending.clear()
+            upload = state["upload"]
+            if upload.on_disk or upload.size + len(data) > upload.max_memory:
+                # Zapis na dysk poza pętlą zdarzeń
+                await run_io("upload_spool", upload.write, data)
+            else:
+                upload.write(data)
+        parser.finalize()
+    except BaseException as e:
+        if state["upload"] is not None:
+            state["upload"].close()
+        if isinstance(e, UploadTooLarge):
+            _count_rejected()
+        raise
+
+    upload = state["upload"]
+    if upload is None:
+        raise UploadError(f"missing file field '{field}'")
+    with _stats_lock:
+        _stats["uploads"] += 1
+        _stats["bytes"] += upload.size
+        _stats["max_size"] = max(_stats["max_size"], upload.size)
+    return upload
+
+
+def _count_rejected():
+    with _stats_lock:
+        _stats["rejected_too_large"] += 1
+
+
+def get_upload_stats() -> dict:
+    with _stats_lock:
+        return {
+            **_stats,
+            "spool_max_memory": UPLOAD_SPOOL_MAX_MEMORY,
+            "max_bytes": UPLOAD_MAX_BYTES,
+        }
@@ -1,20 +1,130 @@
-from fastapi import WebSocket
-from models.audio_analyzer import analyze_audio
-import tempfile
+import os
+import asyncio
+from fastapi import WebSocket, WebSocketDisconnect
+from models.audio_analyzer import analyze_audio, analyze_pcm
+from models.vad import StreamingSegmenter
+
+# Twardy limit bufora w trybie klasycznym (całe nagranie do "__END__")
+WS_MAX_BUFFER_BYTES = int(os.getenv("WS_MAX_BUFFER_BYTES", str(50 * 1024 * 1024)))
+
+# Tryb strumieniowy: ile wypowiedzi oceniamy równolegle i ile może czekać w kolejce
+WS_STREAM_CONCURRENCY = int(os.getenv("WS_STREAM_CONCURRENCY", "2"))
+WS_STREAM_MAX_PENDING = int(os.getenv("WS_STREAM_MAX_PENDING", "8"))
+# Dopuszczalne częstotliwości próbkowania strumienia PCM (Hz)
+WS_STREAM_MIN_SAMPLE_RATE = 8000
+WS_STREAM_MAX_SAMPLE_RATE = 48000
 
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+
+    # ?mode=stream - surowe PCM s16le mono, werdykty cząstkowe po każdej wypowiedzi
+    if websocket.query_params.get("mode") == "stream":
+        sample_rate = websocket.query_params.get("sample_rate", "16000")
+        if not sample_rate.isdigit() or not WS_STREAM_MIN_SAMPLE_RATE <= int(sample_rate) <= WS_STREAM_MAX_SAMPLE_RATE:
+            await websocket.send_json({
+                "error": f"sample_rate must be an integer between {WS_STREAM_MIN_SAMPLE_RATE} and {WS_STREAM_MAX_SAMPLE_RATE}"
+            })
+            await websocket.close(code=1003)
+            return
+        await stream_endpoint(websocket, int(sample_rate))
+        return
+
     buffer = bytearray()
 
     while True:
         data = await websocket.receive_bytes()
         if data == b"__END__":
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-                tmp.write(buffer)
-                tmp.flush()
-                transcription, bert_score, gpt_score = analyze_audio(open(tmp.name, "rb"))
-                score = (bert_score + gpt_score)/2
-            await websocket.send_json({"transcription": transcription, "toxicity_score": score})
+            # Bufor trafia do ffmpeg bezpośrednio przez potok, bez pliku tymczasowego
+            transcription, result = await analyze_audio(bytes(buffer))
+            await websocket.send_json({
+                "transcription": transcription,
+                "toxicity_score": result["toxicity_score"],
+                "stages": result["stages"],
+                "window": result.get("window"),
+                "removed_silence_s": result.get("removed_silence_s"),
+            })
             buffer.clear()
         else:
+            if len(buffer) + len(data) > WS_MAX_BUFFER_BYTES:
+                await websocket.send_json({"error": f"Audio buffer limit of {WS_MAX_BUFFER_BYTES} bytes exceeded"})
+                await websocket.close(code=1009)
+                return
             buffer.extend(data)
+
+async def stream_endpoint(websocket: WebSocket, sample_rate: int):
+    """Tnie strumień na wypowiedzi (VAD) i odsyła werdykt każdej z nich, gdy tylko jest gotowy.
+
+    Bufor jest ograniczony długością jednej wypowiedzi (VAD_MAX_UTTERANCE_S) razy liczba
+    oczekujących wypowiedzi (WS_STREAM_MAX_PENDING), więc nie rośnie z długością sesji.
+    """
+    segmenter = StreamingSegmenter(sample_rate=sample_rate)
+    semaphore = asyncio.Semaphore(WS_STREAM_CONCURRENCY)
+    send_lock = asyncio.Lock()
+    # Tylko niezakończone zadania - zakończone usuwają się same, więc zbiór nie rośnie z sesją
+    tasks = set()
+    results = {}
+    failed = set()
+    counter = {"next": 0}
+
+    async def score_segment(index, segment):
+        try:
+            async with semaphore:
+                transcription, result = await analyze_pcm(segment.pcm, sample_rate)
+        except Exception as e:
+            # Klient dostaje informację o nieudanej wypowiedzi zamiast ciszy
+            failed.add(index)
+            async with send_lock:
+                await websocket.send_json({
+                    "type": "error",
+                    "segment": index,
+                    "start_s": segment.start_s,
+                    "end_s": segment.end_s,
+                    "error": str(e),
+                })
+            return
+        results[index] = (transcription, result)
+        async with send_lock:
+            await websocket.send_json({
+                "type": "partial",
+                "segment": index,
+                "start_s": segment.start_s,
+                "end_s": segment.end_s,
+                "transcription": transcription,
+                "toxicity_score": result["toxicity_score"],
+                "stages": result["stages"],
+                "window": result.get("window"),
+            })
+
+    async def schedule(segments):
+        for segment in segments:
+            # Przy zbyt wielu oczekujących wypowiedziach wstrzymujemy odbiór (backpressure)
+            if len(tasks) >= WS_STREAM_MAX_PENDING:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.create_task(score_segment(counter["next"], segment))
+            counter["next"] += 1
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    try:
+        while True:
+            data = await websocket.receive_bytes()
+            if data == b"__END__":
+                await schedule(segmenter.flush())
+                await asyncio.gather(*tasks, return_exceptions=True)
+                ordered = [results[i] for i in sorted(results)]
+                async with send_lock:
+                    await websocket.send_json({
+                        "type": "final",
+                        "segments": len(ordered),
+                        "failed_segments": len(failed),
+                        "transcription": " ".join(transcription for transcription, _ in ordered).strip(),
+                        "toxicity_score": max((result["toxicity_score"] for _, result in ordered), default=0.0),
+                    })
+                results.clear()
+                failed.clear()
+                counter["next"] = 0
+            else:
+                await schedule(segmenter.feed(data))
+    except WebSocketDisconnect:
+        for task in list(tasks):
+            task.cancel()